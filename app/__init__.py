@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from app.config import Config
+from app.json_provider import FastJSONProvider
 
 import os
 
@@ -11,6 +12,7 @@ db = SQLAlchemy()
 def create_app(config_class=Config):
     app = Flask(__name__, root_path=os.path.abspath('.'))
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
 
     # 初始化扩展
     db.init_app(app)
@@ -23,4 +25,10 @@ def create_app(config_class=Config):
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/admin')
 
+    # 注册维护命令
+    from app.commands import views_cli, search_cli, analysis_cli
+    app.cli.add_command(views_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(analysis_cli)
+
     return app
\ No newline at end of file
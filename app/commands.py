@@ -0,0 +1,183 @@
+# app/commands.py
+"""数据库维护命令（flask <group> <command>），在项目根目录运行，例如：
+
+    flask views create            # 为全部图层创建 EPSG:4326 物化视图
+    flask views refresh -l 公共服务
+    flask search create-indexes   # 为关键词查询列建立 trigram 索引
+    flask analysis nearest-facility -s 武汉市中学 -s 武汉市小学   # 最近地铁站写入结果表
+"""
+import click
+from flask.cli import AppGroup
+
+views_cli = AppGroup('views', help='图层物化视图（预先统一到 EPSG:4326 的几何 + GiST 索引 + GeoJSON 文本）')
+
+
+def _selected_layers(layers):
+    from app.routes.api import DB_LAYERS_CONFIG
+    if not layers:
+        return list(DB_LAYERS_CONFIG.items())
+    unknown = [name for name in layers if name not in DB_LAYERS_CONFIG]
+    if unknown:
+        raise click.BadParameter(f'未知图层：{", ".join(unknown)}', param_hint='--layer')
+    return [(name, DB_LAYERS_CONFIG[name]) for name in layers]
+
+
+@views_cli.command('create')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+def create_views(layers):
+    """创建（或重建）图层物化视图"""
+    from app.routes.api import get_geom_4326_expr
+    from app.routes.layer_views import create_layer_view, view_name
+    for layer_name, cfg in _selected_layers(layers):
+        model_class = cfg['model']
+        create_layer_view(model_class, get_geom_4326_expr(model_class))
+        click.echo(f'已创建 {view_name(model_class)}（{layer_name}）')
+
+
+@views_cli.command('refresh')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+def refresh_views(layers):
+    """刷新已存在的图层物化视图"""
+    from app.routes.layer_views import refresh_layer_view, view_name
+    for layer_name, cfg in _selected_layers(layers):
+        model_class = cfg['model']
+        if refresh_layer_view(model_class):
+            click.echo(f'已刷新 {view_name(model_class)}（{layer_name}）')
+        else:
+            click.echo(f'跳过 {layer_name}：物化视图不存在')
+
+
+@views_cli.command('drop')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+def drop_views(layers):
+    """删除图层物化视图，API 回退为直接查询原表"""
+    from app.routes.layer_views import drop_layer_view, view_name
+    for layer_name, cfg in _selected_layers(layers):
+        drop_layer_view(cfg['model'])
+        click.echo(f'已删除 {view_name(cfg["model"])}（{layer_name}）')
+
+
+search_cli = AppGroup('search', help='关键词查询相关的数据库索引')
+
+
+def _trgm_targets(model_class, fields):
+    """需要建 trigram 索引的 (表全名, 索引名前缀, [列名])：原表，以及已存在的物化视图"""
+    from sqlalchemy import String
+    from app.routes.layer_views import get_layer_view, view_name, schema_of
+    schema = schema_of(model_class)
+    prefix = f'{schema}.' if schema else ''
+
+    string_fields = [f for f in fields if isinstance(getattr(model_class, f).type, String)]
+    table = model_class.__tablename__
+    targets = [(f'{prefix}"{table}"', table, [getattr(model_class, f).name for f in string_fields])]
+    if get_layer_view(model_class) is not None:
+        # 物化视图中的列使用模型属性名
+        targets.append((f'{prefix}"{view_name(model_class)}"', view_name(model_class), string_fields))
+    return targets
+
+
+@search_cli.command('create-indexes')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+def create_search_indexes(layers):
+    """为各图层 fields 中的文本列创建 GIN trigram 索引（lower(col) gin_trgm_ops）
+
+    物化视图重建（flask views create）后需要重新运行。
+    """
+    from app import db
+    db.session.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for layer_name, cfg in _selected_layers(layers):
+        for full, index_prefix, columns in _trgm_targets(cfg['model'], cfg.get('fields', [])):
+            for column in columns:
+                db.session.execute(db.text(
+                    f'CREATE INDEX IF NOT EXISTS "{index_prefix}_{column}_trgm_idx" '
+                    f'ON {full} USING GIN (lower("{column}") gin_trgm_ops)'
+                ))
+            db.session.execute(db.text(f'ANALYZE {full}'))
+            click.echo(f'已为 {full} 建立 trigram 索引：{", ".join(columns) or "（无文本列）"}')
+    db.session.commit()
+
+
+@search_cli.command('drop-indexes')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+def drop_search_indexes(layers):
+    """删除 create-indexes 建立的 trigram 索引"""
+    from app import db
+    from app.routes.layer_views import schema_of
+    for layer_name, cfg in _selected_layers(layers):
+        schema = schema_of(cfg['model'])
+        prefix = f'{schema}.' if schema else ''
+        for _, index_prefix, columns in _trgm_targets(cfg['model'], cfg.get('fields', [])):
+            for column in columns:
+                db.session.execute(db.text(f'DROP INDEX IF EXISTS {prefix}"{index_prefix}_{column}_trgm_idx"'))
+        click.echo(f'已删除 {layer_name} 的 trigram 索引')
+    db.session.commit()
+
+
+@search_cli.command('create-fulltext')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+@click.option('--tokenizer', type=click.Choice(['auto', 'zhparser', 'bigram']), default='auto',
+              help='中文分词方式：auto 在存在 zhparser 的 chinese 配置时使用它，否则按字切分 bigram')
+def create_fulltext(layers, tokenizer):
+    """为各图层 fields 建立 search_tsv 全文检索生成列与 GIN 索引（/api/search-layer?mode=fulltext）"""
+    from app import db
+    from app.routes.fulltext import create_tokenizer_functions, create_fulltext_column, has_zhparser
+    from app.routes.layer_views import schema_of
+    use_zhparser = has_zhparser() if tokenizer == 'auto' else tokenizer == 'zhparser'
+    selected = _selected_layers(layers)
+    for schema in {schema_of(cfg['model'], 'public') for _, cfg in selected}:
+        create_tokenizer_functions(schema, use_zhparser)
+    for layer_name, cfg in selected:
+        create_fulltext_column(cfg['model'], cfg.get('fields', []))
+        click.echo(f'已为 {layer_name} 建立全文检索列（{"zhparser" if use_zhparser else "bigram"}）')
+    db.session.commit()
+
+
+@search_cli.command('drop-fulltext')
+@click.option('--layer', '-l', 'layers', multiple=True, help='图层名，可重复；默认全部图层')
+def drop_fulltext(layers):
+    """删除 search_tsv 全文检索列（索引随列一起删除）"""
+    from app import db
+    from app.routes.fulltext import drop_fulltext_column
+    for layer_name, cfg in _selected_layers(layers):
+        drop_fulltext_column(cfg['model'])
+        click.echo(f'已删除 {layer_name} 的全文检索列')
+    db.session.commit()
+
+
+analysis_cli = AppGroup('analysis', help='空间分析，结果写入数据库表')
+
+
+@analysis_cli.command('nearest-facility')
+@click.option('--source', '-s', 'sources', multiple=True, required=True, help='源图层，可重复（如 武汉市中学）')
+@click.option('--target', '-t', default='武汉市地铁站点', show_default=True, help='目标图层')
+@click.option('--k', default=1, show_default=True, type=click.IntRange(1, 10), help='每个源要素的最近目标个数')
+@click.option('--table', default='nearest_facility', show_default=True, help='结果表名（位于源图层所在 schema）')
+def nearest_facility(sources, target, k, table):
+    """批量最近设施分析，结果写入结果表（同一对源/目标图层的旧结果先删除）"""
+    import sqlalchemy as sa
+    from app import db
+    from app.routes.api import point_sets
+    from app.routes.layer_views import schema_of
+    from app.routes.nearest_batch import nearest_facilities, distance_summary
+
+    target_layer = _selected_layers([target])[0][0]
+    for source_layer, cfg in _selected_layers(sources):
+        full = f'{schema_of(cfg["model"], "public")}."{table}"'
+        db.session.execute(sa.text(
+            f'CREATE TABLE IF NOT EXISTS {full} ('
+            'source_layer text NOT NULL, source_id text NOT NULL, source_name text, rank integer NOT NULL, '
+            'target_layer text NOT NULL, target_id text NOT NULL, target_name text, distance_m double precision, '
+            'computed_at timestamptz NOT NULL DEFAULT now())'
+        ))
+        db.session.execute(sa.text(f'DELETE FROM {full} WHERE source_layer = :s AND target_layer = :t'),
+                           {'s': source_layer, 't': target_layer})
+
+        rows, dist = nearest_facilities(point_sets.get(source_layer), point_sets.get(target_layer), k)
+        if rows:
+            db.session.execute(sa.text(
+                f'INSERT INTO {full} (source_layer, source_id, source_name, rank, target_layer, target_id, target_name, distance_m) '
+                'VALUES (:source_layer, :source_id, :source_name, :rank, :target_layer, :target_id, :target_name, :distance_m)'
+            ), [dict(r, source_layer=source_layer, target_layer=target_layer,
+                     source_id=str(r['source_id']), target_id=str(r['target_id'])) for r in rows])
+        db.session.commit()
+        click.echo(f'{source_layer} -> {target_layer}：{len(rows)} 行写入 {full}，距离统计 {distance_summary(dist)}')
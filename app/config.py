@@ -11,4 +11,26 @@ class SearchConfig:
     DEBUG = True # 是否开启调试模式
     DEBUG_POI_SEARCH = False # 单独调试POI搜索功能
     searchListNum = 10
-    ifWordVec = False  # 是否启用词向量进行语义搜索
\ No newline at end of file
+    ifWordVec = False  # 是否启用词向量进行语义搜索
+    clusterMaxZoom = 16  # 点聚合：大于等于该缩放级别时返回单个点
+    clusterRadius = 60  # 点聚合：每个聚合网格的像素边长
+    singleFlightLockDir = None  # 请求合并：跨 worker 进程合并时的锁文件目录，None 表示仅进程内合并
+    singleFlightResultTTL = 1.0  # 请求合并：跨进程结果文件的有效期（秒）
+    singleFlightLockStripes = 64  # 请求合并：跨进程锁文件数，请求按键的哈希分到其中一个
+    searchAllWorkers = 6  # 跨图层查询的并发线程数（每个线程占用一个数据库连接）
+    resultCacheMaxEntries = 512  # 查询结果缓存：最多缓存的响应条数
+    resultCacheMaxBytes = 32 * 1024 * 1024  # 查询结果缓存：响应正文总字节数上限
+    resultCacheTTL = 300  # 查询结果缓存：条目有效期（秒）
+    facetCacheMaxEntries = 256  # 分面统计缓存：最多缓存的查询条数
+    facetCacheMaxBytes = 4 * 1024 * 1024  # 分面统计缓存：总字节数上限
+    searchTimeoutMs = 3000  # 查询保护：/api/search-layer、/api/search-all 每个图层的语句超时（毫秒）
+    queryTimeoutMs = 5000  # 查询保护：/api/query 组合查询的语句超时（毫秒）
+    adminSearchTimeoutMs = 3000  # 查询保护：管理后台搜索接口的语句超时（毫秒）
+    adminMaxPageSize = 100  # 管理后台搜索接口每页最多返回的条数
+    poiCheckInterval = 2.0  # POI 数据集：检查数据文件是否变化的间隔（秒）
+    exportBatchSize = 1000  # 流式导出：服务器端游标每次取回的行数
+    exportChunkBytes = 64 * 1024  # 流式导出：每次向客户端发送的最小字节数
+    analysisCacheMaxEntries = 64  # 空间分析结果缓存：最多缓存的响应条数
+    analysisCacheMaxBytes = 32 * 1024 * 1024  # 空间分析结果缓存：响应正文总字节数上限
+    analysisCacheTTL = 24 * 3600  # 空间分析结果缓存：条目有效期（秒），图层写入后立即失效
+    heatmapGridMaxEntries = 32  # 热力图：最多缓存的 (图层, 类别) 基础网格数
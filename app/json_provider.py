@@ -0,0 +1,60 @@
+# app/json_provider.py
+"""全局 JSON 序列化：安装了 orjson 时使用 orjson，否则回退到标准库 json。
+
+两种实现都直接输出 UTF-8 中文（不转义为 \\uXXXX），并把 Numeric 列返回的 Decimal 序列化为数字。
+"""
+import json
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, Decimal):
+        return float(o)
+    # 日期、UUID、dataclass 等沿用 Flask 默认处理
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """在 create_app 中通过 app.json = FastJSONProvider(app) 注册"""
+
+    ensure_ascii = False
+    sort_keys = False  # 保持字段的配置顺序，也省去排序开销
+    default = staticmethod(_default)
+
+    def _orjson_option(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        # 只有 indent/separators 这类格式参数时才走 orjson，其余自定义参数交给标准库
+        if orjson is not None and set(kwargs) <= {'indent', 'separators'}:
+            option = self._orjson_option(indent=bool(kwargs.get('indent')))
+            return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is not None:
+            # 直接生成 bytes，省去 str 的编码/解码
+            body = orjson.dumps(obj, default=_default, option=self._orjson_option(indent)) + b'\n'
+        else:
+            dump_args = {'indent': 2} if indent else {'separators': (',', ':')}
+            body = f"{json.dumps(obj, default=_default, ensure_ascii=False, sort_keys=self.sort_keys, **dump_args)}\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
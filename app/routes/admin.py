@@ -1,8 +1,13 @@
 # app/routes/admin.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models.wuhan_middle_school import WuhanMiddleSchool
-from sqlalchemy import func
+from app.signals import layer_changed
+from app.routes.search_sql import filter_by_keyword
+from app.routes.result_cache import search_cache
+from app.routes.query_guard import guard_query
+from app.config import SearchConfig
+from sqlalchemy import func, inspect
 
 # 数据模型导入
 from app.models.metro_station import MetroStation
@@ -15,17 +20,54 @@ from app.models.wuhan_primary_school import WuhanPrimarySchool
 # 创建蓝图
 admin = Blueprint('admin', __name__)
 
+# 管理接口路径中的资源名 -> 数据模型，写入成功后据此发出 layer_changed 信号
+ADMIN_MODELS = {
+    'publicservices': PublicServices,
+    'wuhanmetro': MetroStation,
+    'wuhanmiddleschool': WuhanMiddleSchool,
+    'wuhanprimaryschool': WuhanPrimarySchool,
+    'wuhanmetroline': MetroLine,
+    'metro10mincircle': Metro10minWaitCircle,
+}
+
+
+@admin.after_request
+def notify_layer_changed(response):
+    """新增/更新/删除成功后通知物化视图、缓存等派生数据刷新"""
+    if request.method != 'POST' or response.status_code != 200:
+        return response
+
+    parts = request.path.rstrip('/').split('/')
+    if len(parts) < 2:
+        return response
+    resource, action = parts[-2], parts[-1]
+    model = ADMIN_MODELS.get(resource)
+    if model is None or action not in ('add', 'update', 'delete'):
+        return response
+
+    # 新增时主键在返回数据中，更新/删除时在请求体中
+    if action == 'add':
+        data = (response.get_json(silent=True) or {}).get('data') or {}
+    else:
+        data = request.get_json(silent=True) or {}
+    pk_name = inspect(model).primary_key[0].key
+    layer_changed.send(current_app._get_current_object(), model=model, action=action, pk=data.get(pk_name))
+    return response
+
 """
 -------------------------- 公共服务POI接口 --------------------------
 """
 
 
 @admin.route('/publicservices/search', methods=['GET'])
+@search_cache.cached(PublicServices)
+@guard_query(SearchConfig.adminSearchTimeoutMs)
 def publicservices_search():
     """搜索公共服务数据"""
     keyword = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'text').lower()
     page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('pageSize', 15, type=int)
+    page_size = min(max(request.args.get('pageSize', 15, type=int), 1), SearchConfig.adminMaxPageSize)
     offset = (page - 1) * page_size
 
     # 基础查询
@@ -35,13 +77,8 @@ def publicservices_search():
         PublicServices.category
     )
 
-    # 关键词过滤
-    if keyword:
-        query = query.filter(
-            (func.lower(PublicServices.name).ilike(f'%{keyword}%')) |
-            (func.lower(PublicServices.type).ilike(f'%{keyword}%')) |
-            (func.lower(PublicServices.address).ilike(f'%{keyword}%'))
-        )
+    # 关键词过滤（mode=similar 时按相似度排序）
+    query = filter_by_keyword(query, [PublicServices.name, PublicServices.type, PublicServices.address], keyword, mode=mode)
 
     # 分页查询
     total = query.count()
@@ -206,11 +243,14 @@ def publicservices_delete():
 
 
 @admin.route('/wuhanmetro/search', methods=['GET'])
+@search_cache.cached(MetroStation)
+@guard_query(SearchConfig.adminSearchTimeoutMs)
 def wuhanmetro_search():
     """搜索地铁站点数据"""
     keyword = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'text').lower()
     page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('pageSize', 15, type=int)
+    page_size = min(max(request.args.get('pageSize', 15, type=int), 1), SearchConfig.adminMaxPageSize)
     offset = (page - 1) * page_size
 
     # 基础查询
@@ -220,12 +260,8 @@ def wuhanmetro_search():
         MetroStation.transfer
     )
 
-    # 关键词过滤
-    if keyword:
-        query = query.filter(
-            (func.lower(MetroStation.name).ilike(f'%{keyword}%')) |
-            (func.lower(MetroStation.line).ilike(f'%{keyword}%'))
-        )
+    # 关键词过滤（mode=similar 时按相似度排序）
+    query = filter_by_keyword(query, [MetroStation.name, MetroStation.line], keyword, mode=mode)
 
     # 分页查询
     total = query.count()
@@ -384,11 +420,14 @@ def wuhanmetro_delete():
 
 
 @admin.route('/wuhanmiddleschool/search', methods=['GET'])
+@search_cache.cached(WuhanMiddleSchool)
+@guard_query(SearchConfig.adminSearchTimeoutMs)
 def wuhanmiddleschool_search():
     """搜索中学数据"""
     keyword = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'text').lower()
     page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('pageSize', 15, type=int)
+    page_size = min(max(request.args.get('pageSize', 15, type=int), 1), SearchConfig.adminMaxPageSize)
     offset = (page - 1) * page_size
 
     # 基础查询
@@ -398,12 +437,8 @@ def wuhanmiddleschool_search():
         WuhanMiddleSchool.latitude
     )
 
-    # 关键词过滤
-    if keyword:
-        query = query.filter(
-            (func.lower(WuhanMiddleSchool.name).ilike(f'%{keyword}%')) |
-            (func.lower(WuhanMiddleSchool.related_address).ilike(f'%{keyword}%'))
-        )
+    # 关键词过滤（mode=similar 时按相似度排序）
+    query = filter_by_keyword(query, [WuhanMiddleSchool.name, WuhanMiddleSchool.related_address], keyword, mode=mode)
 
     # 分页查询
     total = query.count()
@@ -554,11 +589,14 @@ def wuhanmiddleschool_delete():
 
 
 @admin.route('/wuhanprimaryschool/search', methods=['GET'])
+@search_cache.cached(WuhanPrimarySchool)
+@guard_query(SearchConfig.adminSearchTimeoutMs)
 def wuhanprimaryschool_search():
     """搜索小学数据"""
     keyword = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'text').lower()
     page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('pageSize', 15, type=int)
+    page_size = min(max(request.args.get('pageSize', 15, type=int), 1), SearchConfig.adminMaxPageSize)
     offset = (page - 1) * page_size
 
     # 基础查询
@@ -568,12 +606,8 @@ def wuhanprimaryschool_search():
         WuhanPrimarySchool.latitude
     )
 
-    # 关键词过滤
-    if keyword:
-        query = query.filter(
-            (func.lower(WuhanPrimarySchool.name).ilike(f'%{keyword}%')) |
-            (func.lower(WuhanPrimarySchool.related_address).ilike(f'%{keyword}%'))
-        )
+    # 关键词过滤（mode=similar 时按相似度排序）
+    query = filter_by_keyword(query, [WuhanPrimarySchool.name, WuhanPrimarySchool.related_address], keyword, mode=mode)
 
     # 分页查询
     total = query.count()
@@ -724,11 +758,14 @@ def wuhanprimaryschool_delete():
 
 
 @admin.route('/wuhanmetroline/search', methods=['GET'])
+@search_cache.cached(MetroLine)
+@guard_query(SearchConfig.adminSearchTimeoutMs)
 def wuhanmetroline_search():
     """搜索地铁线路数据"""
     keyword = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'text').lower()
     page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('pageSize', 15, type=int)
+    page_size = min(max(request.args.get('pageSize', 15, type=int), 1), SearchConfig.adminMaxPageSize)
     offset = (page - 1) * page_size
 
     # 基础查询
@@ -737,14 +774,8 @@ def wuhanmetroline_search():
         MetroLine.origin, MetroLine.destination
     )
 
-    # 关键词过滤
-    if keyword:
-        query = query.filter(
-            (func.lower(MetroLine.name).ilike(f'%{keyword}%')) |
-            (func.lower(MetroLine.layer).ilike(f'%{keyword}%')) |
-            (func.lower(MetroLine.origin).ilike(f'%{keyword}%')) |
-            (func.lower(MetroLine.destination).ilike(f'%{keyword}%'))
-        )
+    # 关键词过滤（mode=similar 时按相似度排序）
+    query = filter_by_keyword(query, [MetroLine.name, MetroLine.layer, MetroLine.origin, MetroLine.destination], keyword, mode=mode)
 
     # 分页查询
     total = query.count()
@@ -901,11 +932,14 @@ def wuhanmetroline_delete():
 
 
 @admin.route('/metro10mincircle/search', methods=['GET'])
+@search_cache.cached(Metro10minWaitCircle)
+@guard_query(SearchConfig.adminSearchTimeoutMs)
 def metro10mincircle_search():
     """搜索地铁十分钟等时圈数据"""
     keyword = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'text').lower()
     page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('pageSize', 15, type=int)
+    page_size = min(max(request.args.get('pageSize', 15, type=int), 1), SearchConfig.adminMaxPageSize)
     offset = (page - 1) * page_size
 
     # 基础查询
@@ -916,13 +950,8 @@ def metro10mincircle_search():
         Metro10minWaitCircle.total_pop, Metro10minWaitCircle.name
     )
 
-    # 关键词过滤
-    if keyword:
-        query = query.filter(
-            (func.lower(Metro10minWaitCircle.name).ilike(f'%{keyword}%')) |
-            (func.lower(Metro10minWaitCircle.id).ilike(f'%{keyword}%')) |
-            (func.lower(Metro10minWaitCircle.aa_mode).ilike(f'%{keyword}%'))
-        )
+    # 关键词过滤（mode=similar 时按相似度排序）
+    query = filter_by_keyword(query, [Metro10minWaitCircle.name, Metro10minWaitCircle.id, Metro10minWaitCircle.aa_mode], keyword, mode=mode)
 
     # 分页查询
     total = query.count()
@@ -1,11 +1,20 @@
 from flask import Blueprint, request, jsonify, current_app
 from app import db
 from sqlalchemy.exc import OperationalError
+import csv
+import io
 import json
+import math
 import os
+import time
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from pathlib import Path
-from geoalchemy2 import Geometry
-from sqlalchemy import func, String, or_
+from urllib.parse import quote
+import numpy as np
+from geoalchemy2 import Geometry, Geography
+from sqlalchemy import func, String, or_, inspect, tuple_, select, case, cast, Float
 
 # 数据模型
 from app.models.metro_station import MetroStation
@@ -15,12 +24,17 @@ from app.models.public_services import PublicServices
 from app.models.wuhan_middle_school import WuhanMiddleSchool
 from app.models.wuhan_primary_school import WuhanPrimarySchool
 
-# 数据库矢量图层配置：模型 -> 前端显示名 -> 属性字段 -> 坐标回退字段
+# 数据库矢量图层配置：模型 -> 前端显示名 -> 属性字段 -> 坐标回退字段（-> 点聚合时统计主类别的字段）
+# tokens: 作为输入联想常用词的字段；weight: 输入联想中名称的权重字段；facets: 可做分面统计与筛选的字段
+# typo_fields: 容错匹配（mode=typo）使用的名称字段，默认 ['name']
 DB_LAYERS_CONFIG = {
     '武汉市地铁站点': {
         'model': MetroStation,
         'fields': ['name', 'line', 'color', 'transfer'],
-        'coords': ('lon_wgs84', 'lat_wgs84')
+        'coords': ('lon_wgs84', 'lat_wgs84'),
+        'cluster_by': 'line',
+        'tokens': ['line'],
+        'facets': ['line', 'transfer']
     },
         '武汉地铁线路': {  
         'model': MetroLine,
@@ -35,7 +49,11 @@ DB_LAYERS_CONFIG = {
     '公共服务': {
         'model': PublicServices,
         'fields': ['name', 'type', 'address', 'category'],
-        'coords': ('longitude', 'latitude')
+        'coords': ('longitude', 'latitude'),
+        'cluster_by': 'category',
+        'tokens': ['type', 'category'],
+        'weight': 'poiweight',
+        'facets': ['category', 'type', 'adname']
     },
     '武汉市中学': {
         'model': WuhanMiddleSchool,
@@ -57,6 +75,21 @@ from app.config import SearchConfig
 
 # 初始化wordvec配置
 from app.routes.wordvec import load_chinese_vectors, cosine_similarity, vectorize_text
+from app.routes.formats import negotiate_format, encode_feature_collection, FormatUnavailable
+from app.routes.layer_views import get_layer_view
+from app.routes.singleflight import coalesce, flight
+from app.routes.search_sql import filter_by_keyword
+from app.routes.layer_index import LayerIndexRegistry
+from app.routes.suggest import SuggestRegistry
+from app.routes.typo_index import TypoIndexRegistry
+from app.routes.poi_store import PoiDataset, PoiSnapshot
+from app.routes.nearest_batch import PointSetRegistry, nearest_facilities, distance_summary
+from app.routes.population import CoverageOverlay, match_circle_stations
+from app.routes.heatmap import BaseGridRegistry, KERNEL_TRUNCATE, density_grid, pad_extent, render_png, encode_grid
+from app.routes.fulltext import fulltext_query, fulltext_predicate
+from app.routes.result_cache import ResultCache, search_cache, analysis_cache
+from app.routes.query_guard import QueryGuard, guard_query, client_socket
+from app.routes.export import streams_export, export_response, features_ndjson, records_ndjson, csv_lines
 if SearchConfig.ifWordVec:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     WORD_VECTORS = load_chinese_vectors(os.path.join(BASE_DIR, "./src/sgns.target.word-word.dynwin5.thr10.neg5.dim300.iter5"), max_words=500000)
@@ -74,6 +107,88 @@ except Exception:
     # 如果没有安装 GDAL Python 绑定，设置环境变量作为备用
     os.environ.setdefault('SHAPE_RESTORE_SHX', 'YES')
 
+LEGACY_LONLAT_SRIDS = (900913, 900915)
+
+
+def detect_srids(model_class):
+    """表中几何实际使用的 SRID 集合，查询失败时返回空集合"""
+    geom_col = getattr(model_class, 'geometry')
+    try:
+        srid_rows = db.session.query(func.ST_SRID(geom_col)).distinct().all()
+        return {r[0] for r in srid_rows if r and r[0] is not None}
+    except Exception:
+        db.session.rollback()
+        return set()
+
+
+def get_geom_4326_expr(model_class, srids=None):
+    """返回将图层 geometry 统一到 EPSG:4326 的 SQL 表达式。
+
+    先检测表中存在的 SRID：部分数据在入库时错误使用了 900913/900915，但坐标实际为经纬度（WGS84），
+    这类表直接 ST_SetSRID 为 4326；其余表用 ST_Transform 投影到 4326。
+    """
+    geom_col = getattr(model_class, 'geometry')
+    if srids is None:
+        srids = detect_srids(model_class)
+
+    if srids & set(LEGACY_LONLAT_SRIDS):
+        # 这些表中的几何看起来已是经纬度（示例 WKT 中为 lon lat），因此直接设置为 4326
+        return func.ST_SetSRID(geom_col, 4326)
+    # 常规：将几何投影到 4326
+    return func.ST_Transform(geom_col, 4326)
+
+
+class LayerSource:
+    """图层查询的数据来源：存在物化视图（flask views create）时读视图，省去逐行的 ST_Transform；
+    否则直接查询原表。geom 为 EPSG:4326 几何表达式，geom_json 为其 GeoJSON 文本。
+    """
+
+    def __init__(self, model_class):
+        self.model = model_class
+        self.view = get_layer_view(model_class)
+        if self.view is not None:
+            self.geom = self.view.c.geom
+            self.geom_json = self.view.c.geom_json
+            self.pk = self.view.c.pk
+        else:
+            self.srids = detect_srids(model_class)
+            self.geom = get_geom_4326_expr(model_class, self.srids)
+            self.geom_json = func.ST_AsGeoJSON(self.geom)
+            self.pk = inspect(model_class).primary_key[0]
+
+    def col(self, field):
+        if self.view is not None:
+            return self.view.c[field]
+        return getattr(self.model, field)
+
+    def to_native(self, geom_4326):
+        """把 EPSG:4326 的查询几何转换到数据所在坐标系，返回 (数据几何列, 查询几何)。
+
+        空间条件写在原始几何列上才能命中其 GiST 索引；视图的 geom 列本身就是 4326。
+        表中 SRID 不唯一时退回到对数据列做转换（无法走索引）。
+        """
+        if self.view is not None:
+            return self.geom, geom_4326
+        if len(self.srids) != 1:
+            return self.geom, geom_4326
+        srid = next(iter(self.srids))
+        geom_col = getattr(self.model, 'geometry')
+        if srid in LEGACY_LONLAT_SRIDS:
+            return geom_col, func.ST_SetSRID(geom_4326, srid)
+        return geom_col, func.ST_Transform(geom_4326, srid)
+
+    def intersects(self, geom_4326):
+        geom, other = self.to_native(geom_4326)
+        return func.ST_Intersects(geom, other)
+
+
+def feature_id(value):
+    """主键作为 Feature id：Numeric(10, 0) 之类的整数主键转为 int，避免序列化成 123.0"""
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)
+    return value
+
+
 def load_db_layer_as_geojson(layer_name):
     """从数据库查询矢量图层并返回 GeoJSON FeatureCollection。
     优先使用 PostGIS 的 ST_AsGeoJSON(ST_Transform(...))，若失败则回退到数值坐标字段（如 lon/lat）。
@@ -86,23 +201,8 @@ def load_db_layer_as_geojson(layer_name):
     fields = cfg.get('fields', [])
 
     try:
-        geom_col = getattr(model_class, 'geometry')
-        # 检查表中存在的 SRID
-        try:
-            srid_rows = db.session.query(func.ST_SRID(geom_col)).distinct().all()
-            srids = {r[0] for r in srid_rows if r and r[0] is not None}
-        except Exception:
-            srids = set()
-
-        # 处理历史遗留 SRID：部分数据在入库时错误使用了 900913/900915，但坐标实际为经纬度（WGS84）
-        if 900913 in srids or 900915 in srids:
-            # 这些表中的几何看起来已是经纬度（示例 WKT 中为 lon lat），因此直接设置为 4326
-            geom_json_expr = func.ST_AsGeoJSON(func.ST_SetSRID(geom_col, 4326)).label('geom_json')
-        else:
-            # 常规：将几何投影到 4326 再转为 GeoJSON
-            geom_json_expr = func.ST_AsGeoJSON(func.ST_Transform(geom_col, 4326)).label('geom_json')
-
-        cols = [geom_json_expr] + [getattr(model_class, f) for f in fields]
+        src = LayerSource(model_class)
+        cols = [src.geom_json.label('geom_json')] + [src.col(f) for f in fields] + [src.pk]
         rows = db.session.query(*cols).all()
 
         features = []
@@ -111,13 +211,13 @@ def load_db_layer_as_geojson(layer_name):
                 geom_json_str = row[0]
                 if not geom_json_str:
                     continue
-                geom_dict = json.loads(geom_json_str)
+                geom_dict = current_app.json.loads(geom_json_str)
                 properties = {}
                 for i, field in enumerate(fields):
                     val = row[i + 1]
                     if val is not None:
                         properties[field] = str(val)
-                features.append({'type': 'Feature', 'geometry': geom_dict, 'properties': properties})
+                features.append({'type': 'Feature', 'id': feature_id(row[-1]), 'geometry': geom_dict, 'properties': properties})
             except Exception:
                 continue
 
@@ -134,6 +234,7 @@ def load_db_layer_as_geojson(layer_name):
             lon_field, lat_field = coord_fields
             try:
                 cols2 = [getattr(model_class, f) for f in fields] + [getattr(model_class, lon_field), getattr(model_class, lat_field)]
+                cols2.append(inspect(model_class).primary_key[0])
                 rows2 = db.session.query(*cols2).all()
                 features = []
                 for row in rows2:
@@ -147,7 +248,7 @@ def load_db_layer_as_geojson(layer_name):
                         lat = row[len(fields) + 1]
                         if lon is None or lat is None:
                             continue
-                        features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]}, 'properties': properties})
+                        features.append({'type': 'Feature', 'id': feature_id(row[-1]), 'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]}, 'properties': properties})
                     except Exception:
                         continue
                 return {'type': 'FeatureCollection', 'features': features}
@@ -160,6 +261,97 @@ def load_db_layer_as_geojson(layer_name):
         return None
 
 
+def load_layer_documents(layer_name, pk=None):
+    """读取图层全部记录（给定 pk 时只读该条）为 [(主键, GeoJSON Feature)]，供内存索引使用"""
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    fields = cfg.get('fields', [])
+    src = LayerSource(cfg['model'])
+    q = db.session.query(src.pk, src.geom_json, *[src.col(f) for f in fields])
+    if pk is not None:
+        q = q.filter(src.pk == pk)
+
+    docs = []
+    for row in q.all():
+        if not row[1]:
+            continue
+        props = {f: str(v) for f, v in zip(fields, row[2:]) if v is not None}
+        docs.append((row[0], {'type': 'Feature', 'id': feature_id(row[0]), 'geometry': current_app.json.loads(row[1]), 'properties': props}))
+    return docs
+
+
+# 各图层属性的内存倒排索引（首次 mode=index 查询时加载，管理后台写入后增量更新）
+layer_index = LayerIndexRegistry(DB_LAYERS_CONFIG, load_layer_documents)
+typo_index = TypoIndexRegistry(DB_LAYERS_CONFIG, layer_index)
+
+
+def load_point_set(layer_name):
+    """读取图层全部要素的 (主键, 名称, 经度, 纬度)，供批量最近设施分析使用；面/线要素取 ST_PointOnSurface"""
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    fields = cfg.get('fields', [])
+    name_field = 'name' if 'name' in fields else fields[0]
+    src = LayerSource(cfg['model'])
+    point = src.geom if cfg.get('coords') else func.ST_PointOnSurface(src.geom)
+    rows = db.session.query(src.pk, src.col(name_field), func.ST_X(point), func.ST_Y(point)) \
+        .filter(src.geom.isnot(None)).order_by(src.pk).all()
+    rows = [r for r in rows if r[2] is not None and r[3] is not None]
+    return ([feature_id(r[0]) for r in rows], [r[1] for r in rows],
+            [float(r[2]) for r in rows], [float(r[3]) for r in rows])
+
+
+# 批量最近设施分析使用的点集（首次分析时加载，管理后台写入后失效）
+point_sets = PointSetRegistry(DB_LAYERS_CONFIG, load_point_set)
+
+
+# 名称中常见的行政区前缀，去掉后也作为联想词（如 武汉市第一中学 -> 第一中学）
+SUGGEST_STRIP_PREFIXES = ('湖北省', '武汉市')
+
+
+def _to_weight(value, default=1.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def load_suggest_terms():
+    """读取全部图层的联想词：[(文本, 图层, 类型, 权重)]
+
+    名称的权重取图层配置的 weight 字段（如公共服务的 poiweight），常用词的权重为出现次数。
+    """
+    terms = []
+    for layer_name, cfg in DB_LAYERS_CONFIG.items():
+        model_class = cfg['model']
+        token_fields = cfg.get('tokens', [])
+        weight_field = cfg.get('weight')
+        cols = [model_class.name] + [getattr(model_class, f) for f in token_fields]
+        if weight_field:
+            cols.append(getattr(model_class, weight_field))
+        try:
+            rows = db.session.query(*cols).all()
+        except Exception:
+            db.session.rollback()
+            continue
+
+        token_counts = {}
+        for row in rows:
+            weight = _to_weight(row[-1]) if weight_field else 1.0
+            name = row[0]
+            if name:
+                terms.append((name, layer_name, 'name', weight))
+                for prefix in SUGGEST_STRIP_PREFIXES:
+                    if name.startswith(prefix) and len(name) > len(prefix):
+                        terms.append((name[len(prefix):], layer_name, 'name', weight))
+            for value in row[1:1 + len(token_fields)]:
+                if value:
+                    token_counts[str(value)] = token_counts.get(str(value), 0) + 1
+        terms.extend((token, layer_name, 'token', float(count)) for token, count in token_counts.items())
+    return terms
+
+
+# 输入联想索引（首次 /api/suggest 请求时加载，任意图层变更后重建）
+suggest_index = SuggestRegistry(load_suggest_terms)
+
+
 # ========================== 图层管理 API ==========================
 @api.route('/layers', methods=['GET'])
 def list_layers():
@@ -234,15 +426,80 @@ def debug_db_samples():
             out[layer_name] = {'error': str(e)}
 
     return jsonify(out)
+
+
+@api.route('/debug/singleflight', methods=['GET'])
+def debug_singleflight():
+    """返回请求合并的统计：实际执行次数、被合并的请求数、跨进程复用次数、进行中的请求数"""
+    return jsonify(flight.snapshot())
+
+
+@api.route('/debug/result-cache', methods=['GET'])
+def debug_result_cache():
+    """返回查询结果缓存的统计：命中/未命中次数与命中率、淘汰/过期/失效次数、条目数与占用字节数"""
+    return jsonify(search_cache.snapshot())
+
+
+@api.route('/debug/analysis-cache', methods=['GET'])
+def debug_analysis_cache():
+    """返回空间分析结果缓存（覆盖分析等）的统计，字段同 /api/debug/result-cache"""
+    return jsonify(analysis_cache.snapshot())
+
+
+@api.route('/debug/layer-index', methods=['GET'])
+def debug_layer_index():
+    """返回已加载的内存倒排索引统计：文档数、gram 数、墓碑数"""
+    return jsonify(layer_index.stats())
+
+
+@api.route('/debug/poi-dataset', methods=['GET'])
+def debug_poi_dataset():
+    """返回 POI 数据集状态：加载/检查/失败次数、记录数、文件签名（mtime_ns, size）"""
+    return jsonify(poi_dataset.snapshot_info())
+
+
+@api.route('/debug/typo-index', methods=['GET'])
+def debug_typo_index():
+    """返回已建立的容错匹配索引统计：词条数、是否正在后台重建"""
+    return jsonify(typo_index.stats())
+
+
+def vary_on_accept(view):
+    """视图装饰器：响应内容随 Accept 头协商，所有响应（含错误）都带 Vary: Accept，避免浏览器或代理缓存串用不同格式"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        resp = current_app.make_response(view(*args, **kwargs))
+        resp.vary.add('Accept')
+        return resp
+    return wrapper
+
+
 @api.route('/geojson/<layer_name>', methods=['GET'])
+@vary_on_accept
+@coalesce
 def get_geojson(layer_name):
-    """获取指定矢量图层的 GeoJSON"""
+    """获取指定矢量图层的 GeoJSON
+
+    可选参数 format=geojson|fgb|arrow|topojson（或通过 Accept 头协商），
+    分别输出 GeoJSON、FlatGeobuf、GeoArrow 编码的 Arrow IPC 流和 TopoJSON。
+    """
     # 优先从数据库查询矢量图层
     if layer_name in DB_LAYERS_CONFIG:
+        fmt = negotiate_format(request.args.get('format'), request.accept_mimetypes)
+        if fmt is None:
+            return jsonify({"code": 400, "msg": f"不支持的格式：{request.args.get('format')}"}), 400
+
         geojson = load_db_layer_as_geojson(layer_name)
         if geojson is None:
             return jsonify({}), 500
-        return jsonify(geojson)
+        if fmt == 'geojson':
+            return jsonify(geojson)
+
+        try:
+            body, mimetype = encode_feature_collection(geojson, fmt, layer_name)
+        except FormatUnavailable as e:
+            return jsonify({"code": 406, "msg": str(e)}), 406
+        return current_app.response_class(response=body, status=200, mimetype=mimetype)
     return jsonify({}), 404
 
 
@@ -253,25 +510,213 @@ def get_imagery(layer_name):
     return jsonify({}), 404
 
 
+# ========================== 点图层聚合 ==========================
+
+def parse_bbox_arg(bbox_str):
+    """解析 bbox=min_lon,min_lat,max_lon,max_lat 参数，格式错误或缺失时返回 None"""
+    if not bbox_str:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(v) for v in bbox_str.split(',')]
+    except ValueError:
+        return None
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        return None
+    if min_lon > max_lon or min_lat > max_lat:
+        return None
+    return min_lon, min_lat, max_lon, max_lat
+
+
+@api.route('/clusters/<layer_name>', methods=['GET'])
+@coalesce
+def get_clusters(layer_name):
+    """
+    在 PostGIS 中按网格聚合点图层（ST_SnapToGrid）
+    参数：
+    - z: 地图缩放级别，决定网格大小；z >= SearchConfig.clusterMaxZoom 时直接返回单个点
+    - bbox: min_lon,min_lat,max_lon,max_lat（可选，仅聚合范围内的点）
+    返回 GeoJSON FeatureCollection，聚合点的 properties 含 count 与主类别 category
+    """
+    if layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    if not cfg.get('coords'):
+        return jsonify({"code": 400, "msg": "仅支持点图层聚合"}), 400
+
+    z = request.args.get('z', type=int)
+    if z is None or not 0 <= z <= 24:
+        return jsonify({"code": 400, "msg": "缺少或错误的参数：z"}), 400
+    bbox = parse_bbox_arg(request.args.get('bbox'))
+    if request.args.get('bbox') and bbox is None:
+        return jsonify({"code": 400, "msg": "bbox 格式应为 min_lon,min_lat,max_lon,max_lat"}), 400
+
+    model_class = cfg['model']
+    fields = cfg.get('fields', [])
+    cluster_by = cfg.get('cluster_by')
+
+    try:
+        src = LayerSource(model_class)
+        geom = src.geom
+        conds = []
+        if bbox:
+            conds.append(src.intersects(func.ST_MakeEnvelope(*bbox, 4326)))
+
+        features = []
+        if z >= SearchConfig.clusterMaxZoom:
+            # 高缩放级别：返回范围内的单个点
+            cols = [func.ST_X(geom), func.ST_Y(geom)] + [src.col(f) for f in fields]
+            rows = db.session.query(*cols).filter(*conds).all()
+            for row in rows:
+                if row[0] is None or row[1] is None:
+                    continue
+                props = {'cluster': False}
+                for i, f in enumerate(fields):
+                    v = row[i + 2]
+                    if v is not None:
+                        props[f] = str(v)
+                features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [row[0], row[1]]}, 'properties': props})
+        else:
+            # 网格边长（度）：一个 256px 瓦片覆盖 360/2^z 度，每个聚合约占 clusterRadius 像素
+            grid_size = 360.0 / (256 * 2 ** z) * SearchConfig.clusterRadius
+            cell = func.ST_SnapToGrid(geom, grid_size)
+            centroid = func.ST_Centroid(func.ST_Collect(geom))
+            cols = [func.count().label('count'), func.ST_X(centroid), func.ST_Y(centroid)]
+            if cluster_by:
+                cols.append(func.mode().within_group(src.col(cluster_by)))
+            rows = db.session.query(*cols).filter(*conds).group_by(cell).all()
+            for row in rows:
+                if row[1] is None or row[2] is None:
+                    continue
+                props = {'cluster': True, 'count': row[0]}
+                if cluster_by and row[3] is not None:
+                    props['category'] = str(row[3])
+                features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [row[1], row[2]]}, 'properties': props})
+
+        return jsonify({'type': 'FeatureCollection', 'features': features})
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return jsonify({"code": 500, "msg": f"聚合查询失败：{str(e)}"}), 500
+
+
+def load_heatmap_points(layer_name, category=None):
+    """图层（可按 cluster_by 字段的类别筛选）全部要素的经纬度数组，面/线要素取 ST_PointOnSurface"""
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    src = LayerSource(cfg['model'])
+    point = src.geom if cfg.get('coords') else func.ST_PointOnSurface(src.geom)
+    q = db.session.query(func.ST_X(point), func.ST_Y(point)).filter(src.geom.isnot(None))
+    if category is not None:
+        q = q.filter(src.col(cfg['cluster_by']) == category)
+    coords = np.array(q.all(), dtype=np.float64).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+
+# 热力图的基础网格（每个图层、类别首次请求时加载，管理后台写入后失效）
+heatmap_grids = BaseGridRegistry(DB_LAYERS_CONFIG, load_heatmap_points, SearchConfig.heatmapGridMaxEntries)
+HEATMAP_MAX_RES = 512
+HEATMAP_FORMATS = ('png', 'grid')
+
+
+@api.route('/heatmap/<layer_name>', methods=['GET'])
+def get_heatmap(layer_name):
+    """
+    点密度热力图（高斯核平滑）
+    参数：
+    - bbox: min_lon,min_lat,max_lon,max_lat（默认图层全部范围）
+    - res: 输出网格长边的单元数（默认 256，最大 512），短边按实际长宽比例
+    - bandwidth: 高斯核带宽（标准差，米，默认 300）
+    - category: 按图层 cluster_by 字段（如 公共服务 的 category）筛选
+    - max: 色阶上限（默认为当前网格最大值）；平移、缩放时固定该值可使颜色保持一致
+    - format: png（默认，带透明度的彩色图片，前端用 L.imageOverlay 按 bbox 叠加）
+              或 grid（JSON：float32 网格的 base64，第 0 行为北端）
+    基础网格按 (图层, 类别) 缓存，平移、缩放只在内存中重新分箱与平滑，不访问数据库
+    """
+    if layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    category = request.args.get('category', '').strip() or None
+    if category is not None and not cfg.get('cluster_by'):
+        return jsonify({"code": 400, "msg": f"{layer_name} 不支持按类别筛选"}), 400
+    fmt = request.args.get('format', 'png').lower()
+    if fmt not in HEATMAP_FORMATS:
+        return jsonify({"code": 400, "msg": f"不支持的格式：{fmt}"}), 400
+    res = min(max(request.args.get('res', 256, type=int), 8), HEATMAP_MAX_RES)
+    bandwidth = request.args.get('bandwidth', 300.0, type=float)
+    vmax = request.args.get('max', type=float)
+    if not math.isfinite(bandwidth) or (vmax is not None and not math.isfinite(vmax)):
+        return jsonify({"code": 400, "msg": "bandwidth、max 必须是有限的数值"}), 400
+    bandwidth = min(max(bandwidth, 10.0), 5000.0)
+    bbox = parse_bbox_arg(request.args.get('bbox'))
+    if request.args.get('bbox') and bbox is None:
+        return jsonify({"code": 400, "msg": "bbox 格式应为 min_lon,min_lat,max_lon,max_lat"}), 400
+
+    try:
+        base = heatmap_grids.get(layer_name, category)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": f"读取图层失败：{str(e)}"}), 500
+
+    if bbox is None:
+        if base.extent is None:
+            return jsonify({"code": 404, "msg": "图层中没有要素"}), 404
+        # 只有一个点（或全部点在同一位置）时范围为空，按核半径向外扩展
+        bbox = pad_extent(base.extent, KERNEL_TRUNCATE * bandwidth)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if max_lon - min_lon <= 0 or max_lat - min_lat <= 0:
+        return jsonify({"code": 400, "msg": "bbox 范围为空"}), 400
+
+    # 长边为 res 个单元，单元在米制下接近正方形
+    width_m = (max_lon - min_lon) * math.cos(math.radians((min_lat + max_lat) / 2))
+    height_m = max_lat - min_lat
+    if width_m >= height_m:
+        width, height = res, max(int(round(res * height_m / width_m)), 1)
+    else:
+        width, height = max(int(round(res * width_m / height_m)), 1), res
+    grid = density_grid(base, bbox, width, height, bandwidth)
+
+    if fmt == 'grid':
+        return jsonify({
+            'bbox': list(bbox), 'width': width, 'height': height, 'bandwidth': bandwidth,
+            'max': float(grid.max()), 'points': base.points, 'dtype': 'float32', 'data': encode_grid(grid),
+        })
+    try:
+        body = render_png(grid, vmax)
+    except FormatUnavailable as e:
+        return jsonify({"code": 406, "msg": str(e)}), 406
+    return current_app.response_class(body, mimetype='image/png', headers={
+        'X-Heatmap-Bbox': ','.join(f'{v:.6f}' for v in bbox),
+        'X-Heatmap-Max': f'{float(grid.max()):.6g}',
+    })
+
+
 # ========================== POI 数据查询 ==========================
 
+# POI 样例数据只加载一次，文件变化时后台重新加载
+poi_dataset = PoiDataset(
+    os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../data/poi_sample.json")),
+    SearchConfig.FIELDS,
+    check_interval=SearchConfig.poiCheckInterval
+)
+
+
 def load_poi_data():
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    poi_path = os.path.join(BASE_DIR, "../../data/poi_sample.json")
-    poi_path = os.path.normpath(poi_path)
-    with open(poi_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """当前的 POI 数据快照（PoiSnapshot），records 为原始记录列表"""
+    return poi_dataset.get()
 
     
-def search_poi(POI_DATA=None, keyword=None, FIELDS=SearchConfig.FIELDS):
+def search_poi(POI_DATA=None, keyword=None, FIELDS=SearchConfig.FIELDS, indices=None):
     """
     支持三种查询模式：
     1. 精确查询 exact=true
     2. 模糊查询 exact=false
     3. 语义查询 mode=semantic,没继续做
+    POI_DATA 为 PoiSnapshot，indices 为候选记录下标（默认全部）
     """
     if SearchConfig.DEBUG_POI_SEARCH:
         POI_DATA = load_poi_data()
+        indices = None
 
     keyword = request.args.get("q", "").strip().lower()
     if not keyword:
@@ -287,7 +732,7 @@ def search_poi(POI_DATA=None, keyword=None, FIELDS=SearchConfig.FIELDS):
             return jsonify([])
 
         results = []
-        for item in POI_DATA:
+        for item in POI_DATA.take(indices if indices is not None else range(len(POI_DATA))):
             # 简单将POI名字拼成字符列表进行平均向量
             item_text = "".join([str(item.get(field, "")) for field in FIELDS])
             item_vector = vectorize_text(item_text, word_vectors=WORD_VECTORS)
@@ -301,22 +746,286 @@ def search_poi(POI_DATA=None, keyword=None, FIELDS=SearchConfig.FIELDS):
     else:
         if exact:
             print("✅ 进行精确查询")
-            results = [
-                item for item in POI_DATA
-                if any(keyword == str(item.get(field, "")).lower() for field in FIELDS)
-            ]
         else:
             print("✅ 进行模糊查询")
-            results = [
-                item for item in POI_DATA
-                if any(keyword in str(item.get(field, "")).lower() for field in FIELDS)
-            ]
+        # 在预先小写化的字段列上匹配，只对命中的记录取原始数据
+        results = POI_DATA.take(POI_DATA.match_indices(keyword, exact, indices, FIELDS))
 
     return jsonify(results)
 
 
 # ========================== 矢量图层中的查询接口 ==========================
+SEARCH_MODES = ('text', 'similar', 'index', 'fulltext', 'typo')
+
+
+def apply_facet_filters(query, col_of, facet_filters):
+    """分面筛选：同一字段的多个取值之间为 OR，不同字段之间为 AND"""
+    for field, values in (facet_filters or {}).items():
+        query = query.filter(col_of(field).in_(values))
+    return query
+
+
+def layer_search_query(layer_name, keyword, exact=False, mode='text', facet_filters=None):
+    """数据库图层关键词查询（text / similar / fulltext）的 Query，分页查询与流式导出共用
+
+    每行为 (EPSG:4326 几何的 GeoJSON 文本, *图层 fields)；similar 按相似度、fulltext 按 ts_rank 排序。
+    """
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    model_class = cfg['model']
+    fields = cfg.get('fields', [])
+
+    if mode == 'fulltext':
+        geom_json = func.ST_AsGeoJSON(get_geom_4326_expr(model_class))
+        q = db.session.query(geom_json, *[getattr(model_class, f) for f in fields])
+        q = apply_facet_filters(q, lambda f: getattr(model_class, f), facet_filters)
+        return fulltext_query(q, model_class, keyword)
+
+    # 构建几何 JSON 表达式（尝试投影到 4326）
+    # 在 search 时也先检测 SRID，避免对错误 SRID 做不当 Transform；存在物化视图时直接读视图
+    try:
+        src = LayerSource(model_class)
+        geom_expr = src.geom_json.label('geom_json')
+        col_of = src.col
+    except Exception:
+        geom_expr = func.ST_AsGeoJSON(getattr(model_class, 'geometry')).label('geom_json')
+        col_of = lambda f: getattr(model_class, f)
+
+    cols = [geom_expr] + [col_of(f) for f in fields]
+    q = filter_by_keyword(db.session.query(*cols), [col_of(f) for f in fields], keyword, exact, mode)
+    return apply_facet_filters(q, col_of, facet_filters)
+
+
+def feature_rows(rows, fields):
+    """layer_search_query 的结果行 -> (GeoJSON 几何文本, 属性字典)，跳过没有几何的行"""
+    for row in rows:
+        if not row[0]:
+            continue
+        yield row[0], {f: str(v) for f, v in zip(fields, row[1:]) if v is not None}
+
+
+def search_layer_features(layer_name, keyword, exact=False, mode='text', limit=500, offset=0, facet_filters=None,
+                          max_distance=None):
+    """在数据库矢量图层中按关键词查询，返回 GeoJSON Feature 列表；查询失败时返回 None"""
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    model_class = cfg['model']
+    fields = cfg.get('fields', [])
+    if not fields:
+        return []
+
+    # 内存倒排索引，不访问数据库（索引首次加载除外）
+    if mode == 'index':
+        try:
+            return layer_index.get(layer_name).search(keyword, exact, limit=offset + limit)[offset:]
+        except Exception:
+            db.session.rollback()
+            return None
+
+    # 容错匹配：名称字段上的内存编辑距离索引，结果带编辑距离 distance
+    if mode == 'typo':
+        try:
+            return typo_index.search(layer_name, keyword, max_distance, limit=offset + limit)[offset:]
+        except Exception:
+            db.session.rollback()
+            return None
+
+    # 全文检索：search_tsv 生成列只在原表上，按 ts_rank 排序后只对当前页做坐标转换
+    if mode == 'fulltext':
+        try:
+            rows = layer_search_query(layer_name, keyword, exact, mode, facet_filters).offset(offset).limit(limit).all()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning('全文检索失败（是否已运行 flask search create-fulltext？）%s: %s', layer_name, e)
+            return None
+        return [{'type': 'Feature', 'geometry': current_app.json.loads(geom), 'properties': props}
+                for geom, props in feature_rows(rows, fields)]
+
+    try:
+        # 关键词条件（对任意字段做 LIKE / 相等 / 相似度匹配），表达式与 trigram 索引一致
+        rows = layer_search_query(layer_name, keyword, exact, mode, facet_filters).offset(offset).limit(limit).all()
+        features = []
+        for geom, props in feature_rows(rows, fields):
+            try:
+                features.append({'type': 'Feature', 'geometry': current_app.json.loads(geom), 'properties': props})
+            except Exception:
+                continue
+        return features
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+
+    # 回退到使用数值坐标字段（如果配置了 coords）
+    coord_fields = cfg.get('coords')
+    if not coord_fields:
+        return None
+    lon_field, lat_field = coord_fields
+    try:
+        cols2 = [getattr(model_class, f) for f in fields] + [getattr(model_class, lon_field), getattr(model_class, lat_field)]
+        q2 = filter_by_keyword(db.session.query(*cols2), [getattr(model_class, f) for f in fields], keyword, exact, mode)
+        q2 = apply_facet_filters(q2, lambda f: getattr(model_class, f), facet_filters)
+        rows2 = q2.offset(offset).limit(limit).all()
+        features = []
+        for row in rows2:
+            try:
+                props = {}
+                for i, f in enumerate(fields):
+                    v = row[i]
+                    if v is not None:
+                        props[f] = str(v)
+                lon = row[len(fields)]
+                lat = row[len(fields) + 1]
+                if lon is None or lat is None:
+                    continue
+                features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]}, 'properties': props})
+            except Exception:
+                continue
+        return features
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return None
+
+
+def _layer_model_arg():
+    """按 layer 参数取图层模型，作为结果缓存的失效标签"""
+    return DB_LAYERS_CONFIG.get(request.args.get('layer', '').strip(), {}).get('model')
+
+
+# 分面统计缓存：翻页、切换页大小时不必重新统计；标签同样是图层模型，写入后失效
+facet_cache = ResultCache(SearchConfig.facetCacheMaxEntries, SearchConfig.facetCacheMaxBytes, SearchConfig.resultCacheTTL)
+FACET_MODES = ('text', 'similar', 'fulltext')
+
+
+def layer_facet_counts(layer_name, keyword, exact, mode, facet_fields, facet_filters=None, top=20):
+    """在关键词与分面筛选条件下，用一条 GROUPING SETS 查询统计各分面字段的取值计数
+
+    返回 {字段: [{'value': 取值, 'count': 数量}]}，每个字段按数量降序保留前 top 个取值。
+    """
+    model_class = DB_LAYERS_CONFIG[layer_name]['model']
+    fields = DB_LAYERS_CONFIG[layer_name].get('fields', [])
+    key = repr((layer_name, ' '.join(keyword.split()), exact, mode, tuple(facet_fields),
+                sorted((f, tuple(sorted(v))) for f, v in (facet_filters or {}).items()), top))
+    entry = facet_cache.get(key)
+    if entry is not None:
+        return current_app.json.loads(entry.body)
+
+    generation = facet_cache.generation(model_class)
+    if mode == 'fulltext':
+        # search_tsv 只在原表上
+        col_of = lambda f: getattr(model_class, f)
+    else:
+        col_of = LayerSource(model_class).col
+    cols = [col_of(f) for f in facet_fields]
+
+    q = db.session.query(*cols, *[func.grouping(c) for c in cols], func.count())
+    if mode == 'fulltext':
+        q = q.filter(fulltext_predicate(model_class, keyword))
+    else:
+        # 相似度模式附带的排序对聚合无意义，去掉
+        q = filter_by_keyword(q, [col_of(f) for f in fields], keyword, exact, mode).order_by(None)
+    q = apply_facet_filters(q, col_of, facet_filters)
+    rows = q.group_by(func.grouping_sets(*[tuple_(c) for c in cols])).all()
+
+    n = len(facet_fields)
+    facets = {f: [] for f in facet_fields}
+    for row in rows:
+        # GROUPING(col) = 0 表示该行属于按 col 分组的那个分组集
+        for i, field in enumerate(facet_fields):
+            if row[n + i] == 0:
+                facets[field].append({'value': None if row[i] is None else str(row[i]), 'count': row[-1]})
+                break
+    for field in facet_fields:
+        facets[field] = sorted(facets[field], key=lambda v: -v['count'])[:top]
+
+    facet_cache.set(key, 200, 'application/json', current_app.json.dumps(facets).encode('utf-8'),
+                    model_class, generation)
+    return facets
+
+
+def parse_facet_args(layer_name, mode):
+    """解析 facets 与 facet_<字段> 参数，返回 (分面字段列表, {字段: 取值列表})；字段不在图层配置中或模式不支持时抛出 ValueError"""
+    allowed = DB_LAYERS_CONFIG[layer_name].get('facets', [])
+    facet_fields = [f.strip() for f in request.args.get('facets', '').split(',') if f.strip()]
+    facet_filters = {
+        key[len('facet_'):]: request.args.getlist(key)
+        for key in request.args if key.startswith('facet_')
+    }
+    unknown = [f for f in list(facet_fields) + list(facet_filters) if f not in allowed]
+    if unknown:
+        raise ValueError(f"图层不支持的分面字段：{','.join(unknown)}")
+    if (facet_fields or facet_filters) and mode not in FACET_MODES:
+        raise ValueError(f"{mode} 模式不支持分面")
+    return facet_fields, facet_filters
+
+
+def _streamed_rows(query, layer_name):
+    """通过服务器端游标逐批读取查询结果；传输中途出错时只能记录日志并结束输出，结束后回滚以关闭游标"""
+    try:
+        for row in query:
+            yield row
+    except Exception as e:
+        current_app.logger.warning('导出中断 %s: %s', layer_name, e)
+    finally:
+        db.session.rollback()
+
+
+def export_search_layer(fmt):
+    """/api/search-layer 的流式导出：参数与分页查询相同（忽略 page / pageSize / facets），输出全部匹配要素
+
+    数据库模式通过服务器端游标逐批读取；index / typo 模式的结果本身就在内存中，直接逐条编码。
+    CSV 的列为图层 fields 加 geometry（GeoJSON 文本）。
+    """
+    layer_name = request.args.get('layer', '').strip()
+    keyword = request.args.get('q', '').strip().lower()
+    exact = request.args.get('exact', 'false').lower() == 'true'
+    mode = request.args.get('mode', 'text').lower()
+    max_distance = request.args.get('maxDistance', type=int)
+    if max_distance is not None:
+        max_distance = min(max(max_distance, 0), 3)
+
+    if not layer_name or not keyword:
+        return jsonify({"code": 400, "msg": "缺少 layer 或 q 参数"}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({"code": 400, "msg": f"不支持的查询模式：{mode}"}), 400
+    if layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    try:
+        _, facet_filters = parse_facet_args(layer_name, mode)
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+
+    fields = DB_LAYERS_CONFIG[layer_name].get('fields', [])
+    try:
+        if mode in ('index', 'typo'):
+            if mode == 'index':
+                features = layer_index.get(layer_name).search(keyword, exact)
+            else:
+                features = typo_index.search(layer_name, keyword, max_distance)
+            rows = ((json.dumps(f['geometry'], ensure_ascii=False), f['properties']) for f in features)
+        else:
+            # 在返回响应之前执行查询：SQL 错误（如未建全文检索列）仍能以 500 返回
+            query = layer_search_query(layer_name, keyword, exact, mode, facet_filters)
+            result = iter(query.yield_per(SearchConfig.exportBatchSize))
+            rows = feature_rows(_streamed_rows(result, layer_name), fields)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": f"导出查询失败：{str(e)}"}), 500
+
+    if fmt == 'ndjson':
+        lines = features_ndjson(rows)
+    else:
+        lines = csv_lines((dict(props, geometry=geom) for geom, props in rows), fields + ['geometry'])
+    return export_response(lines, fmt, f'{layer_name}_{keyword}')
+
+
 @api.route('/search-layer', methods=['GET'])
+@streams_export(export_search_layer)
+@search_cache.cached(_layer_model_arg)
+@coalesce
+@guard_query(SearchConfig.searchTimeoutMs)
 def search_layer():
     """
     在指定矢量图层中查询
@@ -324,155 +1033,712 @@ def search_layer():
     - layer: 图层名称
     - q: 关键词
     - exact: 是否精确查询（默认模糊）
+    - mode: text（默认，子串/精确匹配）、similar（pg_trgm 相似度匹配，按相关度排序）、
+            index（使用内存 n-gram 倒排索引，不访问数据库）
+            fulltext（tsvector 全文检索，按 ts_rank 排序）
+            或 typo（名称容错匹配，内存编辑距离索引，结果按编辑距离排序并带 distance）
+    - maxDistance: typo 模式允许的最大编辑距离（默认关键词不超过 3 个字为 1，否则为 2，最大 3）
+    - page / pageSize: 分页（默认第 1 页，每页 500 条）
+    - facets: 逗号分隔的分面字段（取自图层配置 facets），给出时返回
+              {"features": [...], "facets": {字段: [{"value", "count"}]}}，否则直接返回 Feature 列表
+    - facet_<字段>: 分面筛选（可重复，同一字段多个取值为 OR），如 facet_category=医疗保健服务
+    - format: ndjson / csv 时流式导出全部匹配要素（不分页、不缓存），download=true 时作为附件下载
     """
     layer_name = request.args.get('layer', '').strip()
     keyword = request.args.get('q', '').strip().lower()
     exact = request.args.get('exact', 'false').lower() == 'true'
-    
+    mode = request.args.get('mode', 'text').lower()
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('pageSize', 500, type=int), 1), 500)
+    max_distance = request.args.get('maxDistance', type=int)
+    if max_distance is not None:
+        max_distance = min(max(max_distance, 0), 3)
+
     if not layer_name or not keyword:
         return jsonify([]), 400
-    
+    if mode not in SEARCH_MODES:
+        return jsonify({"code": 400, "msg": f"不支持的查询模式：{mode}"}), 400
+
     # 如果是数据库矢量图层，通过 SQLAlchemy 在数据库中过滤查询
     if layer_name in DB_LAYERS_CONFIG:
-        cfg = DB_LAYERS_CONFIG[layer_name]
-        model_class = cfg['model']
-        fields = cfg.get('fields', [])
+        try:
+            facet_fields, facet_filters = parse_facet_args(layer_name, mode)
+        except ValueError as e:
+            return jsonify({"code": 400, "msg": str(e)}), 400
+
+        features = search_layer_features(layer_name, keyword, exact, mode, limit=page_size,
+                                         offset=(page - 1) * page_size, facet_filters=facet_filters,
+                                         max_distance=max_distance)
+        if features is None:
+            return jsonify([]), 500
+        if not facet_fields:
+            return jsonify(features)
 
-        # 构建几何 JSON 表达式（尝试投影到 4326）
-        # 在 search 时也先检测 SRID，避免对错误 SRID 做不当 Transform
         try:
-            geom_col = getattr(model_class, 'geometry')
-            try:
-                srid_rows = db.session.query(func.ST_SRID(geom_col)).distinct().all()
-                srids = {r[0] for r in srid_rows if r and r[0] is not None}
-            except Exception:
-                srids = set()
+            facets = layer_facet_counts(layer_name, keyword, exact, mode, facet_fields, facet_filters)
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"code": 500, "msg": f"分面统计失败：{str(e)}"}), 500
+        return jsonify({'features': features, 'facets': facets})
 
-            if 900913 in srids or 900915 in srids:
-                geom_expr = func.ST_AsGeoJSON(func.ST_SetSRID(geom_col, 4326)).label('geom_json')
-            else:
-                geom_expr = func.ST_AsGeoJSON(func.ST_Transform(geom_col, 4326)).label('geom_json')
+    return jsonify({"error": "Layer not found or not a vector layer"}), 404
+
+
+QUERY_MODES = ('text', 'similar')
+QUERY_MAX_PAGE_SIZE = 2000
+
+
+def parse_geojson_polygon(value):
+    """解析 GeoJSON Polygon/MultiPolygon（dict 或 JSON 字符串，可为 Feature），返回 GeoJSON 文本；格式错误时抛出 ValueError"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    if isinstance(value, dict) and value.get('type') == 'Feature':
+        value = value.get('geometry')
+    if not isinstance(value, dict) or value.get('type') not in ('Polygon', 'MultiPolygon') \
+            or not value.get('coordinates'):
+        raise ValueError('geometry 应为 GeoJSON Polygon 或 MultiPolygon')
+    return json.dumps(value)
+
+
+@api.route('/query', methods=['GET', 'POST'])
+@guard_query(SearchConfig.queryTimeoutMs)
+def combined_query():
+    """
+    关键词 + 空间范围组合查询，两个条件在同一条 SQL 中求值（空间条件走 GiST 索引，关键词条件走 trigram 索引）
+    参数（GET 查询参数，或 POST JSON 请求体中的同名字段）：
+    - layer: 图层名称
+    - q: 关键词（可选）
+    - exact: 是否精确查询（默认模糊）
+    - mode: text（默认）或 similar
+    - bbox: min_lon,min_lat,max_lon,max_lat（可选，POST 时也可为数组）
+    - geometry: GeoJSON Polygon/MultiPolygon（可选，EPSG:4326）
+    - page / pageSize: 分页（默认第 1 页，每页 500 条，最多 2000 条）
+    返回 GeoJSON FeatureCollection，附带满足条件的总数 total
+    """
+    if request.method == 'POST':
+        params = request.get_json(silent=True) or {}
+    else:
+        params = request.args
+    layer_name = str(params.get('layer', '')).strip()
+    keyword = str(params.get('q', '') or '').strip().lower()
+    exact = str(params.get('exact', 'false')).lower() == 'true'
+    mode = str(params.get('mode', 'text')).lower()
+    try:
+        page = max(int(params.get('page', 1)), 1)
+        page_size = min(max(int(params.get('pageSize', 500)), 1), QUERY_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({"code": 400, "msg": "page / pageSize 应为整数"}), 400
+
+    if layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    if mode not in QUERY_MODES:
+        return jsonify({"code": 400, "msg": f"不支持的查询模式：{mode}"}), 400
+
+    raw_bbox = params.get('bbox')
+    if isinstance(raw_bbox, (list, tuple)):
+        raw_bbox = ','.join(str(v) for v in raw_bbox)
+    bbox = parse_bbox_arg(raw_bbox)
+    if raw_bbox and bbox is None:
+        return jsonify({"code": 400, "msg": "bbox 格式应为 min_lon,min_lat,max_lon,max_lat"}), 400
+    polygon = None
+    if params.get('geometry'):
+        try:
+            polygon = parse_geojson_polygon(params.get('geometry'))
+        except ValueError as e:
+            return jsonify({"code": 400, "msg": str(e)}), 400
+    if not keyword and bbox is None and polygon is None:
+        return jsonify({"code": 400, "msg": "q、bbox、geometry 至少需要一个"}), 400
+
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    fields = cfg.get('fields', [])
+    try:
+        src = LayerSource(cfg['model'])
+        cols = [src.geom_json.label('geom_json')] + [src.col(f) for f in fields] + [func.count().over().label('total')]
+        q = db.session.query(*cols)
+        if bbox:
+            q = q.filter(src.intersects(func.ST_MakeEnvelope(*bbox, 4326)))
+        if polygon:
+            q = q.filter(src.intersects(func.ST_MakeValid(func.ST_SetSRID(func.ST_GeomFromGeoJSON(polygon), 4326))))
+        q = filter_by_keyword(q, [src.col(f) for f in fields], keyword, exact, mode)
+        # 按主键排序保证分页稳定；similar 模式下主键排在相似度之后，打破相似度相同的并列
+        q = q.order_by(src.pk)
+        rows = q.offset((page - 1) * page_size).limit(page_size).all()
+
+        if rows:
+            total = rows[0][-1]
+        elif page > 1:
+            # 页码超出范围时窗口函数拿不到总数，单独计数
+            total = q.order_by(None).limit(None).offset(None).count()
+        else:
+            total = 0
+
+        features = []
+        for row in rows:
+            if not row[0]:
+                continue
+            props = {f: str(v) for f, v in zip(fields, row[1:-1]) if v is not None}
+            features.append({'type': 'Feature', 'geometry': current_app.json.loads(row[0]), 'properties': props})
+        return jsonify({'type': 'FeatureCollection', 'features': features,
+                        'total': total, 'page': page, 'pageSize': page_size})
+    except Exception as e:
+        try:
+            db.session.rollback()
         except Exception:
-            geom_expr = func.ST_AsGeoJSON(getattr(model_class, 'geometry')).label('geom_json')
+            pass
+        return jsonify({"code": 500, "msg": f"组合查询失败：{str(e)}"}), 500
 
-        cols = [geom_expr] + [getattr(model_class, f) for f in fields]
 
-        # 构建关键词过滤条件（对任意字段做 ilike / 相等匹配）
-        kw = keyword.lower()
-        conds = []
-        for f in fields:
-            col = getattr(model_class, f)
-            try:
-                if exact:
-                    conds.append(func.lower(col.cast(String)) == kw)
-                else:
-                    conds.append(func.lower(col.cast(String)).like(f"%{kw}%"))
-            except Exception:
-                # 忽略无法 cast/比较的字段
+@api.route('/select', methods=['POST'])
+@guard_query(SearchConfig.queryTimeoutMs)
+def select_by_polygon():
+    """
+    多边形（框选 / 套索）选择：返回与多边形相交的要素
+    请求体（JSON）：
+    - layer: 图层名称
+    - geometry: GeoJSON Polygon/MultiPolygon（EPSG:4326）
+    - return: ids（默认，只返回要素 id，前端按 id 在已加载的图层中高亮）或 features
+    ST_Intersects 先用几何列的 GiST 索引做包围盒筛选；多边形在整条查询中不变，PostGIS 会缓存其预处理（prepared）结构。
+    """
+    body = request.get_json(silent=True) or {}
+    layer_name = str(body.get('layer', '')).strip()
+    returning = str(body.get('return', 'ids')).lower()
+    if layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    if returning not in ('ids', 'features'):
+        return jsonify({"code": 400, "msg": "return 应为 ids 或 features"}), 400
+    try:
+        polygon = parse_geojson_polygon(body.get('geometry'))
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    fields = cfg.get('fields', [])
+    try:
+        src = LayerSource(cfg['model'])
+        # 手绘套索可能自相交，先 ST_MakeValid
+        cond = src.intersects(func.ST_MakeValid(func.ST_SetSRID(func.ST_GeomFromGeoJSON(polygon), 4326)))
+        if returning == 'ids':
+            ids = [feature_id(row[0]) for row in db.session.query(src.pk).filter(cond).order_by(src.pk).all()]
+            return jsonify({'layer': layer_name, 'count': len(ids), 'ids': ids})
+
+        cols = [src.pk, src.geom_json] + [src.col(f) for f in fields]
+        features = []
+        for row in db.session.query(*cols).filter(cond).order_by(src.pk).all():
+            if not row[1]:
                 continue
+            props = {f: str(v) for f, v in zip(fields, row[2:]) if v is not None}
+            features.append({'type': 'Feature', 'id': feature_id(row[0]),
+                             'geometry': current_app.json.loads(row[1]), 'properties': props})
+        return jsonify({'type': 'FeatureCollection', 'features': features, 'count': len(features)})
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return jsonify({"code": 500, "msg": f"选择查询失败：{str(e)}"}), 500
 
-        if not conds:
-            return jsonify([])
 
+NEAREST_FACILITY_COLUMNS = ['source_id', 'source_name', 'rank', 'target_id', 'target_name', 'distance_m']
+
+
+@api.route('/analysis/nearest-facility', methods=['GET'])
+def nearest_facility_analysis():
+    """
+    批量最近设施分析：源图层中每个要素到目标图层最近的 k 个要素及球面距离（米）
+    参数：
+    - source: 源图层（如 武汉市中学、公共服务）
+    - target: 目标图层（默认 武汉市地铁站点）
+    - k: 每个源要素返回的最近目标个数（默认 1，最多 10）
+    - format: json（默认）或 csv（附件下载）
+    两个图层都只从数据库读取一次并缓存在内存中，全部源要素在一次向量化计算中完成（cKDTree / NumPy）；
+    写入结果表见 `flask analysis nearest-facility`
+    """
+    source_name = request.args.get('source', '').strip()
+    target_name = request.args.get('target', '武汉市地铁站点').strip()
+    k = min(max(request.args.get('k', 1, type=int), 1), 10)
+    fmt = request.args.get('format', 'json').lower()
+    for name in (source_name, target_name):
+        if name not in DB_LAYERS_CONFIG:
+            return jsonify({"error": f"Layer not found or not a vector layer: {name}"}), 404
+    if fmt not in ('json', 'csv'):
+        return jsonify({"code": 400, "msg": f"不支持的格式：{fmt}"}), 400
+
+    try:
+        source, target = point_sets.get(source_name), point_sets.get(target_name)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": f"读取图层失败：{str(e)}"}), 500
+
+    t0 = time.perf_counter()
+    rows, dist = nearest_facilities(source, target, k)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=NEAREST_FACILITY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+        # 带 BOM，Excel 直接打开时中文不乱码
+        return current_app.response_class(
+            '\ufeff' + buf.getvalue(), mimetype='text/csv',
+            headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(f'{source_name}_nearest_{target_name}.csv')}"}
+        )
+    return jsonify({
+        'source': source_name,
+        'target': target_name,
+        'k': k,
+        'count': len(source),
+        'backend': target.index.backend,
+        'elapsed_ms': round(elapsed, 1),
+        'summary': distance_summary(dist),
+        'results': rows,
+    })
+
+
+def layer_geometry_type(layer_name):
+    """图层模型声明的几何类型（POINT / LINESTRING / POLYGON）"""
+    geom_type = getattr(DB_LAYERS_CONFIG[layer_name]['model'], 'geometry').type
+    return (getattr(geom_type, 'geometry_type', None) or '').upper()
+
+
+def _coverage_models():
+    """覆盖分析的缓存标签：点图层与面图层的模型，任一图层写入后失效"""
+    point_cfg = DB_LAYERS_CONFIG.get(request.args.get('layer', '').strip())
+    polygon_cfg = DB_LAYERS_CONFIG.get(request.args.get('polygons', '地铁十分钟等时圈').strip())
+    if point_cfg is None or polygon_cfg is None:
+        return None
+    return point_cfg['model'], polygon_cfg['model']
+
+
+def coverage_membership(point_layer, polygon_layer, facet_filters=None):
+    """点图层中每个要素落在哪些面内：一条 ST_Contains 连接查询
+
+    面几何转换到点图层的坐标系（LayerSource.to_native），连接条件写在点的原始几何列上，
+    对每个面用点图层的 GiST 索引找出候选点，不逐点比较全部面。
+    返回 (面列表 [(id, 名称)], 点总数, [(面 id, 点 id, 点名称)])
+    """
+    pts = LayerSource(DB_LAYERS_CONFIG[point_layer]['model'])
+    polys = LayerSource(DB_LAYERS_CONFIG[polygon_layer]['model'])
+
+    polygons = db.session.query(polys.pk, polys.col('name')).order_by(polys.pk).all()
+    total = apply_facet_filters(db.session.query(func.count(pts.pk)), pts.col, facet_filters).scalar()
+
+    point_geom, polygon_geom = pts.to_native(polys.geom)
+    q = db.session.query(polys.pk, pts.pk, pts.col('name')).filter(func.ST_Contains(polygon_geom, point_geom))
+    pairs = apply_facet_filters(q, pts.col, facet_filters).order_by(pts.pk, polys.pk).all()
+    return polygons, total, pairs
+
+
+@api.route('/analysis/coverage', methods=['GET'])
+@analysis_cache.cached(_coverage_models)
+@coalesce
+def coverage_analysis():
+    """
+    覆盖分析：点图层（学校、公共服务等）中落在等时圈内的要素，以及每个要素所在的等时圈
+    参数：
+    - layer: 点图层（如 武汉市中学、武汉市小学、公共服务）
+    - polygons: 面图层（默认 地铁十分钟等时圈）
+    - facet_<字段>: 点图层的分面筛选（取值同 /api/search-layer），如 facet_category=科教文化服务
+    返回：
+    - by_polygon: 每个面内的点数（按点数降序，包含 0）
+    - points: 被覆盖的点及其所在面的 id 列表（按点 id 排序）
+    结果缓存到两个图层中任一图层被修改为止
+    """
+    point_layer = request.args.get('layer', '').strip()
+    polygon_layer = request.args.get('polygons', '地铁十分钟等时圈').strip()
+    for name in (point_layer, polygon_layer):
+        if name not in DB_LAYERS_CONFIG:
+            return jsonify({"error": f"Layer not found or not a vector layer: {name}"}), 404
+    if layer_geometry_type(point_layer) != 'POINT':
+        return jsonify({"code": 400, "msg": f"{point_layer} 不是点图层"}), 400
+    if layer_geometry_type(polygon_layer) not in ('POLYGON', 'MULTIPOLYGON'):
+        return jsonify({"code": 400, "msg": f"{polygon_layer} 不是面图层"}), 400
+    try:
+        _, facet_filters = parse_facet_args(point_layer, 'text')
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+
+    t0 = time.perf_counter()
+    try:
+        polygons, total, pairs = coverage_membership(point_layer, polygon_layer, facet_filters)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": f"覆盖分析失败：{str(e)}"}), 500
+
+    counts = {}
+    points = {}
+    for polygon_id, point_id, point_name in pairs:
+        polygon_id, point_id = feature_id(polygon_id), feature_id(point_id)
+        counts[polygon_id] = counts.get(polygon_id, 0) + 1
+        point = points.get(point_id)
+        if point is None:
+            point = points[point_id] = {'id': point_id, 'name': point_name, 'polygons': []}
+        point['polygons'].append(polygon_id)
+    by_polygon = [{'id': feature_id(pk), 'name': name, 'count': counts.get(feature_id(pk), 0)} for pk, name in polygons]
+    by_polygon.sort(key=lambda p: -p['count'])
+
+    return jsonify({
+        'layer': point_layer,
+        'polygons': polygon_layer,
+        'total': total,
+        'covered': len(points),
+        'coverage_ratio': round(len(points) / total, 4) if total else None,
+        'elapsed_ms': round((time.perf_counter() - t0) * 1000, 1),
+        'by_polygon': by_polygon,
+        'points': list(points.values()),
+    })
+
+
+# 等时圈的 total_pop 为文本：只接受非负数字（可带小数），其余（空串、“-”等）视为未知
+POPULATION_PATTERN = r'^[0-9]+(\.[0-9]+)?$'
+POPULATION_GROUPS = ('line', 'none')
+
+
+def population_overlay(circle_model):
+    """在数据库中把等时圈叠加切分为互不重叠的碎片
+
+    边界线 ST_Union 后相互打断，ST_Polygonize 得到全部碎片；碎片内一点（ST_PointOnSurface）落在哪些等时圈内，
+    碎片就被哪些等时圈覆盖（不被任何等时圈覆盖的空洞不出现在结果中）。面积按椭球（geography）计算，单位平方米。
+    返回 (等时圈行 [(id, 名称, 人口或 None, 面积)], 覆盖行 [(碎片编号, 碎片面积, 等时圈 id)])
+    """
+    src = LayerSource(circle_model)
+    pop_text = func.trim(src.col('total_pop'))
+    pop = case((pop_text.op('~')(POPULATION_PATTERN), cast(pop_text, Float)), else_=None)
+    circles = select(
+        src.pk.label('fid'), src.col('name').label('name'), pop.label('pop'),
+        func.ST_MakeValid(src.geom).label('geom')
+    ).where(src.geom.isnot(None)).cte('circles')
+    area = lambda geom: func.ST_Area(cast(geom, Geography(srid=4326)))
+
+    noded = select(func.ST_Union(func.ST_Boundary(circles.c.geom)).label('geom')).cte('noded')
+    dumped = select(func.ST_Dump(func.ST_Polygonize(noded.c.geom)).geom.label('geom')).subquery('dumped')
+    pieces = select(func.row_number().over().label('piece'), dumped.c.geom).cte('pieces')
+
+    circle_rows = db.session.execute(
+        select(circles.c.fid, circles.c.name, circles.c.pop, area(circles.c.geom)).order_by(circles.c.fid)
+    ).all()
+    pair_rows = db.session.execute(
+        select(pieces.c.piece, area(pieces.c.geom), circles.c.fid)
+        .join_from(pieces, circles, func.ST_Contains(circles.c.geom, func.ST_PointOnSurface(pieces.c.geom)))
+    ).all()
+    return circle_rows, pair_rows
+
+
+def _population_models():
+    """人口覆盖分析的缓存标签：等时圈与车站（按线路分组时用到）两个图层"""
+    return Metro10minWaitCircle, MetroStation
+
+
+@api.route('/analysis/population-coverage', methods=['GET'])
+@analysis_cache.cached(_population_models)
+@coalesce
+def population_coverage():
+    """
+    地铁十分钟等时圈覆盖人口（去重）：重叠区域的人口只计一次
+    参数：
+    - group: line（默认，按地铁线路汇总；等时圈按名称前缀对应到车站，换乘站计入其全部线路）或 none（只返回全部等时圈的合计）
+    返回 total 与 by_line，每项含去重人口 population、各圈 total_pop 直接相加的 naive_sum、覆盖面积 area_km2 与等时圈数；
+    total_pop 无法解析为数字的等时圈列在 unknown_population 中，不计入人口。
+    人口按每个等时圈内均匀分布估算，重叠碎片的密度取覆盖它的各等时圈密度的平均值。
+    结果缓存到等时圈或车站图层被修改为止
+    """
+    group = request.args.get('group', 'line').lower()
+    if group not in POPULATION_GROUPS:
+        return jsonify({"code": 400, "msg": f"不支持的分组：{group}"}), 400
+
+    t0 = time.perf_counter()
+    try:
+        circle_rows, pair_rows = population_overlay(Metro10minWaitCircle)
+        station_rows = db.session.query(MetroStation.name, MetroStation.line).all() if group == 'line' else []
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"code": 500, "msg": f"人口覆盖分析失败：{str(e)}"}), 500
+
+    circle_ids = np.array([feature_id(r[0]) for r in circle_rows])
+    circle_pop = np.array([np.nan if r[2] is None else r[2] for r in circle_rows], dtype=np.float64)
+    circle_area = np.array([r[3] or 0.0 for r in circle_rows], dtype=np.float64)
+    pairs = np.array([(r[0], r[1], feature_id(r[2])) for r in pair_rows], dtype=np.float64).reshape(-1, 3)
+    piece_ids, first, pair_piece = np.unique(pairs[:, 0], return_index=True, return_inverse=True)
+    # circle_rows 按 id 排序，覆盖行中的等时圈 id 用二分查找映射为下标
+    pair_circle = np.searchsorted(circle_ids, pairs[:, 2])
+    overlay = CoverageOverlay(pairs[first, 1], pair_piece, pair_circle, circle_pop, circle_area)
+
+    population, naive, area = overlay.total()
+    result = {
+        'total': {
+            'population': round(population), 'naive_sum': round(naive),
+            'area_km2': round(area / 1e6, 3), 'circles': len(circle_rows),
+        },
+        'unknown_population': [r[1] for r in circle_rows if r[2] is None],
+    }
+
+    if group == 'line':
+        lines_of = {}
+        for name, line in station_rows:
+            if name and line:
+                lines_of.setdefault(name.strip(), set()).add(line.strip())
+        stations = match_circle_stations([r[1] for r in circle_rows], list(lines_of))
+        lines = sorted({line for ls in lines_of.values() for line in ls})
+        line_index = {line: i for i, line in enumerate(lines)}
+        memberships = [(i, line_index[line]) for i, station in enumerate(stations) if station
+                       for line in lines_of[station]]
+        group_circle, group_line = zip(*memberships) if memberships else ((), ())
+        pops, naives, areas, counts = overlay.summarise((group_circle, group_line), len(lines))
+        result['by_line'] = sorted((
+            {'line': line, 'population': round(float(pops[i])), 'naive_sum': round(float(naives[i])),
+             'area_km2': round(float(areas[i]) / 1e6, 3), 'circles': int(counts[i])}
+            for i, line in enumerate(lines)
+        ), key=lambda r: -r['population'])
+        result['unmatched'] = [r[1] for r, station in zip(circle_rows, stations) if station is None]
+
+    result['elapsed_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+    return jsonify(result)
+
+
+NEAREST_MAX_K = 100
+# <-> 按数据坐标系的平面距离排序，与球面距离的先后可能略有不同：先多取候选，再按球面距离重排
+NEAREST_OVERSAMPLE = 4
+
+
+@api.route('/nearest', methods=['GET'])
+@guard_query(SearchConfig.queryTimeoutMs)
+def nearest():
+    """
+    最近邻查询（KNN）
+    参数：
+    - layer: 图层名称
+    - lon / lat: 查询点（EPSG:4326）
+    - k: 返回个数（默认 5，最多 100）
+    - maxDistance: 最大距离（米，可选）
+    用 <-> 运算符在几何列的 GiST 索引上按距离取候选（查询点转换到数据坐标系），
+    耗时基本不随表的大小增长；distance 为 ST_DistanceSphere 计算的球面距离（米），结果按其升序排列
+    """
+    layer_name = request.args.get('layer', '').strip()
+    lon = request.args.get('lon', type=float)
+    lat = request.args.get('lat', type=float)
+    k = min(max(request.args.get('k', 5, type=int), 1), NEAREST_MAX_K)
+    max_distance = request.args.get('maxDistance', type=float)
+
+    if layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    if lon is None or lat is None or not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        return jsonify({"code": 400, "msg": "缺少或错误的参数：lon / lat"}), 400
+    if request.args.get('maxDistance') and not (max_distance is not None and math.isfinite(max_distance) and max_distance >= 0):
+        return jsonify({"code": 400, "msg": "错误的参数：maxDistance 应为非负的有限数值"}), 400
+
+    cfg = DB_LAYERS_CONFIG[layer_name]
+    fields = cfg.get('fields', [])
+    try:
+        src = LayerSource(cfg['model'])
+        point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+        native_geom, native_point = src.to_native(point)
+        candidates = db.session.query(
+            src.pk.label('pk'),
+            src.geom_json.label('geom_json'),
+            func.ST_DistanceSphere(src.geom, point).label('distance'),
+            *[src.col(f).label(f'f{i}') for i, f in enumerate(fields)]
+        ).order_by(native_geom.op('<->')(native_point)) \
+         .limit(max(k * NEAREST_OVERSAMPLE, k + 16)).subquery()
+
+        q = db.session.query(candidates)
+        if max_distance is not None:
+            q = q.filter(candidates.c.distance <= max_distance)
+        rows = q.order_by(candidates.c.distance).limit(k).all()
+
+        features = []
+        for row in rows:
+            if not row.geom_json:
+                continue
+            props = {f: str(v) for f, v in zip(fields, row[3:]) if v is not None}
+            features.append({'type': 'Feature', 'id': feature_id(row.pk),
+                             'geometry': current_app.json.loads(row.geom_json),
+                             'properties': props, 'distance': round(float(row.distance), 2)})
+        return jsonify({'type': 'FeatureCollection', 'features': features,
+                        'query': {'lon': lon, 'lat': lat, 'k': k, 'maxDistance': max_distance}})
+    except Exception as e:
         try:
-            q = db.session.query(*cols).filter(or_(*conds)).limit(500)
-            rows = q.all()
-            features = []
-            for row in rows:
-                try:
-                    geom_json_str = row[0]
-                    if not geom_json_str:
-                        continue
-                    geom_dict = json.loads(geom_json_str)
-                    props = {}
-                    for i, f in enumerate(fields):
-                        v = row[i + 1]
-                        if v is not None:
-                            props[f] = str(v)
-                    features.append({'type': 'Feature', 'geometry': geom_dict, 'properties': props})
-                except Exception:
-                    continue
-            return jsonify(features)
-        except Exception as e:
-            try:
-                db.session.rollback()
-            except Exception:
-                pass
-            # 回退到使用数值坐标字段（如果配置了 coords）
-            coord_fields = cfg.get('coords')
-            if coord_fields:
-                lon_field, lat_field = coord_fields
-                try:
-                    cols2 = [getattr(model_class, f) for f in fields] + [getattr(model_class, lon_field), getattr(model_class, lat_field)]
-                    rows2 = db.session.query(*cols2).filter(or_(*conds)).limit(500).all()
-                    features = []
-                    for row in rows2:
-                        try:
-                            props = {}
-                            for i, f in enumerate(fields):
-                                v = row[i]
-                                if v is not None:
-                                    props[f] = str(v)
-                            lon = row[len(fields)]
-                            lat = row[len(fields) + 1]
-                            if lon is None or lat is None:
-                                continue
-                            features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [float(lon), float(lat)]}, 'properties': props})
-                        except Exception:
-                            continue
-                    return jsonify(features)
-                except Exception:
-                    try:
-                        db.session.rollback()
-                    except Exception:
-                        pass
-                    return jsonify([]), 500
-            return jsonify([]), 500
+            db.session.rollback()
+        except Exception:
+            pass
+        return jsonify({"code": 500, "msg": f"最近邻查询失败：{str(e)}"}), 500
+
+
+# 跨图层查询共用的有界线程池，限制同时占用的数据库连接数
+_search_pool = ThreadPoolExecutor(max_workers=SearchConfig.searchAllWorkers, thread_name_prefix='search-all')
+
+
+@api.route('/suggest', methods=['GET'])
+def suggest():
+    """
+    输入联想（内存前缀索引，不访问数据库）
+    参数：
+    - q: 已输入的前缀
+    - layer: 图层名称（可选，默认全部图层）
+    - n: 返回条数（默认 10，最多 50）
+    """
+    prefix = request.args.get('q', '').strip()
+    layer_name = request.args.get('layer', '').strip()
+    n = min(max(request.args.get('n', 10, type=int), 1), 50)
+    if layer_name and layer_name not in DB_LAYERS_CONFIG:
+        return jsonify({"error": "Layer not found or not a vector layer"}), 404
+    if not prefix:
+        return jsonify({'q': prefix, 'suggestions': []})
+    return jsonify({'q': prefix, 'suggestions': suggest_index.get(layer_name).suggest(prefix, n)})
+
+
+def _rank_feature(feature, kw):
+    """跨图层排序用的匹配度：名称完全相同 > 名称前缀 > 名称包含 > 其他字段命中"""
+    props = feature.get('properties') or {}
+    name = str(props.get('name', '')).lower()
+    if name == kw:
+        score = 3
+    elif name.startswith(kw):
+        score = 2
+    elif kw in name:
+        score = 1
+    else:
+        score = 0
+    return score, -len(name)
+
+
+@api.route('/search-all', methods=['GET'])
+def search_all():
+    """
+    在全部矢量图层中同时查询（线程池并发，每个线程使用独立的应用上下文与数据库连接）
+    参数：
+    - q: 关键词
+    - exact / mode: 同 /api/search-layer
+    - limit: 每个图层返回的结果数（默认 20，范围 1~500），count 为该图层的命中总数（上限 500）
+    返回按匹配度排序的分组结果，以及各图层的命中数与耗时；
+    某个图层超时（SearchConfig.searchTimeoutMs）时该组带 error，整体标记 partial
+    """
+    keyword = request.args.get('q', '').strip().lower()
+    exact = request.args.get('exact', 'false').lower() == 'true'
+    mode = request.args.get('mode', 'text').lower()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 500)
+
+    if not keyword:
+        return jsonify({"code": 400, "msg": "缺少参数：q"}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({"code": 400, "msg": f"不支持的查询模式：{mode}"}), 400
+
+    app = current_app._get_current_object()
+    sock = client_socket(request.environ)
+    label = request.full_path
+
+    def run(layer_name):
+        # 每个图层单独计时，一个图层超时不影响其他图层返回
+        with app.app_context(), QueryGuard(SearchConfig.searchTimeoutMs, sock, f'{label} [{layer_name}]') as guard:
+            t0 = time.perf_counter()
+            features = search_layer_features(layer_name, keyword, exact, mode)
+            return features, (time.perf_counter() - t0) * 1000, guard.outcome
+
+    t_start = time.perf_counter()
+    groups = []
+    # 每组的最佳匹配度，用于组间排序（不写入返回结果）
+    best = []
+    futures = {name: _search_pool.submit(run, name) for name in DB_LAYERS_CONFIG}
+    partial = False
+    for layer_name, future in futures.items():
+        features, elapsed, outcome = future.result()
+        group = {'layer': layer_name, 'elapsed_ms': round(elapsed, 1)}
+        group_best = (-1, 0)
+        if outcome is not None:
+            partial = True
+            group.update({'count': 0, 'features': [], 'error': '查询超时' if outcome == 'timeout' else '查询已取消'})
+        elif features is None:
+            group.update({'count': 0, 'features': [], 'error': '查询失败'})
+        else:
+            ranked = sorted(features, key=lambda f: _rank_feature(f, keyword), reverse=True)
+            group.update({'count': len(features), 'features': ranked[:limit]})
+            if ranked:
+                group_best = _rank_feature(ranked[0], keyword)
+        groups.append(group)
+        best.append(group_best)
+
+    # 组间排序：最佳匹配度高的图层在前，其次是命中数多的图层
+    order = sorted(range(len(groups)), key=lambda i: (best[i], groups[i]['count']), reverse=True)
+    groups = [groups[i] for i in order]
+    return jsonify({
+        'q': keyword,
+        'total': sum(g['count'] for g in groups),
+        'partial': partial,
+        'elapsed_ms': round((time.perf_counter() - t_start) * 1000, 1),
+        'layers': groups,
+    })
+
 
-    return jsonify({"error": "Layer not found or not a vector layer"}), 404
-    
 # 接收矩形框参数
 def get_bbox_params():
     """
     从请求中接收矩形框四个坐标
     返回:
         min_lon, min_lat, max_lon, max_lat (float)
-        如果参数缺失或错误，返回 None
+        如果参数缺失、无法解析或不是有限值（nan / inf），返回 None
     """
     try:
         min_lon = float(request.args.get('min_lon'))
         min_lat = float(request.args.get('min_lat'))
         max_lon = float(request.args.get('max_lon'))
         max_lat = float(request.args.get('max_lat'))
+        if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+            return None
         print(f"✅ 收到矩形坐标: min_lon={min_lon}, min_lat={min_lat}, max_lon={max_lon}, max_lat={max_lat}")
         return min_lon, min_lat, max_lon, max_lat
     except (TypeError, ValueError):
         return None
     
 
+def export_poi(fmt):
+    """/api/search 的流式导出：与普通查询相同的矩形范围与关键词条件，逐条输出匹配的 POI 记录
+
+    记录已在内存快照中，只保存命中的下标，输出时按下标逐条编码；导出期间数据文件被重新加载也不影响本次输出。
+    CSV 的列为 SearchConfig.FIELDS 加 lon、lat。
+    """
+    POI_DATA = load_poi_data() if SearchConfig.DEBUG else PoiSnapshot([], SearchConfig.FIELDS)
+    keyword = request.args.get("q", "").strip().lower()
+    exact = request.args.get("exact", "false").lower() == "true"
+    if request.args.get("mode", "text").lower() == "semantic":
+        return jsonify({"code": 400, "msg": "语义查询不支持导出"}), 400
+
+    # 与普通查询一致：没有关键词时结果为空
+    indices = []
+    if keyword:
+        coords = get_bbox_params()
+        candidates = POI_DATA.bbox_indices(*coords) if coords else None
+        indices = POI_DATA.match_indices(keyword, exact, candidates, SearchConfig.FIELDS).tolist()
+    records = (POI_DATA.records[i] for i in indices)
+
+    if fmt == 'ndjson':
+        lines = records_ndjson(records)
+    else:
+        lines = csv_lines(records, SearchConfig.FIELDS + ['lon', 'lat'])
+    return export_response(lines, fmt, f'poi_{keyword}')
+
+
 # 矩形范围查询
 @api.route('/search')
+@streams_export(export_poi)
 def bbox_query():
-    # 加载 POI 测试数据
-    POI_DATA = load_poi_data() if SearchConfig.DEBUG else []
+    """
+    POI 查询：q 关键词（exact、mode 同 search_poi），可选矩形范围 min_lon/min_lat/max_lon/max_lat；
+    format=ndjson / csv 时流式导出全部结果，download=true 时作为附件下载
+    """
+    # 加载 POI 测试数据（内存快照，文件未变化时不重新读取）
+    POI_DATA = load_poi_data() if SearchConfig.DEBUG else PoiSnapshot([], SearchConfig.FIELDS)
 
     # 获取矩形范围
     coords = get_bbox_params()
     print(coords)
     if coords:
         print("✅ 进行矩形范围过滤")
-        min_lon, min_lat, max_lon, max_lat = coords
-        filtered = [
-            item for item in POI_DATA
-            if min_lon <= item.get("lon", 9999) <= max_lon
-            and min_lat <= item.get("lat", 9999) <= max_lat
-        ]
+        filtered = POI_DATA.bbox_indices(*coords)
     else:
-        filtered = POI_DATA
+        filtered = None
 
     # 关键字搜索
     keyword = request.args.get("q", "").strip().lower()
-    result = search_poi(POI_DATA=filtered, keyword=keyword, FIELDS=SearchConfig.FIELDS)
+    result = search_poi(POI_DATA=POI_DATA, keyword=keyword, FIELDS=SearchConfig.FIELDS, indices=filtered)
 
     return result
 
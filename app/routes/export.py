@@ -0,0 +1,96 @@
+# app/routes/export.py
+"""查询结果的流式导出（format=ndjson|csv）：逐行编码、分块发送，不设条数上限。
+
+数据库查询用服务器端游标（Query.yield_per，psycopg2 下为命名游标）每次取回 SearchConfig.exportBatchSize 行，
+内存占用与结果总数无关；响应正文由 stream_with_context 包装的生成器产生，传输期间保持请求上下文（数据库会话）。
+流式响应既不能缓存也不能在并发请求间共享，所以导出请求由最外层的 streams_export 接管，
+不经过结果缓存、请求合并与查询超时。
+"""
+import csv
+import io
+import json
+from functools import wraps
+from urllib.parse import quote
+
+from flask import request, current_app, stream_with_context
+
+from app.config import SearchConfig
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_format():
+    """format 参数为导出格式时返回格式名，否则返回 None"""
+    fmt = request.args.get('format', '').strip().lower()
+    return fmt if fmt in EXPORT_MIMETYPES else None
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def records_ndjson(records):
+    """每条记录（dict）一行 JSON"""
+    for record in records:
+        yield _dumps(record) + '\n'
+
+
+def features_ndjson(rows):
+    """rows 为 (GeoJSON 几何文本, 属性字典)，每行一个 GeoJSON Feature；几何文本直接拼接，不做解析"""
+    for geometry, props in rows:
+        yield f'{{"type":"Feature","geometry":{geometry},"properties":{_dumps(props)}}}\n'
+
+
+def csv_lines(rows, columns):
+    """rows 为 dict，按 columns 输出（缺失的字段为空，多余的字段忽略）；带 BOM，Excel 直接打开时中文不乱码"""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction='ignore')
+    buf.write('\ufeff')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _chunked(lines, chunk_bytes):
+    """把逐行的文本合并成不小于 chunk_bytes 的 UTF-8 块再发送"""
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def export_response(lines, fmt, filename):
+    """流式响应；请求带 download=true 时附加 Content-Disposition，浏览器直接下载为 filename.<格式>"""
+    resp = current_app.response_class(
+        stream_with_context(_chunked(lines, SearchConfig.exportChunkBytes)),
+        mimetype=EXPORT_MIMETYPES[fmt]
+    )
+    if request.args.get('download', 'false').lower() == 'true':
+        resp.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(f'{filename}.{fmt}')}"
+    return resp
+
+
+def streams_export(handler):
+    """视图装饰器（放在最外层）：format 为导出格式时改由 handler(fmt) 处理，否则照常调用视图"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            fmt = export_format()
+            if fmt is None:
+                return view(*args, **kwargs)
+            return handler(fmt)
+        return wrapper
+    return decorator
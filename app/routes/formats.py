@@ -0,0 +1,229 @@
+# app/routes/formats.py
+"""矢量图层的输出格式编码：GeoJSON 之外的 FlatGeobuf / GeoArrow(Arrow IPC) / TopoJSON。
+
+FlatGeobuf 与 Arrow 依赖 geopandas（写 FlatGeobuf 需要 pyogrio/fiona，Arrow 需要 pyarrow），
+未安装时抛出 FormatUnavailable，由路由层返回 406；TopoJSON 为纯 Python 实现，无额外依赖。
+"""
+import json
+import os
+import tempfile
+
+# 格式名 -> MIME 类型
+FORMAT_MIMETYPES = {
+    'geojson': 'application/geo+json',
+    'fgb': 'application/flatgeobuf',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'topojson': 'application/topo+json',
+}
+
+# format 参数的别名
+FORMAT_ALIASES = {
+    'json': 'geojson',
+    'flatgeobuf': 'fgb',
+    'geoarrow': 'arrow',
+    'ipc': 'arrow',
+    'topo': 'topojson',
+}
+
+
+class FormatUnavailable(Exception):
+    """请求的格式因缺少可选依赖而无法编码"""
+
+
+def negotiate_format(format_arg, accept_mimetypes):
+    """根据 format 参数或 Accept 头确定输出格式，无法识别时返回 None。
+
+    显式的 format 参数优先；未给出时按 Accept 头做内容协商，默认 GeoJSON。
+    """
+    if format_arg:
+        fmt = format_arg.strip().lower()
+        fmt = FORMAT_ALIASES.get(fmt, fmt)
+        return fmt if fmt in FORMAT_MIMETYPES else None
+
+    best = accept_mimetypes.best_match(
+        list(FORMAT_MIMETYPES.values()) + ['application/json'],
+        default='application/json'
+    )
+    for fmt, mimetype in FORMAT_MIMETYPES.items():
+        if mimetype == best:
+            return fmt
+    return 'geojson'
+
+
+def encode_feature_collection(fc, fmt, layer_name='layer'):
+    """将 FeatureCollection 编码为指定格式，返回 (bytes, mimetype)"""
+    if fmt == 'geojson':
+        body = json.dumps(fc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    elif fmt == 'fgb':
+        body = to_flatgeobuf(fc)
+    elif fmt == 'arrow':
+        body = to_geoarrow_ipc(fc)
+    elif fmt == 'topojson':
+        body = json.dumps(to_topojson(fc, layer_name), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    else:
+        raise ValueError(f'未知格式：{fmt}')
+    return body, FORMAT_MIMETYPES[fmt]
+
+
+# ========================== FlatGeobuf / GeoArrow ==========================
+
+def _to_geodataframe(fc):
+    try:
+        import geopandas as gpd
+    except ImportError as e:
+        raise FormatUnavailable(f'需要安装 geopandas：{e}')
+    return gpd.GeoDataFrame.from_features(fc.get('features', []), crs='EPSG:4326')
+
+
+def to_flatgeobuf(fc):
+    """编码为带空间索引（packed Hilbert R-tree）的 FlatGeobuf"""
+    gdf = _to_geodataframe(fc)
+    # GDAL 的 FlatGeobuf 驱动需要可 seek 的真实文件，先写临时文件再读回
+    fd, path = tempfile.mkstemp(suffix='.fgb')
+    os.close(fd)
+    try:
+        try:
+            gdf.to_file(path, driver='FlatGeobuf', SPATIAL_INDEX='YES')
+        except ImportError as e:
+            raise FormatUnavailable(f'需要安装 pyogrio 或 fiona：{e}')
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def to_geoarrow_ipc(fc):
+    """编码为 Arrow IPC 流，几何列使用 GeoArrow 原生编码"""
+    gdf = _to_geodataframe(fc)
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise FormatUnavailable(f'需要安装 pyarrow：{e}')
+
+    table = pa.table(gdf.to_arrow(geometry_encoding='geoarrow'))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# ========================== TopoJSON ==========================
+
+def to_topojson(fc, object_name='layer', quantization=100000):
+    """将 FeatureCollection 编码为量化 + 差分编码的 TopoJSON Topology。
+
+    每条线/每个环作为一条 arc，完全相同（含反向）的 arc 只存储一次；
+    不做交点处的 arc 切分，因此只有完全重合的边界会被共享。
+    GeometryCollection 递归编码其中的每个几何。
+    """
+    features = fc.get('features', [])
+
+    # 计算整体范围，用于量化
+    xs, ys = [], []
+    for feature in features:
+        for x, y in _geometry_positions(feature.get('geometry')):
+            xs.append(x)
+            ys.append(y)
+    if xs:
+        x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+    else:
+        x0 = y0 = x1 = y1 = 0.0
+    kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1.0
+    ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1.0
+
+    def quantize(pos):
+        return (int(round((pos[0] - x0) / kx)), int(round((pos[1] - y0) / ky)))
+
+    arcs = []
+    arc_index = {}
+
+    def add_arc(positions):
+        points = []
+        for pos in positions:
+            q = quantize(pos)
+            if not points or points[-1] != q:
+                points.append(q)
+        if len(points) == 1:
+            points.append(points[0])
+        key = tuple(points)
+        if key in arc_index:
+            return arc_index[key]
+        reverse_key = key[::-1]
+        if reverse_key in arc_index:
+            return ~arc_index[reverse_key]
+        idx = len(arcs)
+        arc_index[key] = idx
+        arcs.append(points)
+        return idx
+
+    def encode_geometry(geom):
+        gtype = geom.get('type')
+        coords = geom.get('coordinates')
+        if gtype == 'Point':
+            return {'type': gtype, 'coordinates': list(quantize(coords))}
+        if gtype == 'MultiPoint':
+            return {'type': gtype, 'coordinates': [list(quantize(c)) for c in coords]}
+        if gtype == 'LineString':
+            return {'type': gtype, 'arcs': [add_arc(coords)]}
+        if gtype == 'MultiLineString':
+            return {'type': gtype, 'arcs': [[add_arc(line)] for line in coords]}
+        if gtype == 'Polygon':
+            return {'type': gtype, 'arcs': [[add_arc(ring)] for ring in coords]}
+        if gtype == 'MultiPolygon':
+            return {'type': gtype, 'arcs': [[[add_arc(ring)] for ring in poly] for poly in coords]}
+        if gtype == 'GeometryCollection':
+            return {'type': gtype, 'geometries': [encode_geometry(g) for g in geom.get('geometries', [])]}
+        return {'type': None}
+
+    geometries = []
+    for feature in features:
+        geom = feature.get('geometry')
+        obj = encode_geometry(geom) if geom else {'type': None}
+        if feature.get('id') is not None:
+            obj['id'] = feature['id']
+        if feature.get('properties'):
+            obj['properties'] = feature['properties']
+        geometries.append(obj)
+
+    # arc 差分编码
+    encoded_arcs = []
+    for points in arcs:
+        px, py = 0, 0
+        delta = []
+        for x, y in points:
+            delta.append([x - px, y - py])
+            px, py = x, y
+        encoded_arcs.append(delta)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [kx, ky], 'translate': [x0, y0]},
+        'bbox': [x0, y0, x1, y1],
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': encoded_arcs,
+    }
+
+
+def _geometry_positions(geom):
+    """几何中的全部 (x, y)，包括 GeometryCollection 各成员的坐标"""
+    if not geom:
+        return
+    if geom.get('type') == 'GeometryCollection':
+        for g in geom.get('geometries') or []:
+            yield from _geometry_positions(g)
+        return
+    yield from _iter_positions(geom.get('coordinates'))
+
+
+def _iter_positions(coords):
+    """递归遍历任意嵌套层级的坐标数组，逐个产出 (x, y)"""
+    if not coords:
+        return
+    if isinstance(coords[0], (int, float)):
+        yield coords[0], coords[1]
+        return
+    for c in coords:
+        yield from _iter_positions(c)
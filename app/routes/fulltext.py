@@ -0,0 +1,115 @@
+# app/routes/fulltext.py
+"""PostgreSQL 全文检索：每个图层表增加生成列 search_tsv（GIN 索引），查询按 ts_rank 排序分页。
+
+中文分词：数据库中存在 zhparser 的 chinese 文本搜索配置时使用它；否则按 unigram + bigram 切分
+（array_to_tsvector，不经过文本搜索解析器，与数据库区域设置无关）。
+分词方式由同一 schema 下的两个 SQL 函数 zh_tsvector(text)/zh_tsquery(text) 决定，
+建列与查询都调用它们，因此两者始终一致。由 `flask search create-fulltext` 创建。
+"""
+import sqlalchemy as sa
+from sqlalchemy import String, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from app import db
+from app.routes.layer_views import schema_of
+
+TSV_COLUMN = 'search_tsv'
+ZHPARSER_CONFIG = 'chinese'
+
+# 单字与相邻两字切分；按空白拆词，避免跨字段/跨词产生伪 bigram
+_BIGRAM_FUNCTIONS = r"""
+CREATE OR REPLACE FUNCTION {schema}.zh_tsvector(t text) RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT array_to_tsvector(coalesce(array_agg(DISTINCT g), '{{}}'))
+    FROM (
+        SELECT substr(w, i, n) AS g
+        FROM regexp_split_to_table(lower(coalesce(t, '')), '\s+') AS w,
+             generate_series(1, char_length(w)) AS i,
+             (VALUES (1), (2)) AS len(n)
+        WHERE w <> '' AND i + n - 1 <= char_length(w)
+    ) grams
+$$;
+
+CREATE OR REPLACE FUNCTION {schema}.zh_tsquery(q text) RETURNS tsquery
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT coalesce(string_agg(DISTINCT '''' || replace(replace(g, '\', '\\'), '''', '''''') || '''', ' & '), '')::tsquery
+    FROM (
+        SELECT CASE WHEN char_length(w) = 1 THEN w ELSE substr(w, i, 2) END AS g
+        FROM regexp_split_to_table(lower(coalesce(q, '')), '\s+') AS w,
+             generate_series(1, greatest(char_length(w) - 1, 1)) AS i
+        WHERE w <> ''
+    ) grams
+$$;
+"""
+
+_ZHPARSER_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION {schema}.zh_tsvector(t text) RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT to_tsvector('{config}', coalesce(t, ''))
+$$;
+
+CREATE OR REPLACE FUNCTION {schema}.zh_tsquery(q text) RETURNS tsquery
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT plainto_tsquery('{config}', coalesce(q, ''))
+$$;
+"""
+
+
+def _full_name(model_class):
+    return f'{schema_of(model_class, "public")}."{model_class.__tablename__}"'
+
+
+def has_zhparser():
+    return bool(db.session.execute(
+        sa.text('SELECT 1 FROM pg_ts_config WHERE cfgname = :name'), {'name': ZHPARSER_CONFIG}
+    ).scalar())
+
+
+def create_tokenizer_functions(schema, use_zhparser):
+    template = _ZHPARSER_FUNCTIONS if use_zhparser else _BIGRAM_FUNCTIONS
+    for statement in template.format(schema=schema, config=ZHPARSER_CONFIG).split('$$;'):
+        if statement.strip():
+            db.session.execute(sa.text(statement + '$$;'))
+
+
+def create_fulltext_column(model_class, fields):
+    """为表添加 search_tsv 生成列（由 fields 拼接后分词）及 GIN 索引"""
+    full = _full_name(model_class)
+    parts = []
+    for f in fields:
+        col = getattr(model_class, f)
+        expr = f'"{col.name}"' if isinstance(col.type, String) else f'"{col.name}"::text'
+        parts.append(f"coalesce({expr}, '')")
+    document = " || ' ' || ".join(parts) or "''"
+
+    db.session.execute(sa.text(f'ALTER TABLE {full} DROP COLUMN IF EXISTS {TSV_COLUMN}'))
+    db.session.execute(sa.text(
+        f'ALTER TABLE {full} ADD COLUMN {TSV_COLUMN} tsvector '
+        f'GENERATED ALWAYS AS ({schema_of(model_class, "public")}.zh_tsvector({document})) STORED'
+    ))
+    db.session.execute(sa.text(
+        f'CREATE INDEX IF NOT EXISTS "{model_class.__tablename__}_{TSV_COLUMN}_idx" ON {full} USING GIN ({TSV_COLUMN})'
+    ))
+    db.session.execute(sa.text(f'ANALYZE {full}'))
+
+
+def drop_fulltext_column(model_class):
+    db.session.execute(sa.text(f'ALTER TABLE {_full_name(model_class)} DROP COLUMN IF EXISTS {TSV_COLUMN}'))
+
+
+def _tsv_and_query(model_class, keyword):
+    tsv = sa.type_coerce(sa.literal_column(f'{_full_name(model_class)}.{TSV_COLUMN}'), TSVECTOR)
+    tsq = getattr(func, schema_of(model_class, 'public')).zh_tsquery(keyword)
+    return tsv, tsq
+
+
+def fulltext_predicate(model_class, keyword):
+    """全文匹配条件 search_tsv @@ zh_tsquery(keyword)（不排序，可用于聚合查询）"""
+    tsv, tsq = _tsv_and_query(model_class, keyword)
+    return tsv.op('@@')(tsq)
+
+
+def fulltext_query(query, model_class, keyword):
+    """给查询加上全文匹配条件并按 ts_rank 降序排序（查询需以该模型的表为 FROM）"""
+    tsv, tsq = _tsv_and_query(model_class, keyword)
+    return query.filter(tsv.op('@@')(tsq)).order_by(func.ts_rank(tsv, tsq).desc())
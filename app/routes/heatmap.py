@@ -0,0 +1,203 @@
+# app/routes/heatmap.py
+"""点密度热力图：服务器端把点分箱成网格并做高斯核平滑，前端只需叠加一张图片（或一个浮点网格）。
+
+每个 (图层, 类别) 先在固定的细网格（BASE_CELL_DEG）上分箱，得到只含非零单元的稀疏基础网格并缓存；
+请求给定范围与分辨率时，用 np.histogram2d 以计数为权重把基础网格重新分箱到输出网格，
+再做可分离的高斯卷积（先沿 x、再沿 y 的一维卷积），所以平移、缩放都不需要重新查询数据库。
+基础网格按图层缓存（按最近使用淘汰，不缓存没有点的网格），管理后台写入后经 layer_changed 信号失效。
+PNG 编码依赖 Pillow，未安装时抛出 FormatUnavailable。
+"""
+import base64
+import io
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app.routes.formats import FormatUnavailable
+from app.signals import layer_changed
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# 基础网格单元边长（度），约 20 m；输出网格单元小于它时热力图会出现块状
+BASE_CELL_DEG = 0.0002
+# 高斯核截断半径（标准差的倍数）
+KERNEL_TRUNCATE = 3.0
+# 以输出网格单元计的最大标准差：带宽相对当前视图过大时按此截断，限制边带与卷积的计算量
+MAX_SIGMA_CELLS = 32
+METERS_PER_DEG_LAT = 110574.0
+METERS_PER_DEG_LON_EQUATOR = 111320.0
+
+# 颜色渐变（与 Leaflet.heat 默认渐变一致）：归一化密度 -> RGB
+GRADIENT_STOPS = [0.0, 0.4, 0.6, 0.7, 0.8, 1.0]
+GRADIENT_COLORS = [(0, 0, 255), (0, 0, 255), (0, 255, 255), (0, 255, 0), (255, 255, 0), (255, 0, 0)]
+
+
+class BaseGrid:
+    """稀疏的基础网格：非零单元的中心经纬度与点数"""
+
+    def __init__(self, lon, lat, cell=BASE_CELL_DEG):
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        lon, lat = lon[valid], lat[valid]
+        self.cell = cell
+        self.points = len(lon)
+        ix = np.floor(lon / cell).astype(np.int64)
+        iy = np.floor(lat / cell).astype(np.int64)
+        cells, counts = np.unique(np.column_stack((ix, iy)), axis=0, return_counts=True) if len(lon) \
+            else (np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.int64))
+        self.lon = (cells[:, 0] + 0.5) * cell
+        self.lat = (cells[:, 1] + 0.5) * cell
+        self.counts = counts.astype(np.float64)
+        self.extent = (float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())) if len(lon) else None
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class BaseGridRegistry:
+    """按 (图层, 类别) 懒建基础网格；loader(layer_name, category) 返回 (经度数组, 纬度数组)
+
+    类别来自请求参数，取值不受限制：没有点的网格（如不存在的类别）不缓存，
+    缓存的网格超过 max_entries 个时淘汰最久未使用的。
+    """
+
+    def __init__(self, layers_config, loader, max_entries):
+        self.layers_config = layers_config
+        self.loader = loader
+        self.max_entries = max_entries
+        self._grids = OrderedDict()
+        self._lock = threading.Lock()
+        # 加载串行化，加载期间不阻塞已缓存网格的读取
+        self._load_lock = threading.Lock()
+        layer_changed.connect(self._on_layer_changed, weak=False)
+
+    def _cached(self, key):
+        with self._lock:
+            grid = self._grids.get(key)
+            if grid is not None:
+                self._grids.move_to_end(key)
+            return grid
+
+    def get(self, layer_name, category=None):
+        key = (layer_name, category)
+        grid = self._cached(key)
+        if grid is not None:
+            return grid
+        with self._load_lock:
+            grid = self._cached(key)
+            if grid is not None:
+                return grid
+            grid = BaseGrid(*self.loader(layer_name, category))
+            if grid.points:
+                with self._lock:
+                    self._grids[key] = grid
+                    while len(self._grids) > self.max_entries:
+                        self._grids.popitem(last=False)
+        return grid
+
+    def _on_layer_changed(self, app, model=None, **kwargs):
+        with self._lock:
+            for key in list(self._grids):
+                if self.layers_config[key[0]]['model'] is model:
+                    del self._grids[key]
+
+    def stats(self):
+        with self._lock:
+            return [{'layer': layer, 'category': category, 'points': grid.points, 'cells': len(grid)}
+                    for (layer, category), grid in self._grids.items()]
+
+
+def pad_extent(extent, margin_m):
+    """宽或高为 0 的范围（单个点、同一位置的多个点）在该方向上向两侧各扩展 margin_m 米"""
+    min_lon, min_lat, max_lon, max_lat = extent
+    if max_lon <= min_lon:
+        pad = margin_m / (METERS_PER_DEG_LON_EQUATOR * math.cos(math.radians((min_lat + max_lat) / 2)))
+        min_lon, max_lon = min_lon - pad, max_lon + pad
+    if max_lat <= min_lat:
+        pad = margin_m / METERS_PER_DEG_LAT
+        min_lat, max_lat = min_lat - pad, max_lat + pad
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def gaussian_kernel(sigma):
+    radius = max(int(math.ceil(KERNEL_TRUNCATE * sigma)), 0)
+    if sigma <= 0 or radius == 0:
+        return np.ones(1)
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def _convolve_axis(grid, kernel, axis):
+    """沿一个轴做零填充的一维卷积：按核的每个抽头对整块数组做一次移位累加"""
+    radius = len(kernel) // 2
+    if radius == 0:
+        return grid * kernel[0]
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius, radius)
+    padded = np.pad(grid, pad)
+    out = np.zeros_like(grid)
+    n = grid.shape[axis]
+    for i, w in enumerate(kernel):
+        out += w * (padded[i:i + n] if axis == 0 else padded[:, i:i + n])
+    return out
+
+
+def gaussian_blur(grid, sigma_x, sigma_y):
+    """可分离的二维高斯平滑，sigma 以网格单元为单位"""
+    return _convolve_axis(_convolve_axis(grid, gaussian_kernel(sigma_x), 1), gaussian_kernel(sigma_y), 0)
+
+
+def density_grid(base, bbox, width, height, bandwidth_m):
+    """范围 bbox 内 height x width 的平滑密度网格（float32，每个单元为核加权的点数），第 0 行为北端
+
+    四周额外多取核半径宽的边带一起分箱、平滑后再裁掉，范围外附近的点同样会影响边缘的密度。
+    带宽换算成网格单元后超过 MAX_SIGMA_CELLS 时按 MAX_SIGMA_CELLS 计。
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    dx = (max_lon - min_lon) / width
+    dy = (max_lat - min_lat) / height
+    mid_lat = math.radians((min_lat + max_lat) / 2)
+    sigma_x = min(bandwidth_m / (dx * METERS_PER_DEG_LON_EQUATOR * math.cos(mid_lat)), MAX_SIGMA_CELLS)
+    sigma_y = min(bandwidth_m / (dy * METERS_PER_DEG_LAT), MAX_SIGMA_CELLS)
+    mx = int(math.ceil(KERNEL_TRUNCATE * sigma_x))
+    my = int(math.ceil(KERNEL_TRUNCATE * sigma_y))
+
+    counts, _, _ = np.histogram2d(
+        base.lat, base.lon,
+        bins=(height + 2 * my, width + 2 * mx),
+        range=((min_lat - my * dy, max_lat + my * dy), (min_lon - mx * dx, max_lon + mx * dx)),
+        weights=base.counts,
+    )
+    smooth = gaussian_blur(counts, sigma_x, sigma_y)[my:my + height, mx:mx + width]
+    return np.ascontiguousarray(smooth[::-1], dtype=np.float32)
+
+
+def colour_map(grid, vmax=None):
+    """归一化密度 -> RGBA；密度越低越透明，0 为完全透明"""
+    vmax = float(grid.max()) if vmax is None else vmax
+    norm = np.clip(grid / vmax, 0, 1) if vmax > 0 else np.zeros_like(grid)
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    for c in range(3):
+        rgba[..., c] = np.interp(norm, GRADIENT_STOPS, [col[c] for col in GRADIENT_COLORS]).astype(np.uint8)
+    rgba[..., 3] = (np.sqrt(norm) * 255).astype(np.uint8)
+    return rgba
+
+
+def render_png(grid, vmax=None):
+    if Image is None:
+        raise FormatUnavailable('PNG 热力图需要安装 Pillow')
+    buf = io.BytesIO()
+    Image.fromarray(colour_map(grid, vmax)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def encode_grid(grid):
+    """紧凑的浮点网格：float32 小端字节的 base64，行优先、第 0 行为北端"""
+    return base64.b64encode(grid.astype('<f4').tobytes()).decode('ascii')
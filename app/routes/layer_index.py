@@ -0,0 +1,198 @@
+# app/routes/layer_index.py
+"""图层属性的内存倒排索引：字符 unigram/bigram -> 紧凑的有序 posting 数组（array('I')）。
+
+适用于数据量不大、很少变化、以短中文关键词为主的查询：
+- 子串查询：取关键词全部 bigram（单字取 unigram）的 posting 求交，再逐条校验子串，避免误报；
+- 精确查询：小写字段值 -> posting。
+索引在第一次查询时整体加载；管理后台写入后经 layer_changed 信号按主键增量更新。
+"""
+import threading
+from array import array
+
+import numpy as np
+from flask import current_app
+
+from app.signals import layer_changed
+
+# 已删除/被替换的文档占比超过该阈值时，下次查询前整体重建
+COMPACT_RATIO = 0.25
+
+
+def _grams(text):
+    """文本的全部 unigram 与 bigram"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(kw):
+    if len(kw) == 1:
+        return [kw]
+    return list({kw[i:i + 2] for i in range(len(kw) - 1)})
+
+
+class NgramIndex:
+    """单个图层的倒排索引；文档 id 只增不减，因此 posting 数组天然有序"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.features = []    # doc_id -> GeoJSON Feature，删除后为 None
+        self.texts = []       # doc_id -> 各字段小写文本的元组
+        self.pk_to_doc = {}
+        self.postings = {}    # gram -> array('I')
+        self.exact = {}       # 小写字段值 -> array('I')
+        self.deleted = 0
+        self.version = 0      # 每次增删加一，派生索引（如容错匹配的 BK 树）据此判断是否需要重建
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.pk_to_doc)
+
+    def add(self, pk, feature):
+        with self._lock:
+            if pk in self.pk_to_doc:
+                self.remove(pk)
+            doc_id = len(self.features)
+            props = feature.get('properties') or {}
+            texts = tuple(str(props.get(f, '')).lower() for f in self.fields)
+            self.features.append(feature)
+            self.texts.append(texts)
+            self.pk_to_doc[pk] = doc_id
+            self.version += 1
+
+            grams = set()
+            for text in texts:
+                if not text:
+                    continue
+                grams |= _grams(text)
+                self.exact.setdefault(text, array('I')).append(doc_id)
+            for gram in grams:
+                self.postings.setdefault(gram, array('I')).append(doc_id)
+
+    def remove(self, pk):
+        with self._lock:
+            doc_id = self.pk_to_doc.pop(pk, None)
+            if doc_id is None:
+                return
+            # 打墓碑标记，posting 中的残留 id 在查询时过滤
+            self.features[doc_id] = None
+            self.deleted += 1
+            self.version += 1
+
+    def live_documents(self):
+        """[(doc_id, Feature)]，跳过已删除的文档"""
+        with self._lock:
+            return [(doc_id, f) for doc_id, f in enumerate(self.features) if f is not None]
+
+    def needs_compaction(self):
+        return self.deleted > COMPACT_RATIO * max(len(self.features), 1)
+
+    def _candidates(self, kw):
+        lists = []
+        for gram in _query_grams(kw):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.uint32)
+            lists.append(posting)
+        # 从最短的 posting 开始求交
+        lists.sort(key=len)
+        result = np.frombuffer(lists[0], dtype=np.uint32)
+        for posting in lists[1:]:
+            if result.size == 0:
+                break
+            result = np.intersect1d(result, np.frombuffer(posting, dtype=np.uint32), assume_unique=True)
+        return result
+
+    def search(self, keyword, exact=False, limit=None):
+        """返回匹配的 Feature 列表（按文档顺序）"""
+        kw = keyword.lower()
+        if not kw:
+            return []
+        with self._lock:
+            if exact:
+                # 同一文档可能有多个字段等于关键词，去重并保持文档顺序
+                candidates = sorted(set(self.exact.get(kw, ())))
+            else:
+                candidates = self._candidates(kw).tolist()
+
+            out = []
+            for doc_id in candidates:
+                feature = self.features[doc_id]
+                if feature is None:
+                    continue
+                if not exact and not any(kw in text for text in self.texts[doc_id]):
+                    continue
+                out.append(feature)
+                if limit and len(out) >= limit:
+                    break
+            return out
+
+
+class LayerIndexRegistry:
+    """按图层懒加载 NgramIndex，并订阅 layer_changed 做增量更新
+
+    loader(layer_name, pk=None) 返回 [(pk, feature)]；给定 pk 时只返回该条记录。
+    """
+
+    def __init__(self, layers_config, loader):
+        self.layers_config = layers_config
+        self.loader = loader
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._build_locks = {name: threading.Lock() for name in layers_config}
+        layer_changed.connect(self._on_layer_changed, weak=False)
+
+    def get(self, layer_name):
+        index = self._indexes.get(layer_name)
+        if index is not None and not index.needs_compaction():
+            return index
+        with self._build_locks[layer_name]:
+            index = self._indexes.get(layer_name)
+            if index is None or index.needs_compaction():
+                index = self._build(layer_name)
+                with self._lock:
+                    self._indexes[layer_name] = index
+        return index
+
+    def loaded(self, layer_name):
+        """已加载的索引（未加载时为 None，不触发加载）"""
+        return self._indexes.get(layer_name)
+
+    def _build(self, layer_name):
+        index = NgramIndex(self.layers_config[layer_name].get('fields', []))
+        for pk, feature in self.loader(layer_name):
+            index.add(pk, feature)
+        return index
+
+    def invalidate(self, layer_name=None):
+        with self._lock:
+            if layer_name is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(layer_name, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {'docs': len(index), 'grams': len(index.postings), 'deleted': index.deleted}
+                for name, index in self._indexes.items()
+            }
+
+    def _on_layer_changed(self, app, model=None, action=None, pk=None, **kwargs):
+        for layer_name, cfg in self.layers_config.items():
+            if cfg['model'] is not model:
+                continue
+            index = self._indexes.get(layer_name)
+            if index is None:
+                continue
+            if pk is None:
+                self.invalidate(layer_name)
+                continue
+            try:
+                index.remove(pk)
+                if action != 'delete':
+                    for doc_pk, feature in self.loader(layer_name, pk=pk):
+                        index.add(doc_pk, feature)
+            except Exception as e:
+                current_app.logger.warning('增量更新倒排索引失败 %s: %s', layer_name, e)
+                self.invalidate(layer_name)
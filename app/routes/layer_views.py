@@ -0,0 +1,119 @@
+# app/routes/layer_views.py
+"""图层物化视图：预先把 geometry 统一到 EPSG:4326，并附带 GiST 索引和现成的 GeoJSON 文本。
+
+视图名为 <schema>."<表名>_wgs84"，列为 pk、模型的全部属性列（使用模型属性名）、geom、geom_json。
+由 `flask views create` 创建；管理后台写入后通过 layer_changed 信号自动 REFRESH。
+"""
+import time
+
+import sqlalchemy as sa
+from flask import current_app
+from geoalchemy2 import Geometry
+
+from app import db
+from app.signals import layer_changed
+
+VIEW_SUFFIX = '_wgs84'
+VIEW_CHECK_TTL = 60  # 秒；其他进程（如 flask views create）建好视图后，最迟在该时间后被本进程发现
+
+# 视图是否存在的进程内缓存：视图全名 -> (是否存在, 检查时间)
+_view_exists = {}
+
+
+def schema_of(model_class, default=None):
+    """模型表所在的 schema（__table_args__ 中的 schema），未指定时返回 default"""
+    table_args = getattr(model_class, '__table_args__', {}) or {}
+    return (table_args.get('schema') if isinstance(table_args, dict) else None) or default
+
+
+def view_name(model_class):
+    return model_class.__tablename__ + VIEW_SUFFIX
+
+
+def _full_name(model_class):
+    schema = schema_of(model_class)
+    name = f'"{view_name(model_class)}"'
+    return f'{schema}.{name}' if schema else name
+
+
+def _attribute_columns(model_class):
+    """模型中除 geometry 外的全部列：[(属性名, 列对象)]"""
+    mapper = sa.inspect(model_class)
+    return [(attr.key, attr.columns[0]) for attr in mapper.column_attrs if attr.key != 'geometry']
+
+
+def _pk_column(model_class):
+    return sa.inspect(model_class).primary_key[0]
+
+
+def get_layer_view(model_class):
+    """若物化视图存在，返回描述它的轻量 Table 对象，否则返回 None"""
+    full = _full_name(model_class)
+    cached = _view_exists.get(full)
+    if cached is None or time.monotonic() - cached[1] > VIEW_CHECK_TTL:
+        try:
+            exists = db.session.execute(
+                sa.text('SELECT to_regclass(:name) IS NOT NULL'), {'name': full}
+            ).scalar()
+        except Exception:
+            db.session.rollback()
+            return None
+        cached = _view_exists[full] = (bool(exists), time.monotonic())
+    if not cached[0]:
+        return None
+
+    columns = [sa.column('pk', _pk_column(model_class).type)]
+    columns += [sa.column(key, col.type) for key, col in _attribute_columns(model_class)]
+    columns += [sa.column('geom', Geometry(srid=4326)), sa.column('geom_json', sa.Text)]
+    return sa.table(view_name(model_class), *columns, schema=schema_of(model_class))
+
+
+def create_layer_view(model_class, geom_4326_expr):
+    """创建（或重建）图层物化视图及其索引"""
+    full = _full_name(model_class)
+    # 去掉 Geometry 类型，避免 geoalchemy2 在 SELECT 中自动包上 ST_AsEWKB，使视图列保持为 geometry
+    geom_4326_expr = sa.type_coerce(geom_4326_expr, sa.types.NullType())
+    select_stmt = sa.select(
+        _pk_column(model_class).label('pk'),
+        *[col.label(key) for key, col in _attribute_columns(model_class)],
+        geom_4326_expr.label('geom'),
+        sa.func.ST_AsGeoJSON(geom_4326_expr).label('geom_json'),
+    )
+    select_sql = select_stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+
+    index_prefix = view_name(model_class)
+    db.session.execute(sa.text(f'DROP MATERIALIZED VIEW IF EXISTS {full}'))
+    db.session.execute(sa.text(f'CREATE MATERIALIZED VIEW {full} AS {select_sql}'))
+    # 唯一索引是 REFRESH ... CONCURRENTLY 的前提
+    db.session.execute(sa.text(f'CREATE UNIQUE INDEX "{index_prefix}_pk_idx" ON {full} (pk)'))
+    db.session.execute(sa.text(f'CREATE INDEX "{index_prefix}_geom_idx" ON {full} USING GIST (geom)'))
+    db.session.execute(sa.text(f'ANALYZE {full}'))
+    db.session.commit()
+    _view_exists[full] = (True, time.monotonic())
+
+
+def drop_layer_view(model_class):
+    full = _full_name(model_class)
+    db.session.execute(sa.text(f'DROP MATERIALIZED VIEW IF EXISTS {full}'))
+    db.session.commit()
+    _view_exists[full] = (False, time.monotonic())
+
+
+def refresh_layer_view(model_class):
+    """刷新物化视图（视图不存在时什么也不做），并发刷新不阻塞读请求"""
+    if get_layer_view(model_class) is None:
+        return False
+    db.session.execute(sa.text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {_full_name(model_class)}'))
+    db.session.commit()
+    return True
+
+
+@layer_changed.connect
+def _on_layer_changed(app, model=None, **kwargs):
+    if model is None:
+        return
+    try:
+        refresh_layer_view(model)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning('刷新物化视图失败 %s: %s', view_name(model), e)
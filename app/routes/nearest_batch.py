@@ -0,0 +1,160 @@
+# app/routes/nearest_batch.py
+"""批量最近设施分析：把点图层一次性读入内存，对全部源点在一次向量化计算中求最近的目标点。
+
+经纬度先转成单位球面上的三维向量：两点弦长与球面距离单调对应，因此在三维向量上求欧氏最近邻
+就是求球面（haversine）最近邻，距离再由弦长换算为米。
+默认用 scipy（见 requirements.txt）的 cKDTree；未安装 scipy 时退化为分块做矩阵乘法（点积最大即最近）的纯 NumPy 全量比较。
+点集按图层缓存，管理后台写入后经 layer_changed 信号失效。
+"""
+import threading
+
+import numpy as np
+
+from app.signals import layer_changed
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS_M = 6371008.8
+# 纯 NumPy 实现每块的源点数，限制 (块大小 x 目标点数) 临时矩阵的内存
+BRUTE_CHUNK = 4096
+
+
+def unit_vectors(lon, lat):
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_meters(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class NearestIndex:
+    """目标点集上的最近邻索引；query 返回 (下标, 距离米)，形状为 (源点数, k)"""
+
+    def __init__(self, lon, lat, use_kdtree=True):
+        self.size = len(lon)
+        self.vectors = unit_vectors(lon, lat)
+        self.use_kdtree = use_kdtree and cKDTree is not None
+        self.tree = cKDTree(self.vectors) if self.use_kdtree and self.size else None
+
+    @property
+    def backend(self):
+        # 目标点集为空时没有树，但并不是退化到全量比较
+        return 'cKDTree' if self.use_kdtree else 'numpy'
+
+    def query(self, lon, lat, k=1):
+        k = min(k, self.size)
+        points = unit_vectors(lon, lat)
+        if k == 0 or not len(points):
+            return np.empty((len(points), k), dtype=np.intp), np.empty((len(points), k))
+        if self.tree is not None:
+            chord, idx = self.tree.query(points, k=k)
+            chord, idx = chord.reshape(len(points), k), idx.reshape(len(points), k)
+            return idx, chord_to_meters(chord)
+
+        idx_out = np.empty((len(points), k), dtype=np.intp)
+        dot_out = np.empty((len(points), k))
+        for start in range(0, len(points), BRUTE_CHUNK):
+            dots = points[start:start + BRUTE_CHUNK] @ self.vectors.T
+            if k < self.size:
+                part = np.argpartition(-dots, k - 1, axis=1)[:, :k]
+            else:
+                part = np.tile(np.arange(self.size), (len(dots), 1))
+            part_dots = np.take_along_axis(dots, part, axis=1)
+            order = np.argsort(-part_dots, axis=1)
+            idx_out[start:start + BRUTE_CHUNK] = np.take_along_axis(part, order, axis=1)
+            dot_out[start:start + BRUTE_CHUNK] = np.take_along_axis(part_dots, order, axis=1)
+        # 单位向量：|a - b|^2 = 2 - 2 a·b
+        chord = np.sqrt(np.clip(2 - 2 * dot_out, 0, 4))
+        return idx_out, chord_to_meters(chord)
+
+
+class PointSet:
+    """一个点图层的内存副本：主键、名称与经纬度"""
+
+    def __init__(self, ids, names, lon, lat):
+        self.ids = ids
+        self.names = names
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self._index = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = NearestIndex(self.lon, self.lat)
+        return self._index
+
+
+class PointSetRegistry:
+    """按图层懒加载 PointSet；loader(layer_name) 返回 (ids, names, lon, lat)"""
+
+    def __init__(self, layers_config, loader):
+        self.layers_config = layers_config
+        self.loader = loader
+        self._sets = {}
+        self._lock = threading.Lock()
+        layer_changed.connect(self._on_layer_changed, weak=False)
+
+    def get(self, layer_name):
+        point_set = self._sets.get(layer_name)
+        if point_set is None:
+            with self._lock:
+                point_set = self._sets.get(layer_name)
+                if point_set is None:
+                    point_set = self._sets[layer_name] = PointSet(*self.loader(layer_name))
+        return point_set
+
+    def _on_layer_changed(self, app, model=None, **kwargs):
+        with self._lock:
+            for layer_name, cfg in self.layers_config.items():
+                if cfg['model'] is model:
+                    self._sets.pop(layer_name, None)
+
+
+def nearest_facilities(source, target, k=1):
+    """源点集中每个点的 k 个最近目标点，返回按 (源点, 名次) 展开的结果行"""
+    idx, dist = target.index.query(source.lon, source.lat, k)
+    rows = []
+    for i in range(len(source)):
+        for rank in range(idx.shape[1]):
+            j = int(idx[i, rank])
+            rows.append({
+                'source_id': source.ids[i],
+                'source_name': source.names[i],
+                'rank': rank + 1,
+                'target_id': target.ids[j],
+                'target_name': target.names[j],
+                'distance_m': round(float(dist[i, rank]), 1),
+            })
+    return rows, dist
+
+
+def distance_summary(dist):
+    """每个源点最近目标点距离的统计（米）"""
+    if not dist.size:
+        return {}
+    nearest = dist[:, 0]
+    return {
+        'mean': round(float(nearest.mean()), 1),
+        'median': round(float(np.median(nearest)), 1),
+        'p90': round(float(np.percentile(nearest, 90)), 1),
+        'max': round(float(nearest.max()), 1),
+    }
@@ -0,0 +1,237 @@
+# app/routes/poi_store.py
+"""POI 样例数据（data/poi_sample.json）的内存数据集：只加载一次，文件变化时才重新加载。
+
+数据以 NumPy 列的形式保存（经纬度数组 + 字典编码的查询字段），范围过滤是一次布尔掩码运算，
+关键词过滤在去重后的小写取值上向量化进行，原始记录只在输出时按下标取出。
+每隔 SearchConfig.poiCheckInterval 秒检查一次文件的 mtime 与大小；发生变化时由一个线程在后台构建新快照，
+构建完成后整体替换引用，读者始终拿到完整的旧快照或新快照，不会被阻塞。
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 记录数达到该值时才建立网格索引，更小的数据集直接全量扫描
+GRID_MIN_POINTS = 50000
+# 网格索引：平均每个网格单元的点数
+GRID_POINTS_PER_CELL = 64
+# 候选点超过总数的该比例时，网格的收益抵不过收集候选的开销，改为全量扫描（交叉点见 benchmarks/bench_poi.py --crossover）
+GRID_SCAN_RATIO = 0.1
+
+
+class GridIndex:
+    """静态均匀网格索引（CSR 形式）：order 为按网格单元排序后的点下标，
+    offsets[c]:offsets[c + 1] 为单元 c 中的点；单元按行优先编号 c = iy * nx + ix。
+
+    点落入的单元与查询框覆盖的单元都用同一个单调的 floor 计算，
+    所以闭区间 min <= x <= max 内的点一定落在被覆盖的单元中，结果与全量扫描一致。
+    """
+
+    def __init__(self, lon, lat, points_per_cell=GRID_POINTS_PER_CELL):
+        valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+        self.size = len(lon)
+        self.min_x, self.max_x = float(lon[valid].min()), float(lon[valid].max())
+        self.min_y, self.max_y = float(lat[valid].min()), float(lat[valid].max())
+        width = max(self.max_x - self.min_x, 1e-9)
+        height = max(self.max_y - self.min_y, 1e-9)
+        # 单元尽量接近正方形，总数约为 点数 / points_per_cell
+        cells = max(len(valid) // points_per_cell, 1)
+        self.nx = max(int(round((cells * width / height) ** 0.5)), 1)
+        self.ny = max(int(round(cells / self.nx)), 1)
+        self.cell_w = width / self.nx
+        self.cell_h = height / self.ny
+
+        cell_ids = self._iy(lat[valid]) * self.nx + self._ix(lon[valid])
+        # 稳定排序：同一单元内保持原始顺序
+        sort = np.argsort(cell_ids, kind='stable')
+        self.order = valid[sort]
+        counts = np.bincount(cell_ids, minlength=self.nx * self.ny)
+        self.offsets = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def _ix(self, x):
+        return np.clip(np.floor((x - self.min_x) / self.cell_w), 0, self.nx - 1).astype(np.int64)
+
+    def _iy(self, y):
+        return np.clip(np.floor((y - self.min_y) / self.cell_h), 0, self.ny - 1).astype(np.int64)
+
+    def candidates(self, min_lon, min_lat, max_lon, max_lat):
+        """查询框覆盖的单元中的点下标（未排序、未精确过滤）；候选过多或边界非有限值时返回 None，由调用方全量扫描"""
+        if not np.isfinite([min_lon, min_lat, max_lon, max_lat]).all():
+            return None
+        if min_lon > max_lon or min_lat > max_lat:
+            return np.empty(0, dtype=np.intp)
+        if max_lon < self.min_x or min_lon > self.max_x or max_lat < self.min_y or min_lat > self.max_y:
+            return np.empty(0, dtype=np.intp)
+        ix0, ix1 = (int(v) for v in self._ix(np.array([min_lon, max_lon])))
+        iy0, iy1 = (int(v) for v in self._iy(np.array([min_lat, max_lat])))
+        rows = np.arange(iy0, iy1 + 1) * self.nx
+        starts = self.offsets[rows + ix0]
+        ends = self.offsets[rows + ix1 + 1]
+        if (ends - starts).sum() > GRID_SCAN_RATIO * self.size:
+            return None
+        # 每一行中被覆盖的单元在 order 中是连续的一段
+        return np.concatenate([self.order[a:b] for a, b in zip(starts.tolist(), ends.tolist())])
+
+
+class PoiSnapshot:
+    """某一版本 POI 数据的只读列式快照
+
+    lon / lat 为 float64 数组（缺失坐标为 NaN，任何范围比较都为 False，与原先用 9999 作缺省值的效果一致）；
+    每个查询字段做字典编码：codes[i] 为第 i 条记录的取值编号，values 为去重后的小写文本。
+    记录数较多时另建均匀网格索引（GridIndex），小范围框选只检查候选单元中的点。
+    关键词匹配先在 values（通常远少于记录数）上用 np.char 运算，再按 codes 映射回记录。
+    """
+
+    def __init__(self, records, fields, signature=None):
+        self.records = records
+        self.fields = list(fields)
+        self.signature = signature
+        self.lon = np.fromiter((_coord(r.get('lon')) for r in records), dtype=np.float64, count=len(records))
+        self.lat = np.fromiter((_coord(r.get('lat')) for r in records), dtype=np.float64, count=len(records))
+        self.codes = {}
+        self.values = {}
+        self.lookup = {}
+        for f in self.fields:
+            texts = [str(r.get(f, '')).lower() for r in records]
+            values, codes = np.unique(np.array(texts, dtype=str), return_inverse=True) if texts \
+                else (np.array([], dtype=str), np.array([], dtype=np.intp))
+            self.values[f] = values
+            self.codes[f] = codes.astype(np.int32).reshape(-1)
+            self.lookup[f] = {v: i for i, v in enumerate(values.tolist())}
+        finite = np.isfinite(self.lon) & np.isfinite(self.lat)
+        self.grid = GridIndex(self.lon, self.lat) if finite.sum() >= GRID_MIN_POINTS else None
+
+    def __len__(self):
+        return len(self.records)
+
+    def bbox_mask(self, min_lon, min_lat, max_lon, max_lat):
+        lon, lat = self.lon, self.lat
+        return (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+
+    def bbox_indices(self, min_lon, min_lat, max_lon, max_lat, use_grid=True):
+        """范围内（含边界）记录的下标，保持原始顺序；小范围查询走网格索引，只检查候选单元中的点"""
+        if use_grid and self.grid is not None:
+            cand = self.grid.candidates(min_lon, min_lat, max_lon, max_lat)
+            if cand is not None:
+                lon, lat = self.lon[cand], self.lat[cand]
+                mask = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+                return np.sort(cand[mask])
+        return np.flatnonzero(self.bbox_mask(min_lon, min_lat, max_lon, max_lat))
+
+    def _value_hits(self, field, keyword, exact):
+        """字段的每个去重取值是否命中关键词"""
+        values = self.values[field]
+        hits = np.zeros(len(values), dtype=bool)
+        if exact:
+            code = self.lookup[field].get(keyword)
+            if code is not None:
+                hits[code] = True
+        elif len(values):
+            hits = np.char.find(values, keyword) >= 0
+        return hits
+
+    def match_indices(self, keyword, exact=False, indices=None, fields=None):
+        """任一字段等于（exact）或包含关键词的记录下标；indices 为候选下标（默认全部），结果保持原始顺序"""
+        fields = [f for f in (fields or self.fields) if f in self.codes]
+        if indices is None:
+            mask = np.zeros(len(self.records), dtype=bool)
+            for f in fields:
+                mask |= self._value_hits(f, keyword, exact)[self.codes[f]]
+            return np.flatnonzero(mask)
+        indices = np.asarray(indices, dtype=np.intp)
+        mask = np.zeros(len(indices), dtype=bool)
+        for f in fields:
+            codes = self.codes[f][indices]
+            if not exact and len(indices) < len(self.values[f]):
+                # 候选记录比去重取值还少（如小范围框选 + 名称字段）时，直接在候选记录的取值上匹配
+                mask |= np.char.find(self.values[f][codes], keyword) >= 0
+            else:
+                mask |= self._value_hits(f, keyword, exact)[codes]
+        return indices[mask]
+
+    def take(self, indices):
+        records = self.records
+        return [records[i] for i in np.asarray(indices, dtype=np.intp).tolist()]
+
+
+def _coord(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class PoiDataset:
+    """持有当前快照；get() 只做一次引用读取，必要时触发后台重新加载"""
+
+    def __init__(self, path, fields, check_interval=2.0):
+        self.path = path
+        self.fields = fields
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self.stats = {'loads': 0, 'checks': 0, 'failed': 0}
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, signature):
+        if signature is None:
+            return PoiSnapshot([], self.fields, None)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        return PoiSnapshot(records, self.fields, signature)
+
+    def _reload(self, signature):
+        try:
+            snapshot = self._load(signature)
+        except Exception as e:
+            # 文件写到一半或格式错误：保留旧快照，下次检查时再试
+            self.stats['failed'] += 1
+            logger.warning('加载 POI 数据失败 %s: %s', self.path, e)
+            return
+        self._snapshot = snapshot
+        self.stats['loads'] += 1
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            # 首次加载：只能等待
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self._reload(self._signature())
+                    self._checked_at = time.monotonic()
+                    if self._snapshot is None:
+                        self._snapshot = PoiSnapshot([], self.fields, None)
+            return self._snapshot
+
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.stats['checks'] += 1
+            signature = self._signature()
+            # 已有线程在重新加载时不再重复触发；读者继续使用旧快照
+            if signature != snapshot.signature and self._reload_lock.acquire(blocking=False):
+                def worker():
+                    try:
+                        self._reload(signature)
+                    finally:
+                        self._reload_lock.release()
+                threading.Thread(target=worker, name='poi-reload', daemon=True).start()
+        return snapshot
+
+    def snapshot_info(self):
+        snapshot = self._snapshot
+        return dict(self.stats, path=self.path, records=len(snapshot) if snapshot else None,
+                    signature=list(snapshot.signature) if snapshot and snapshot.signature else None)
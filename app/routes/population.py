@@ -0,0 +1,78 @@
+# app/routes/population.py
+"""等时圈覆盖人口的去重汇总。
+
+各等时圈的 total_pop 是圈内人口，圈与圈大量重叠，直接相加会重复计算重叠区域的人口。
+数据库中先把全部等时圈的边界合并、切分成互不重叠的碎片（ST_Union + ST_Polygonize），
+每个碎片记录其面积与覆盖它的等时圈；这里假设人口在每个等时圈内均匀分布，
+碎片的人口密度取覆盖它的各等时圈密度（total_pop / 面积）的平均值，碎片人口 = 面积 × 密度。
+任意一组等时圈（如同一条线路的站点）的去重人口就是这组圈覆盖到的碎片人口之和，
+全部在 NumPy 数组上一次完成，不逐个碎片循环。
+"""
+import numpy as np
+
+# 车站名称末尾的“站”在等时圈名称中可能省略
+STATION_SUFFIX = '站'
+
+
+def match_circle_stations(circle_names, station_names):
+    """按名称前缀把等时圈对应到车站：取等时圈名称以之开头的最长车站名（忽略末尾的“站”），没有匹配时为 None"""
+    stripped = [(n[:-len(STATION_SUFFIX)] if n.endswith(STATION_SUFFIX) and len(n) > 1 else n, n)
+                for n in set(station_names) if n]
+    stripped.sort(key=lambda p: len(p[0]), reverse=True)
+    out = []
+    for name in circle_names:
+        name = (name or '').strip()
+        out.append(next((station for base, station in stripped if name.startswith(base)), None))
+    return out
+
+
+class CoverageOverlay:
+    """等时圈叠加的碎片与覆盖关系
+
+    piece_area[i]：第 i 个碎片的面积（平方米）；pair_piece / pair_circle：碎片与覆盖它的等时圈的下标对；
+    circle_pop[j]：第 j 个等时圈的人口（无法解析时为 NaN），circle_area[j]：其面积（平方米）。
+    """
+
+    def __init__(self, piece_area, pair_piece, pair_circle, circle_pop, circle_area):
+        self.piece_area = np.asarray(piece_area, dtype=np.float64)
+        self.pair_piece = np.asarray(pair_piece, dtype=np.intp)
+        self.pair_circle = np.asarray(pair_circle, dtype=np.intp)
+        self.circle_pop = np.asarray(circle_pop, dtype=np.float64)
+        self.circle_area = np.asarray(circle_area, dtype=np.float64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            density = np.where(self.circle_area > 0, self.circle_pop / self.circle_area, np.nan)
+        pair_density = density[self.pair_circle]
+        known = ~np.isnan(pair_density)
+        n = len(self.piece_area)
+        sums = np.bincount(self.pair_piece, weights=np.where(known, pair_density, 0.0), minlength=n)
+        counts = np.bincount(self.pair_piece, weights=known.astype(np.float64), minlength=n)
+        # 覆盖碎片的等时圈人口都未知时，该碎片按 0 计
+        self.piece_density = np.divide(sums, counts, out=np.zeros(n), where=counts > 0)
+        self.piece_pop = self.piece_area * self.piece_density
+
+    def summarise(self, circle_groups, n_groups):
+        """circle_groups 为 (等时圈下标, 分组下标) 数组对，一个等时圈可属于多个分组（如换乘站）；
+        返回每个分组的 (去重人口, 直接相加的人口, 覆盖面积平方米, 等时圈数)"""
+        group_circle, group_index = (np.asarray(a, dtype=np.intp) for a in circle_groups)
+        membership = np.zeros((len(self.circle_pop), n_groups), dtype=bool)
+        membership[group_circle, group_index] = True
+
+        # 碎片属于某分组：覆盖它的等时圈中至少有一个属于该分组
+        piece_groups = np.zeros((len(self.piece_area), n_groups), dtype=bool)
+        pair_member = membership[self.pair_circle]
+        rows, cols = np.nonzero(pair_member)
+        piece_groups[self.pair_piece[rows], cols] = True
+
+        population = self.piece_pop @ piece_groups
+        area = self.piece_area @ piece_groups
+        naive = np.nan_to_num(self.circle_pop) @ membership
+        circles = membership.sum(axis=0)
+        return population, naive, area, circles
+
+    def total(self):
+        """全部等时圈的 (去重人口, 直接相加的人口, 覆盖面积平方米)"""
+        covered = np.zeros(len(self.piece_area), dtype=bool)
+        covered[self.pair_piece] = True
+        return (float(self.piece_pop[covered].sum()), float(np.nansum(self.circle_pop)),
+                float(self.piece_area[covered].sum()))
@@ -0,0 +1,235 @@
+# app/routes/query_guard.py
+"""查询保护：语句超时、客户端断开时取消查询，以及超时/取消后的"查询过于宽泛"响应。
+
+guard_query(timeout_ms) 装饰的视图中，会话每开始一个事务都先执行 SET LOCAL statement_timeout；
+后台线程监视客户端连接（environ 中的 werkzeug.socket / gunicorn.socket），对端关闭时
+对正在执行的查询调用 connection.cancel()。超时或取消后，本次请求剩余的查询以 1ms 超时立即失败，
+不再占用连接池；视图返回后整体替换为 422（超时）或 499（客户端断开）响应。
+视图经 coalesce 合并时，只要还有其他请求在等待同一结果，leader 的客户端断开就不取消查询；
+499 结果也不会共享给等待者（见 singleflight）。TLS 连接无法 MSG_PEEK，不做断开监视。
+超时与取消都会连同 SQL 语句和参数记录到日志。
+"""
+import contextvars
+import logging
+import select
+import socket
+import ssl
+import threading
+import time
+from functools import wraps
+
+from flask import request, jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.routes.singleflight import current_call, has_waiters
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL 的 query_canceled 错误码：statement_timeout 与 pg_cancel_backend 都会触发
+QUERY_CANCELED = '57014'
+# 监视客户端连接的轮询间隔（秒）
+POLL_INTERVAL = 0.25
+
+_current_guard = contextvars.ContextVar('query_guard', default=None)
+
+
+class QueryGuard:
+    """一次请求（或跨图层查询中的一个图层）的查询预算；outcome 为 None / 'timeout' / 'disconnect'"""
+
+    def __init__(self, timeout_ms, client_socket=None, label=''):
+        self.timeout_ms = int(timeout_ms)
+        self.client_socket = client_socket
+        self.label = label
+        self.outcome = None
+        # 在 coalesce 的 leader 中执行时对应的合并调用，据此判断是否还有其他请求在等结果
+        self.flight_call = current_call()
+        self._connections = {}   # Session -> DBAPI 连接，仅在事务进行期间登记
+        self._lock = threading.Lock()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_guard.set(self)
+        if self.client_socket is not None:
+            _watchdog.add(self)
+        return self
+
+    def __exit__(self, *exc):
+        _watchdog.remove(self)
+        _current_guard.reset(self._token)
+        with self._lock:
+            self._connections.clear()
+        return False
+
+    def attach(self, session, dbapi_connection):
+        with self._lock:
+            self._connections[session] = dbapi_connection
+
+    def detach(self, session):
+        with self._lock:
+            self._connections.pop(session, None)
+
+    def cancel(self, reason):
+        with self._lock:
+            if self.outcome is None:
+                self.outcome = reason
+            for conn in self._connections.values():
+                try:
+                    conn.cancel()
+                except Exception:
+                    pass
+        logger.warning('客户端已断开，取消查询：%s', self.label)
+
+    def mark_timeout(self):
+        with self._lock:
+            if self.outcome is None:
+                self.outcome = 'timeout'
+
+    @property
+    def effective_timeout_ms(self):
+        # 超时或取消之后的查询立即失败
+        return 1 if self.outcome else self.timeout_ms
+
+
+def current_guard():
+    return _current_guard.get()
+
+
+@event.listens_for(Session, 'after_begin')
+def _apply_statement_timeout(session, transaction, connection):
+    guard = _current_guard.get()
+    if guard is None:
+        return
+    connection.exec_driver_sql(f'SET LOCAL statement_timeout = {guard.effective_timeout_ms}')
+    guard.attach(session, connection.connection.dbapi_connection)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _release_connection(session, transaction):
+    guard = _current_guard.get()
+    if guard is not None and transaction.parent is None:
+        guard.detach(session)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _log_canceled_query(context):
+    orig = context.original_exception
+    if getattr(orig, 'pgcode', None) != QUERY_CANCELED:
+        return
+    guard = _current_guard.get()
+    if guard is not None:
+        guard.mark_timeout()
+        reason = '客户端断开' if guard.outcome == 'disconnect' else f'超时（{guard.timeout_ms} ms）'
+        label = guard.label
+    else:
+        reason, label = '被取消', ''
+    logger.warning('查询%s %s\n%s\n参数：%r', reason, label, context.statement, context.parameters)
+
+
+def _peer_closed(sock):
+    """对端是否已关闭连接：可读但 MSG_PEEK 读到 0 字节"""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | getattr(socket, 'MSG_DONTWAIT', 0)) == b''
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+    except ValueError:
+        # 不支持 MSG_PEEK 的套接字（如 ssl.SSLSocket），无法判断
+        return False
+
+
+class _DisconnectWatchdog:
+    """单个后台线程同时监视所有受保护请求的客户端连接"""
+
+    def __init__(self):
+        self._guards = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, guard):
+        with self._lock:
+            self._guards.add(guard)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='query-guard-watchdog', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, guard):
+        with self._lock:
+            self._guards.discard(guard)
+
+    def _run(self):
+        while True:
+            try:
+                self._poll()
+            except Exception:
+                # 监视线程不能退出，否则之后所有请求都不再检测断开
+                logger.exception('客户端断开监视出错')
+                time.sleep(POLL_INTERVAL)
+
+    def _poll(self):
+        with self._lock:
+            guards = [g for g in self._guards if g.outcome is None]
+        if not guards:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            return
+
+        by_socket = {}
+        for guard in guards:
+            by_socket.setdefault(guard.client_socket, []).append(guard)
+        try:
+            readable, _, _ = select.select(list(by_socket), [], [], POLL_INTERVAL)
+        except (OSError, ValueError):
+            # 套接字已被关闭（fileno 为 -1）
+            readable = list(by_socket)
+
+        for sock in readable:
+            if _peer_closed(sock):
+                for guard in by_socket[sock]:
+                    if has_waiters(guard.flight_call):
+                        # 其他请求还在等这次查询的结果：不取消，也不再监视（已关闭的套接字会一直可读）
+                        self.remove(guard)
+                    else:
+                        guard.cancel('disconnect')
+            else:
+                # 客户端发来了后续数据（如 keep-alive 的下一个请求），连接仍然有效，不再继续监视
+                with self._lock:
+                    for guard in by_socket[sock]:
+                        self._guards.discard(guard)
+
+
+_watchdog = _DisconnectWatchdog()
+
+
+def client_socket(environ):
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if not isinstance(sock, socket.socket) or isinstance(sock, ssl.SSLSocket):
+        return None
+    return sock
+
+
+def too_broad_response(guard):
+    if guard.outcome == 'disconnect':
+        return jsonify({"code": 499, "msg": "客户端已断开，查询已取消"}), 499
+    return jsonify({
+        "code": 422,
+        "msg": f"查询条件过于宽泛，未能在 {guard.timeout_ms} ms 内完成，请输入更具体的关键词或缩小范围"
+    }), 422
+
+
+def guard_query(timeout_ms):
+    """视图装饰器：为视图中的全部数据库查询设置语句超时，客户端断开时取消查询"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with QueryGuard(timeout_ms, client_socket(request.environ), request.full_path) as guard:
+                resp = view(*args, **kwargs)
+            if guard.outcome is not None:
+                return too_broad_response(guard)
+            return resp
+        return wrapper
+    return decorator
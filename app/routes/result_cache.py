@@ -0,0 +1,164 @@
+# app/routes/result_cache.py
+"""查询结果缓存：有界 LRU + TTL，缓存的是响应正文（bytes），因此内存占用可以精确统计。
+
+键为 路径 + 排序后的查询参数；q 与视图中的处理一致，只去首尾空白并小写（中间的空白原样保留，
+“a  b” 与 “a b” 是不同的 LIKE 条件），其余参数按原值参与，视图原样使用的取值（如 facet_<字段>）不会被合并。
+每条缓存带一个标签（图层对应的模型类），管理后台写入后经 layer_changed 信号按标签失效；
+依赖多个图层的结果（如叠加分析）以模型类的元组为标签，其中任一图层变化都会失效。
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request, current_app
+
+from app.config import SearchConfig
+from app.signals import layer_changed
+
+
+def _tags(tag):
+    return tag if isinstance(tag, tuple) else (tag,)
+
+
+def cache_key():
+    args = sorted(
+        (k, v.strip().lower() if k == 'q' else v)
+        for k, v in request.args.items(multi=True)
+    )
+    return f'{request.path}?{urlencode(args)}'
+
+
+class _Entry:
+    __slots__ = ('status', 'mimetype', 'body', 'tag', 'expires')
+
+    def __init__(self, status, mimetype, body, tag, expires):
+        self.status = status
+        self.mimetype = mimetype
+        self.body = body
+        self.tag = tag
+        self.expires = expires
+
+
+class ResultCache:
+    """按条数与字节数双重限制的 LRU 缓存，条目超过 ttl 秒后过期"""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        # 标签的失效代数：计算期间发生失效时，算出的旧结果不再写入
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+        layer_changed.connect(self._on_layer_changed, weak=False)
+
+    def generation(self, tag):
+        with self._lock:
+            return tuple(self._generations.get(t, 0) for t in _tags(tag))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._remove(key)
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def set(self, key, status, mimetype, body, tag, generation):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if tuple(self._generations.get(t, 0) for t in _tags(tag)) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(status, mimetype, body, tag, time.monotonic() + self.ttl)
+            for t in _tags(tag):
+                self._by_tag.setdefault(t, set()).add(key)
+            self._bytes += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for t in _tags(entry.tag):
+            keys = self._by_tag.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[t]
+
+    def invalidate(self, tag=None):
+        with self._lock:
+            if tag is None:
+                tags = list(self._by_tag) + list(self._generations)
+            else:
+                tags = [tag]
+            for t in set(tags):
+                self._generations[t] = self._generations.get(t, 0) + 1
+                for key in list(self._by_tag.get(t, ())):
+                    self._remove(key)
+            self.stats['invalidations'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            by_tag = {getattr(tag, '__tablename__', str(tag)): len(keys) for tag, keys in self._by_tag.items()}
+            return dict(
+                self.stats,
+                hit_rate=round(self.stats['hits'] / lookups, 4) if lookups else None,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                ttl=self.ttl,
+                by_layer=by_tag,
+            )
+
+    def _on_layer_changed(self, app, model=None, **kwargs):
+        self.invalidate(model)
+
+    def cached(self, tag):
+        """视图装饰器：只缓存 200 响应；tag 为模型类（或其元组），或在请求上下文中返回标签的函数（返回 None 时不缓存）"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                t = tag() if callable(tag) and not isinstance(tag, type) else tag
+                if t is None:
+                    return view(*args, **kwargs)
+                app = current_app._get_current_object()
+                key = cache_key()
+                entry = self.get(key)
+                if entry is not None:
+                    return app.response_class(entry.body, status=entry.status, mimetype=entry.mimetype)
+
+                generation = self.generation(t)
+                resp = app.make_response(view(*args, **kwargs))
+                if resp.status_code == 200 and not resp.is_streamed:
+                    self.set(key, resp.status_code, resp.mimetype, resp.get_data(), t, generation)
+                return resp
+            return wrapper
+        return decorator
+
+
+search_cache = ResultCache(
+    SearchConfig.resultCacheMaxEntries, SearchConfig.resultCacheMaxBytes, SearchConfig.resultCacheTTL
+)
+
+# 空间分析结果：计算代价高、只随图层数据变化，有效期远长于查询结果
+analysis_cache = ResultCache(
+    SearchConfig.analysisCacheMaxEntries, SearchConfig.analysisCacheMaxBytes, SearchConfig.analysisCacheTTL
+)
@@ -0,0 +1,56 @@
+# app/routes/search_sql.py
+"""关键词查询的 SQL 条件构造，供 /api/search-layer 与管理后台的 *_search 接口共用。
+
+条件统一写成 lower(col) LIKE / = / <% 的形式，与 `flask search create-indexes`
+建立的 GIN 索引 (lower(col) gin_trgm_ops) 表达式一致，从而可以走索引而不是全表扫描。
+用户输入中的 %、_ 会被转义，按字面匹配（LIKE ... ESCAPE '/'，避免反斜杠受 standard_conforming_strings 影响）。
+注意：pg_trgm 只从"字母数字"字符中提取三元组，中文需要数据库 LC_CTYPE 为 UTF-8 区域（如 zh_CN.UTF-8）。
+"""
+from sqlalchemy import String, func, literal, or_
+
+
+def text_expr(col):
+    """列的小写文本表达式：字符串列直接 lower(col)（可命中表达式索引），其余类型先 CAST 为文本"""
+    if isinstance(col.type, String):
+        return func.lower(col)
+    return func.lower(col.cast(String))
+
+
+def escape_like(value, escape='/'):
+    """转义 LIKE 模式中的通配符，使用户输入按字面匹配"""
+    return value.replace(escape, escape * 2).replace('%', escape + '%').replace('_', escape + '_')
+
+
+def keyword_predicates(cols, keyword, exact=False):
+    """对每个列生成匹配条件，调用方用 or_ 组合"""
+    kw = keyword.lower()
+    conds = []
+    for col in cols:
+        if exact:
+            conds.append(text_expr(col) == kw)
+        else:
+            conds.append(text_expr(col).like(f'%{escape_like(kw)}%', escape='/'))
+    return conds
+
+
+def similarity_score(cols, keyword):
+    """相关度：各列 word_similarity 的最大值（0~1）"""
+    kw = keyword.lower()
+    scores = [func.word_similarity(kw, text_expr(col)) for col in cols]
+    return scores[0] if len(scores) == 1 else func.greatest(*scores)
+
+
+def similarity_predicates(cols, keyword):
+    """kw <% lower(col)：word_similarity 超过 pg_trgm.word_similarity_threshold 的行，可走 trigram 索引"""
+    kw = keyword.lower()
+    return [literal(kw, String).op('<%')(text_expr(col)) for col in cols]
+
+
+def filter_by_keyword(query, cols, keyword, exact=False, mode='text'):
+    """给查询加上关键词条件；mode=similar 时按相关度从高到低排序"""
+    if not keyword:
+        return query
+    if mode == 'similar':
+        return query.filter(or_(*similarity_predicates(cols, keyword))) \
+                    .order_by(similarity_score(cols, keyword).desc())
+    return query.filter(or_(*keyword_predicates(cols, keyword, exact)))
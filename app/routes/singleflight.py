@@ -0,0 +1,202 @@
+# app/routes/singleflight.py
+"""请求合并（single-flight）：同一时刻的相同请求只计算一次，其余请求等待并共享结果。
+
+进程内通过 threading.Event 合并；配置 SearchConfig.singleFlightLockDir 后，
+多个 worker 进程之间再通过文件锁（fcntl.flock）串行化，后到的进程直接读取先完成者写下的结果文件。
+锁文件按键的哈希分成固定的 SearchConfig.singleFlightLockStripes 个；过期的结果文件定期删除，目录不会无限增长。
+"""
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request, current_app
+from werkzeug.http import is_hop_by_hop_header
+
+from app.config import SearchConfig
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 下没有 fcntl，只做进程内合并
+    fcntl = None
+
+
+# 客户端断开时被取消的结果：只属于发起它的那个请求，不共享给其他请求
+CANCELLED_STATUS = 499
+# 跨进程结果文件（及写到一半遗留的临时文件）超过该时长（秒）即删除；每个进程每隔这么久扫描一次目录
+RESULT_FILE_MAX_AGE = 60.0
+
+_pruned_at = 0.0
+
+_current_call = contextvars.ContextVar('single_flight_call', default=None)
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def current_call():
+    """当前线程作为 leader 正在执行的合并调用（不在合并调用中时为 None）"""
+    return _current_call.get()
+
+
+def has_waiters(call):
+    """是否还有其他请求在等待该调用的结果"""
+    return call is not None and call.waiters > 0
+
+
+class SingleFlight:
+    """按 key 合并并发调用：第一个调用者（leader）执行 fn，其余调用者等待其结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'executed': 0, 'coalesced': 0, 'cross_worker': 0}
+
+    def do(self, key, fn, shareable=None):
+        """shareable(result) 为 False 的结果只返回给 leader，等待中的调用者改为重新执行"""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.stats['executed'] += 1
+                else:
+                    call.waiters += 1
+                    self.stats['coalesced'] += 1
+
+            if leader:
+                break
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            if shareable is None or shareable(call.result):
+                return call.result
+
+        token = _current_call.set(call)
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            _current_call.reset(token)
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._calls))
+
+
+flight = SingleFlight()
+
+
+def request_key():
+    """规范化的请求键：路径 + 排序后的查询参数 + Accept（影响内容协商的输出格式）"""
+    args = sorted(request.args.items(multi=True))
+    return f"{request.path}?{urlencode(args)}|{request.headers.get('Accept', '')}"
+
+
+def _prune_result_files(lock_dir, now):
+    global _pruned_at
+    if now - _pruned_at < RESULT_FILE_MAX_AGE:
+        return
+    _pruned_at = now
+    try:
+        entries = list(os.scandir(lock_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.name.endswith(('.res', '.tmp')):
+            continue
+        try:
+            if entry.stat().st_mtime < now - max(RESULT_FILE_MAX_AGE, SearchConfig.singleFlightResultTTL):
+                os.unlink(entry.path)
+        except OSError:
+            # 其他进程已经删除或正在替换
+            pass
+
+
+def _run_cross_worker(key, compute):
+    """跨进程合并：持有文件锁期间若发现其他进程刚写好的结果则直接复用"""
+    lock_dir = SearchConfig.singleFlightLockDir
+    os.makedirs(lock_dir, exist_ok=True)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    # 不同的键可能分到同一个锁上而互相等待，换来的是锁文件数固定
+    stripe = int(digest, 16) % SearchConfig.singleFlightLockStripes
+    lock_path = os.path.join(lock_dir, f'stripe-{stripe}.lock')
+    result_path = os.path.join(lock_dir, digest + '.res')
+    _prune_result_files(lock_dir, time.time())
+
+    started = time.time()
+    with open(lock_path, 'a+b') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                if os.path.getmtime(result_path) >= started - SearchConfig.singleFlightResultTTL:
+                    with open(result_path, 'rb') as f:
+                        header = json.loads(f.readline())
+                        body = f.read()
+                    with flight._lock:
+                        flight.stats['cross_worker'] += 1
+                    return header['status'], [tuple(h) for h in header['headers']], body
+            except (OSError, ValueError, KeyError):
+                pass
+
+            status, headers, body = compute()
+            if status == CANCELLED_STATUS:
+                return status, headers, body
+            # 先写临时文件再原子替换，读者不会看到写了一半的结果
+            tmp_path = f'{result_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps({'status': status, 'headers': headers}).encode('utf-8') + b'\n')
+                f.write(body)
+            os.replace(tmp_path, result_path)
+            return status, headers, body
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# 不在请求之间共享的响应头：逐跳头、由正文重新计算的长度，以及属于单个客户端的 Set-Cookie
+_UNSHARED_HEADERS = {'content-length', 'set-cookie'}
+
+
+def shared_headers(headers):
+    """响应头中可以原样交给其他请求的部分，[(名称, 值)]"""
+    return [(k, v) for k, v in headers.items()
+            if k.lower() not in _UNSHARED_HEADERS and not is_hop_by_hop_header(k)]
+
+
+def coalesce(view):
+    """视图装饰器：合并并发的相同请求，共享同一份响应（状态码、响应头、正文）"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        app = current_app._get_current_object()
+
+        def compute():
+            resp = app.make_response(view(*args, **kwargs))
+            return resp.status_code, shared_headers(resp.headers), resp.get_data()
+
+        key = request_key()
+        shareable = lambda result: result[0] != CANCELLED_STATUS
+        if SearchConfig.singleFlightLockDir and fcntl is not None:
+            status, headers, body = flight.do(key, lambda: _run_cross_worker(key, compute), shareable)
+        else:
+            status, headers, body = flight.do(key, compute, shareable)
+        return app.response_class(body, status=status, headers=headers)
+    return wrapper
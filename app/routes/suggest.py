@@ -0,0 +1,96 @@
+# app/routes/suggest.py
+"""输入联想：按前缀查找名称与常用词，返回权重最高的前 N 条。
+
+词条按小写文本排序存放，前缀查询用 bisect 定位区间；1~2 个字的短前缀区间很大，
+建索引时预先算好其 Top-N，查询时直接返回。
+"""
+import heapq
+import threading
+from bisect import bisect_left
+
+from app.signals import layer_changed
+
+# 预先计算 Top-N 的前缀最大长度与每个前缀保留的条数
+PRECOMPUTED_PREFIX_LEN = 2
+PRECOMPUTED_TOP_N = 20
+
+
+class SuggestIndex:
+    """terms: [(文本, 图层, 类型 name/token, 权重)]，同一图层中相同文本只保留最大权重"""
+
+    def __init__(self, terms):
+        merged = {}
+        for text, layer, kind, weight in terms:
+            text = (text or '').strip()
+            if not text:
+                continue
+            key = (text.lower(), text, layer, kind)
+            merged[key] = max(weight, merged.get(key, weight))
+
+        self.entries = sorted(
+            ((key, text, layer, kind, weight) for (key, text, layer, kind), weight in merged.items()),
+            key=lambda e: e[0]
+        )
+        self.keys = [e[0] for e in self.entries]
+
+        self.top = {}
+        for entry in self.entries:
+            key, weight = entry[0], entry[4]
+            for n in range(1, min(PRECOMPUTED_PREFIX_LEN, len(key)) + 1):
+                heap = self.top.setdefault(key[:n], [])
+                item = (weight, -len(key), entry)
+                if len(heap) < PRECOMPUTED_TOP_N:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+        for prefix, heap in self.top.items():
+            self.top[prefix] = [item[2] for item in sorted(heap, key=lambda i: i[:2], reverse=True)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def suggest(self, prefix, n=10):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LEN and n <= PRECOMPUTED_TOP_N:
+            entries = self.top.get(prefix, [])[:n]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + '\U0010ffff')
+            entries = heapq.nlargest(n, self.entries[lo:hi], key=lambda e: (e[4], -len(e[0])))
+        return [{'text': e[1], 'layer': e[2], 'kind': e[3], 'weight': e[4]} for e in entries]
+
+
+class SuggestRegistry:
+    """懒加载全部图层的联想词；任意图层变更后整体失效，下次请求时重建
+
+    loader() 返回 [(文本, 图层, 类型, 权重)]。
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._indexes = None
+        self._lock = threading.Lock()
+        layer_changed.connect(self._on_layer_changed, weak=False)
+
+    def get(self, layer_name=None):
+        indexes = self._indexes
+        if indexes is None:
+            with self._lock:
+                indexes = self._indexes
+                if indexes is None:
+                    indexes = self._indexes = self._build()
+        return indexes.get(layer_name or '') or SuggestIndex([])
+
+    def _build(self):
+        terms = list(self.loader())
+        by_layer = {}
+        for term in terms:
+            by_layer.setdefault(term[1], []).append(term)
+        indexes = {layer: SuggestIndex(layer_terms) for layer, layer_terms in by_layer.items()}
+        indexes[''] = SuggestIndex(terms)
+        return indexes
+
+    def _on_layer_changed(self, app, **kwargs):
+        self._indexes = None
@@ -0,0 +1,213 @@
+# app/routes/typo_index.py
+"""容错（错别字）名称匹配：按图层把名称字段的去重取值放在内存中按编辑距离查找，不扫描数据库。
+
+有 rapidfuzz（见 requirements.txt）时用它在 C 中批量计算全部名称的编辑距离（两万条名称约 2 ms），
+比逐节点调用距离函数的 BK 树更快；未安装时改用纯 Python 的编辑距离，并建 BK 树，
+查询时只访问距离三角不等式允许的子树，减少距离计算次数。
+
+索引的数据来自 layer_index 中已加载的图层文档（NgramIndex），文档有增删（layer_changed）或版本变化时
+在后台线程中重建，不在请求中建索引：重建期间继续使用旧索引，图层还没有索引时对名称做一次线性扫描。
+"""
+import logging
+import threading
+
+from app.signals import layer_changed
+
+try:
+    from rapidfuzz import process as _rf_process
+    from rapidfuzz.distance import Levenshtein as _rf_levenshtein
+except ImportError:
+    _rf_process = _rf_levenshtein = None
+
+logger = logging.getLogger(__name__)
+
+# 未指定最大距离时：关键词不超过 3 个字允许 1 处错误，更长的允许 2 处
+SHORT_KEYWORD_LEN = 3
+
+
+def levenshtein(a, b):
+    if _rf_levenshtein is not None:
+        return _rf_levenshtein.distance(a, b)
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def scan_terms(term, terms, max_distance):
+    """对 {词: 附带值列表} 逐个计算编辑距离，返回值与 BKTree.search 相同"""
+    if _rf_process is not None:
+        matches = _rf_process.extract(term, list(terms), scorer=_rf_levenshtein.distance,
+                                      score_cutoff=max_distance, limit=None)
+        out = [(d, t, terms[t]) for t, d, _ in matches]
+    else:
+        # 长度差本身就是编辑距离的下界
+        out = [(d, t, values) for t, values in terms.items()
+               if abs(len(t) - len(term)) <= max_distance
+               for d in (levenshtein(term, t),) if d <= max_distance]
+    out.sort(key=lambda r: (r[0], len(r[1])))
+    return out
+
+
+def default_max_distance(keyword):
+    return 1 if len(keyword) <= SHORT_KEYWORD_LEN else 2
+
+
+class BKTree:
+    """节点为 [词, 附带值列表, {距离: 子节点}]；相同的词只存一个节点"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, term, value):
+        if self.root is None:
+            self.root = [term, [value], {}]
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            d = levenshtein(term, node[0])
+            if d == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [term, [value], {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, term, max_distance):
+        """返回 [(距离, 词, 附带值列表)]，按距离升序"""
+        if self.root is None:
+            return []
+        out = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = levenshtein(term, node[0])
+            if d <= max_distance:
+                out.append((d, node[0], node[1]))
+            # 三角不等式：只有与当前节点距离在 [d - k, d + k] 内的子树可能包含结果
+            for child_d, child in node[2].items():
+                if d - max_distance <= child_d <= d + max_distance:
+                    stack.append(child)
+        out.sort(key=lambda r: (r[0], len(r[1])))
+        return out
+
+
+class TermIndex:
+    """一个图层的名称 -> [Feature]；没有 rapidfuzz 时另建 BK 树"""
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.tree = None
+        if _rf_process is None:
+            self.tree = BKTree()
+            for text, features in terms.items():
+                for feature in features:
+                    self.tree.add(text, feature)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def search(self, term, max_distance):
+        if self.tree is not None:
+            return self.tree.search(term, max_distance)
+        return scan_terms(term, self.terms, max_distance)
+
+
+class TypoIndexRegistry:
+    """按图层在后台线程中建 TermIndex；对应的 NgramIndex 被替换或版本变化后重建，重建完成前查询使用旧索引"""
+
+    def __init__(self, layers_config, layer_index):
+        self.layers_config = layers_config
+        self.layer_index = layer_index
+        self._trees = {}   # 图层 -> (NgramIndex, 版本, TermIndex)
+        self._building = set()
+        self._lock = threading.Lock()
+        layer_changed.connect(self._on_layer_changed, weak=False)
+
+    def typo_fields(self, layer_name):
+        cfg = self.layers_config[layer_name]
+        fields = cfg.get('fields', [])
+        return [f for f in cfg.get('typo_fields', ['name']) if f in fields]
+
+    def get(self, layer_name):
+        """返回 (NgramIndex, TermIndex)；索引缺失或过期时安排后台重建，先返回旧索引（还没有时为 None）"""
+        docs = self.layer_index.get(layer_name)
+        cached = self._trees.get(layer_name)
+        if cached is None or cached[0] is not docs or cached[1] != docs.version:
+            self._schedule(layer_name, docs)
+        return docs, cached[2] if cached is not None else None
+
+    def _schedule(self, layer_name, docs):
+        with self._lock:
+            if layer_name in self._building:
+                return
+            self._building.add(layer_name)
+
+        def worker():
+            try:
+                version = docs.version
+                tree = TermIndex(self._terms(layer_name, docs))
+                with self._lock:
+                    self._trees[layer_name] = (docs, version, tree)
+            except Exception as e:
+                logger.warning('构建容错索引失败 %s: %s', layer_name, e)
+            finally:
+                with self._lock:
+                    self._building.discard(layer_name)
+        threading.Thread(target=worker, name='typo-index-build', daemon=True).start()
+
+    def _terms(self, layer_name, docs):
+        """{名称: [Feature]}"""
+        positions = [docs.fields.index(f) for f in self.typo_fields(layer_name)]
+        terms = {}
+        for doc_id, feature in docs.live_documents():
+            for pos in positions:
+                text = docs.texts[doc_id][pos]
+                if text:
+                    terms.setdefault(text, []).append(feature)
+        return terms
+
+    def _on_layer_changed(self, app, model=None, **kwargs):
+        # 图层文档已加载时立即在后台重建，不等下一次查询
+        for layer_name, cfg in self.layers_config.items():
+            if cfg['model'] is model:
+                docs = self.layer_index.loaded(layer_name)
+                if docs is not None:
+                    self._schedule(layer_name, docs)
+
+    def search(self, layer_name, keyword, max_distance=None, limit=None):
+        """返回带 distance 成员的 Feature 列表，按编辑距离升序；同一要素只出现一次（取最小距离）"""
+        kw = keyword.strip().lower()
+        if not kw:
+            return []
+        if max_distance is None:
+            max_distance = default_max_distance(kw)
+        docs, tree = self.get(layer_name)
+        matches = tree.search(kw, max_distance) if tree is not None \
+            else scan_terms(kw, self._terms(layer_name, docs), max_distance)
+        out = []
+        seen = set()
+        for distance, _, features in matches:
+            for feature in features:
+                if id(feature) in seen:
+                    continue
+                seen.add(id(feature))
+                out.append(dict(feature, distance=distance))
+                if limit and len(out) >= limit:
+                    return out
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {name: {'terms': len(tree), 'building': name in self._building}
+                    for name, (_, _, tree) in self._trees.items()}
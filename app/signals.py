@@ -0,0 +1,8 @@
+# app/signals.py
+"""应用内信号：管理后台写入数据后通知各类派生数据（物化视图、缓存、内存索引）刷新。"""
+from blinker import Namespace
+
+_signals = Namespace()
+
+# 图层数据发生变更：sender 为 Flask app，关键字参数 model（模型类）、action（add/update/delete）、pk（主键，可能为 None）
+layer_changed = _signals.signal('layer-changed')
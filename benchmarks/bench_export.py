@@ -0,0 +1,72 @@
+"""导出内存基准：一次性构造要素列表再 jsonify 与 format=ndjson 流式输出的峰值内存（tracemalloc）和耗时。
+
+不需要数据库：用合成的查询行（GeoJSON 几何文本 + 属性）代替服务器端游标逐批返回的结果。
+用法（项目根目录）：
+    python benchmarks/bench_export.py               # 1 万、10 万行
+    python benchmarks/bench_export.py -n 500000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask, jsonify  # noqa: E402
+
+from app.routes.export import features_ndjson, csv_lines, _chunked  # noqa: E402
+
+FIELDS = ['name', 'type', 'address', 'category']
+
+
+def synthetic_rows(n):
+    for i in range(n):
+        geom = f'{{"type":"Point","coordinates":[{114.1 + i * 1e-6:.6f},{30.5 + i * 1e-6:.6f}]}}'
+        yield geom, {'name': f'设施{i}', 'type': '医疗保健服务', 'address': f'洪山区珞喻路{i}号', 'category': '医院'}
+
+
+def buffered(n):
+    """原有方式：解析几何、构造完整列表后一次性序列化"""
+    features = [{'type': 'Feature', 'geometry': app.json.loads(g), 'properties': p}
+                for g, p in synthetic_rows(n)]
+    return len(jsonify(features).get_data())
+
+
+def streamed_ndjson(n):
+    return sum(len(chunk) for chunk in _chunked(features_ndjson(synthetic_rows(n)), 64 * 1024))
+
+
+def streamed_csv(n):
+    rows = (dict(p, geometry=g) for g, p in synthetic_rows(n))
+    return sum(len(chunk) for chunk in _chunked(csv_lines(rows, FIELDS + ['geometry']), 64 * 1024))
+
+
+def measure(fn, n):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = fn(n)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20, size / 2 ** 20
+
+
+app = Flask(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, action='append', dest='sizes')
+    args = parser.parse_args()
+
+    print(f'{"rows":>9}  {"method":<10}{"time s":>9}{"peak MB":>10}{"output MB":>11}')
+    with app.app_context():
+        for n in args.sizes or [10_000, 100_000]:
+            for name, fn in (('jsonify', buffered), ('ndjson', streamed_ndjson), ('csv', streamed_csv)):
+                elapsed, peak, size = measure(fn, n)
+                print(f'{n:>9}  {name:<10}{elapsed:>9.2f}{peak:>10.1f}{size:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""图层输出格式基准：编码耗时与体积（GeoJSON / FlatGeobuf / GeoArrow / TopoJSON）。
+
+用法（项目根目录）：
+    python benchmarks/bench_formats.py            # 合成数据
+    python benchmarks/bench_formats.py --db       # 使用数据库中的真实图层
+
+浏览器端解码耗时需在前端测量：对同一图层分别请求 format=geojson/topojson/fgb，
+在控制台用 performance.now() 记录 r.json() / topojson.feature() / flatgeobuf.deserialize() 的耗时。
+"""
+import gzip
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.routes.formats import encode_feature_collection, FormatUnavailable  # noqa: E402
+
+
+def synthetic_circles(n=300, vertices=64, seed=0):
+    """模拟相互重叠的地铁十分钟等时圈（武汉范围内的多边形）"""
+    rnd = random.Random(seed)
+    features = []
+    for i in range(n):
+        cx = rnd.uniform(114.1, 114.5)
+        cy = rnd.uniform(30.4, 30.7)
+        r = rnd.uniform(0.006, 0.012)
+        ring = [[cx + r * math.cos(2 * math.pi * k / vertices), cy + r * math.sin(2 * math.pi * k / vertices)]
+                for k in range(vertices)]
+        ring.append(ring[0])
+        features.append({'type': 'Feature', 'id': i, 'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                         'properties': {'name': f'站点{i}10分钟等时圈', 'aa_mins': '10', 'total_pop': str(rnd.randint(1000, 90000))}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def synthetic_points(n=20000, seed=0):
+    """模拟公共服务 POI"""
+    rnd = random.Random(seed)
+    features = []
+    for i in range(n):
+        features.append({'type': 'Feature', 'id': i,
+                         'geometry': {'type': 'Point', 'coordinates': [rnd.uniform(113.8, 114.7), rnd.uniform(29.9, 31.0)]},
+                         'properties': {'name': f'公共服务{i}', 'type': '医疗保健服务', 'category': '医疗'}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def db_layers():
+    from app import create_app
+    from app.routes.api import DB_LAYERS_CONFIG, load_db_layer_as_geojson
+    app = create_app()
+    with app.app_context():
+        for layer_name in DB_LAYERS_CONFIG:
+            fc = load_db_layer_as_geojson(layer_name)
+            if fc is not None:
+                yield layer_name, fc
+
+
+def bench(name, fc, repeat=3):
+    print(f'\n== {name}（{len(fc["features"])} 个要素）==')
+    print(f'{"format":<10}{"encode ms":>12}{"bytes":>14}{"gzip bytes":>14}{"vs geojson":>12}')
+    base = None
+    for fmt in ('geojson', 'topojson', 'fgb', 'arrow'):
+        try:
+            best = float('inf')
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                body, _ = encode_feature_collection(fc, fmt, name)
+                best = min(best, time.perf_counter() - t0)
+        except FormatUnavailable as e:
+            print(f'{fmt:<10}{"不可用：" + str(e):>40}')
+            continue
+        size = len(body)
+        gz = len(gzip.compress(body))
+        if base is None:
+            base = size
+        print(f'{fmt:<10}{best * 1000:>12.1f}{size:>14}{gz:>14}{size / base:>12.2f}')
+
+
+if __name__ == '__main__':
+    if '--db' in sys.argv:
+        for layer_name, fc in db_layers():
+            bench(layer_name, fc)
+    else:
+        bench('合成等时圈', synthetic_circles())
+        bench('合成 POI', synthetic_points())
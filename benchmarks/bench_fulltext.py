@@ -0,0 +1,55 @@
+"""关键词查询基准：LIKE 子串匹配（mode=text）、pg_trgm（mode=similar）与 tsvector 全文检索（mode=fulltext）。
+
+需要数据库；fulltext 需先运行 `flask search create-fulltext`，similar 需先运行 `flask search create-indexes`。
+用法（项目根目录）：
+    python benchmarks/bench_fulltext.py                    # 默认关键词
+    python benchmarks/bench_fulltext.py -q 医院 -q 地铁站   # 指定关键词
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app  # noqa: E402
+
+DEFAULT_KEYWORDS = ['医院', '武汉大学', '光谷', '街道', '站']
+MODES = ['text', 'similar', 'fulltext']
+
+
+def bench(layer_name, keyword, mode, repeat):
+    from app.routes.api import search_layer_features
+    best, count = float('inf'), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        features = search_layer_features(layer_name, keyword, mode=mode)
+        best = min(best, time.perf_counter() - t0)
+        count = None if features is None else len(features)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-q', '--keyword', action='append', dest='keywords')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        from app.routes.api import DB_LAYERS_CONFIG
+        for layer_name, cfg in DB_LAYERS_CONFIG.items():
+            if not cfg.get('fields'):
+                continue
+            print(f'\n== {layer_name} ==')
+            print(f'{"keyword":<12}' + ''.join(f'{m + " ms":>14}{"rows":>7}' for m in MODES))
+            for keyword in args.keywords or DEFAULT_KEYWORDS:
+                line = f'{keyword:<12}'
+                for mode in MODES:
+                    best, count = bench(layer_name, keyword, mode, args.repeat)
+                    line += f'{"失败":>14}{"-":>7}' if count is None else f'{best * 1000:>14.1f}{count:>7}'
+                print(line)
+
+
+if __name__ == '__main__':
+    main()
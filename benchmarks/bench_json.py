@@ -0,0 +1,72 @@
+"""JSON 序列化基准：Flask 默认 jsonify 与 FastJSONProvider（orjson / 标准库回退）的耗时与字节数。
+
+用法（项目根目录）：
+    python benchmarks/bench_json.py            # 合成数据
+    python benchmarks/bench_json.py --db       # 使用数据库中的真实图层（逐图层统计）
+"""
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app import json_provider  # noqa: E402
+from benchmarks.bench_formats import synthetic_circles, synthetic_points  # noqa: E402
+
+
+def with_decimals(fc):
+    """模拟 Numeric 列（如 lon_wgs84）直接进入响应时的 Decimal 值"""
+    for feature in fc['features']:
+        x, y = feature['geometry']['coordinates'][:2] if feature['geometry']['type'] == 'Point' else (114.3, 30.5)
+        feature['properties']['lon_wgs84'] = Decimal(f'{x:.15f}')
+        feature['properties']['lat_wgs84'] = Decimal(f'{y:.15f}')
+    return fc
+
+
+def bench(app, name, obj, repeat=5):
+    providers = [('flask default', DefaultJSONProvider(app)), ('fast (stdlib)', None), ('fast (orjson)', None)]
+    print(f'\n== {name}（{len(obj["features"])} 个要素）==')
+    print(f'{"provider":<16}{"ms":>10}{"bytes":>14}')
+    orjson = json_provider.orjson
+    for label, provider in providers:
+        if label == 'fast (stdlib)':
+            json_provider.orjson = None
+            provider = json_provider.FastJSONProvider(app)
+        elif label == 'fast (orjson)':
+            if orjson is None:
+                print(f'{label:<16}{"未安装 orjson":>24}')
+                continue
+            json_provider.orjson = orjson
+            provider = json_provider.FastJSONProvider(app)
+        best = float('inf')
+        with app.app_context():
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                body = provider.response(obj).get_data()
+                best = min(best, time.perf_counter() - t0)
+        print(f'{label:<16}{best * 1000:>10.1f}{len(body):>14}')
+    json_provider.orjson = orjson
+
+
+def db_layers(app):
+    from app.routes.api import DB_LAYERS_CONFIG, load_db_layer_as_geojson
+    with app.app_context():
+        for layer_name in DB_LAYERS_CONFIG:
+            fc = load_db_layer_as_geojson(layer_name)
+            if fc is not None:
+                yield layer_name, fc
+
+
+if __name__ == '__main__':
+    app = create_app()
+    app.debug = False  # 与生产环境一致，输出紧凑 JSON
+    if '--db' in sys.argv:
+        for layer_name, fc in list(db_layers(app)):
+            bench(app, layer_name, fc)
+    else:
+        bench(app, '合成等时圈', synthetic_circles())
+        bench(app, '合成 POI（含 Decimal）', with_decimals(synthetic_points()))
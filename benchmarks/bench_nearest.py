@@ -0,0 +1,76 @@
+"""批量最近设施基准：逐点计算（相当于每行一次 KNN 查询）与一次向量化计算（NumPy 分块 / cKDTree）的耗时，
+并与全量 haversine 距离矩阵核对结果。
+
+用法（项目根目录）：
+    python benchmarks/bench_nearest.py                     # 1 万、10 万、100 万个源点 -> 300 个目标点
+    python benchmarks/bench_nearest.py -n 50000 --targets 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.routes import nearest_batch  # noqa: E402
+from app.routes.nearest_batch import NearestIndex, haversine_m  # noqa: E402
+from benchmarks.bench_poi import EXTENT  # noqa: E402
+
+# 逐点计算只在前这么多个源点上计时，再按比例估算全量耗时
+PER_ROW_SAMPLE = 2000
+
+
+def random_points(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(EXTENT[0], EXTENT[2], n), rng.uniform(EXTENT[1], EXTENT[3], n)
+
+
+def per_row(src_lon, src_lat, tgt_lon, tgt_lat):
+    out = np.empty(len(src_lon))
+    for i in range(len(src_lon)):
+        out[i] = haversine_m(src_lon[i], src_lat[i], tgt_lon, tgt_lat).min()
+    return out
+
+
+def check(src_lon, src_lat, tgt_lon, tgt_lat, dist, sample=2000):
+    ref = haversine_m(src_lon[:sample, None], src_lat[:sample, None], tgt_lon[None, :], tgt_lat[None, :]).min(axis=1)
+    return float(np.abs(ref - dist[:sample, 0]).max())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, action='append', dest='sizes')
+    parser.add_argument('--targets', type=int, default=300)
+    args = parser.parse_args()
+
+    tgt_lon, tgt_lat = random_points(args.targets, seed=1)
+    print(f'目标点 {args.targets} 个；cKDTree {"可用" if nearest_batch.cKDTree is not None else "未安装 scipy"}')
+    print(f'{"n":>9}{"per-row s*":>12}{"numpy s":>10}{"kdtree s":>10}{"max err m":>11}')
+    for n in args.sizes or [10_000, 100_000, 1_000_000]:
+        src_lon, src_lat = random_points(n, seed=2)
+
+        sample = min(n, PER_ROW_SAMPLE)
+        t0 = time.perf_counter()
+        per_row(src_lon[:sample], src_lat[:sample], tgt_lon, tgt_lat)
+        per_row_s = (time.perf_counter() - t0) * n / sample
+
+        t0 = time.perf_counter()
+        _, dist = NearestIndex(tgt_lon, tgt_lat, use_kdtree=False).query(src_lon, src_lat)
+        numpy_s = time.perf_counter() - t0
+        err = check(src_lon, src_lat, tgt_lon, tgt_lat, dist)
+
+        if nearest_batch.cKDTree is not None:
+            t0 = time.perf_counter()
+            _, dist = NearestIndex(tgt_lon, tgt_lat).query(src_lon, src_lat)
+            kdtree = f'{time.perf_counter() - t0:>10.3f}'
+            err = max(err, check(src_lon, src_lat, tgt_lon, tgt_lat, dist))
+        else:
+            kdtree = f'{"-":>10}'
+        print(f'{n:>9}{per_row_s:>12.2f}{numpy_s:>10.3f}{kdtree}{err:>11.4f}')
+    print('* 逐点计算按前 %d 个源点的耗时估算' % PER_ROW_SAMPLE)
+
+
+if __name__ == '__main__':
+    main()
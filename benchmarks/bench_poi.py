@@ -0,0 +1,125 @@
+"""POI 内存查询基准：原先的字典列表推导式与 PoiSnapshot（NumPy 列 + 字典编码）的范围与关键词过滤耗时，
+以及网格索引与全量扫描在不同查询框大小下的对比（找出两者的交叉点）。
+
+用法（项目根目录）：
+    python benchmarks/bench_poi.py                 # 1 万、10 万、100 万条合成 POI
+    python benchmarks/bench_poi.py -n 50000        # 指定规模
+    python benchmarks/bench_poi.py --crossover     # 100 万条 POI 上网格索引 vs 全量扫描
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.routes.poi_store import PoiSnapshot  # noqa: E402
+
+FIELDS = ['name', 'type', 'district']
+TYPES = ['医院', '学校', '超市', '银行', '餐厅', '公园', '地铁站', '酒店', '药店', '加油站']
+DISTRICTS = ['江岸区', '江汉区', '硚口区', '汉阳区', '武昌区', '青山区', '洪山区', '东西湖区', '蔡甸区', '江夏区']
+# 武汉市大致范围
+EXTENT = (113.7, 29.97, 115.08, 31.36)
+
+
+def synthetic_pois(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(EXTENT[0], EXTENT[2], n)
+    lat = rng.uniform(EXTENT[1], EXTENT[3], n)
+    types = rng.integers(0, len(TYPES), n)
+    districts = rng.integers(0, len(DISTRICTS), n)
+    return [
+        {'name': f'{DISTRICTS[d][:-1]}{TYPES[t]}{i % 5000}', 'type': TYPES[t], 'district': DISTRICTS[d],
+         'lon': float(lon[i]), 'lat': float(lat[i])}
+        for i, (t, d) in enumerate(zip(types.tolist(), districts.tolist()))
+    ]
+
+
+def query_boxes(count=20, fraction=0.05, seed=1):
+    """覆盖约 fraction 面积的随机查询框"""
+    rng = np.random.default_rng(seed)
+    w = (EXTENT[2] - EXTENT[0]) * fraction ** 0.5
+    h = (EXTENT[3] - EXTENT[1]) * fraction ** 0.5
+    boxes = []
+    for _ in range(count):
+        x = rng.uniform(EXTENT[0], EXTENT[2] - w)
+        y = rng.uniform(EXTENT[1], EXTENT[3] - h)
+        boxes.append((x, y, x + w, y + h))
+    return boxes
+
+
+def baseline(records, box, keyword):
+    """原 bbox_query + search_poi 的实现"""
+    min_lon, min_lat, max_lon, max_lat = box
+    filtered = [
+        item for item in records
+        if min_lon <= item.get('lon', 9999) <= max_lon
+        and min_lat <= item.get('lat', 9999) <= max_lat
+    ]
+    return [item for item in filtered if any(keyword in str(item.get(f, '')).lower() for f in FIELDS)]
+
+
+def columnar(snapshot, box, keyword):
+    return snapshot.take(snapshot.match_indices(keyword, indices=snapshot.bbox_indices(*box), fields=FIELDS))
+
+
+def timeit(fn, boxes, keyword):
+    t0 = time.perf_counter()
+    for box in boxes:
+        out = fn(box, keyword)
+    return (time.perf_counter() - t0) / len(boxes) * 1000, len(out)
+
+
+def crossover(n):
+    """固定数据规模，逐步放大查询框：网格索引（强制使用，不做候选比例判断）与全量掩码扫描的耗时"""
+    from app.routes import poi_store
+    snapshot = PoiSnapshot(synthetic_pois(n), FIELDS)
+    grid = snapshot.grid
+    print(f'\n== 网格索引 vs 全量扫描（{n} 条，{grid.nx}x{grid.ny} 单元）==')
+    print(f'{"面积占比":>10}{"命中":>10}{"scan ms":>10}{"grid ms":>10}')
+    ratio = poi_store.GRID_SCAN_RATIO
+    poi_store.GRID_SCAN_RATIO = float('inf')
+    try:
+        for fraction in [0.00001, 0.0001, 0.001, 0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.8]:
+            boxes = query_boxes(fraction=fraction)
+            scan_ms, _ = timeit(lambda b, k: snapshot.bbox_indices(*b, use_grid=False), boxes, None)
+            grid_ms, count = timeit(lambda b, k: snapshot.bbox_indices(*b), boxes, None)
+            for box in boxes:
+                assert (snapshot.bbox_indices(*box) == snapshot.bbox_indices(*box, use_grid=False)).all()
+            print(f'{fraction:>10.5f}{count:>10}{scan_ms:>10.2f}{grid_ms:>10.2f}')
+    finally:
+        poi_store.GRID_SCAN_RATIO = ratio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, action='append', dest='sizes')
+    parser.add_argument('--crossover', action='store_true')
+    args = parser.parse_args()
+
+    if args.crossover:
+        crossover((args.sizes or [1_000_000])[0])
+        return
+
+    boxes = query_boxes()
+    keyword = '医院'
+    print(f'{"n":>9}{"build s":>10}{"dict ms":>10}{"numpy ms":>10}{"scan ms":>10}{"grid ms":>10}{"speedup":>9}')
+    for n in args.sizes or [10_000, 100_000, 1_000_000]:
+        records = synthetic_pois(n)
+        t0 = time.perf_counter()
+        snapshot = PoiSnapshot(records, FIELDS)
+        build = time.perf_counter() - t0
+
+        base_ms, base_count = timeit(lambda b, k: baseline(records, b, k), boxes, keyword)
+        col_ms, col_count = timeit(lambda b, k: columnar(snapshot, b, k), boxes, keyword)
+        scan_ms, _ = timeit(lambda b, k: snapshot.bbox_indices(*b, use_grid=False), boxes, keyword)
+        grid_ms, _ = timeit(lambda b, k: snapshot.bbox_indices(*b), boxes, keyword)
+        assert base_count == col_count
+        print(f'{n:>9}{build:>10.2f}{base_ms:>10.2f}{col_ms:>10.2f}{scan_ms:>10.2f}{grid_ms:>10.2f}'
+              f'{base_ms / col_ms:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,51 @@ function initMap() {
     document.getElementById('keyword').addEventListener('keypress', function(e){
         if(e.key === 'Enter') searchByKeyword();
     });
+
+    // 输入联想
+    document.getElementById('keyword').addEventListener('input', onKeywordInput);
+}
+
+// 输入联想：防抖后请求 /api/suggest，新请求发出或输入框被清空时取消尚未返回的旧请求
+const SUGGEST_DEBOUNCE_MS = 200;
+let suggestTimer = null;
+let suggestController = null;
+function onKeywordInput(){
+    const kw = this.value.trim();
+    clearTimeout(suggestTimer);
+    if(!kw){
+        if(suggestController) suggestController.abort();
+        suggestController = null;
+        document.getElementById('keywordSuggest').innerHTML = '';
+        return;
+    }
+    suggestTimer = setTimeout(() => fetchSuggestions(kw), SUGGEST_DEBOUNCE_MS);
+}
+
+function fetchSuggestions(kw){
+    if(suggestController) suggestController.abort();
+    suggestController = new AbortController();
+
+    const params = new URLSearchParams({q: kw, n: 10});
+    if(currentLayerName && currentLayerName !== '__none__') params.set('layer', currentLayerName);
+
+    fetch(`/api/suggest?${params}`, {signal: suggestController.signal})
+        .then(r => r.json())
+        .then(data => {
+            // 返回前输入已经改变：丢弃过期的联想结果
+            if(document.getElementById('keyword').value.trim() !== kw) return;
+            const list = document.getElementById('keywordSuggest');
+            list.innerHTML = '';
+            (data.suggestions || []).forEach(item => {
+                const opt = document.createElement('option');
+                opt.value = item.text;
+                opt.label = item.layer;
+                list.appendChild(opt);
+            });
+        })
+        .catch(err => {
+            if(err.name !== 'AbortError') console.error('Failed to load suggestions:', err);
+        });
 }
 
 // 加载图层列表到下拉菜单
@@ -307,32 +352,10 @@ function startBoxSelect(){
             boxRect = null;
         }
         
-        // 在当前图层中执行范围查询
-        if(currentLayerData && currentLayerData.features){
-            const t0 = performance.now();
-            const results = currentLayerData.features.filter(feature => {
-                if(!feature.geometry) return false;
-
-                const geomType = feature.geometry.type;
-                const coords = feature.geometry.coordinates;
-
-                if(geomType === 'Point'){
-                    // Point: [lon, lat]
-                    const lon = coords[0];
-                    const lat = coords[1];
-                    return lon >= min_lon && lon <= max_lon && lat >= min_lat && lat <= max_lat;
-                } else if(geomType === 'LineString' || geomType === 'Polygon'){
-                    // 检查是否与矩形相交
-                    return checkGeometryInBounds(coords, geomType, min_lon, min_lat, max_lon, max_lat);
-                } else if(geomType === 'MultiPoint' || geomType === 'MultiLineString' || geomType === 'MultiPolygon'){
-                    // 检查任意一部分是否在范围内
-                    return coords.some(c => checkGeometryInBounds(c, geomType.replace('Multi', ''), min_lon, min_lat, max_lon, max_lat));
-                }
-                return false;
-            });
-            const elapsedMs = Math.round(performance.now() - t0);
-            displayLayerSearchResults(results, '矩形范围内', elapsedMs);
-        }
+        // 在服务器端执行范围查询（ST_Intersects），按 id 高亮当前图层中的要素
+        selectByPolygon([[
+            [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]
+        ]], '矩形范围内');
         
         boxStart = null;
     }
@@ -341,27 +364,84 @@ function startBoxSelect(){
     map.on('mouseup', onMouseUp);
 }
 
+// 套索查询：按住鼠标在地图上绘制任意多边形
+let lassoLine = null;
+function startLassoSelect(){
+    if(!currentLayerName || currentLayerName === '__none__'){
+        alert('请先选择一个图层');
+        return;
+    }
+
+    document.getElementById('boxHint').style.display = 'block';
+    map.dragging.disable();
+    map.getContainer().style.cursor = 'crosshair';
+    let points = [];
+
+    function onMouseDown(e){
+        points = [e.latlng];
+        if(lassoLine) map.removeLayer(lassoLine);
+        lassoLine = L.polyline(points, {color: '#ffaa00', weight: 2}).addTo(map);
+        map.on('mousemove', onMouseMove);
+    }
+
+    function onMouseMove(e){
+        points.push(e.latlng);
+        lassoLine.addLatLng(e.latlng);
+    }
+
+    function onMouseUp(){
+        map.off('mousemove', onMouseMove);
+        map.off('mousedown', onMouseDown);
+        map.off('mouseup', onMouseUp);
+        map.dragging.enable();
+        map.getContainer().style.cursor = '';
+        document.getElementById('boxHint').style.display = 'none';
+
+        if(lassoLine){
+            map.removeLayer(lassoLine);
+            lassoLine = null;
+        }
+        if(points.length < 3) return;
+
+        // 闭合多边形
+        const ring = points.map(p => [p.lng, p.lat]);
+        ring.push(ring[0]);
+        selectByPolygon([ring], '套索范围内');
+    }
+
+    map.on('mousedown', onMouseDown);
+    map.on('mouseup', onMouseUp);
+}
+
+// 将多边形发送到 /api/select，返回相交要素的 id，在已加载的图层中高亮（不重新下载图层）
+function selectByPolygon(coordinates, label){
+    if(!currentLayerData || !currentLayerData.features){
+        alert('当前图层不支持查询或未完全加载，请选择矢量图层');
+        return;
+    }
+    const t0 = performance.now();
+    fetch('/api/select', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({layer: currentLayerName, geometry: {type: 'Polygon', coordinates: coordinates}})
+    })
+        .then(r => r.json().then(data => {
+            if(!r.ok) throw new Error(data.msg || data.error || r.status);
+            return data;
+        }))
+        .then(data => {
+            const ids = new Set(data.ids);
+            const results = currentLayerData.features.filter(f => ids.has(f.id));
+            displayLayerSearchResults(results, label, Math.round(performance.now() - t0));
+        })
+        .catch(err => {
+            console.error('Selection failed:', err);
+            document.getElementById('results').innerHTML = `<div style="color: red;">范围查询失败：${err.message}</div>`;
+        });
+}
+
 // 全局函数暴露
 window.searchByKeyword = searchByKeyword;
 window.startBoxSelect = startBoxSelect;
+window.startLassoSelect = startLassoSelect;
 window.clearResults = clearResults;
-
-// 辅助函数：检查几何图形是否与矩形范围相交
-function checkGeometryInBounds(coords, geomType, min_lon, min_lat, max_lon, max_lat){
-    if(geomType === 'LineString'){
-        // LineString: [[lon, lat], [lon, lat], ...]
-        return coords.some(point => {
-            const lon = point[0];
-            const lat = point[1];
-            return lon >= min_lon && lon <= max_lon && lat >= min_lat && lat <= max_lat;
-        });
-    } else if(geomType === 'Polygon'){
-        // Polygon: [[[lon, lat], [lon, lat], ...]]
-        return coords[0].some(point => {
-            const lon = point[0];
-            const lat = point[1];
-            return lon >= min_lon && lon <= max_lon && lat >= min_lat && lat <= max_lat;
-        });
-    }
-    return false;
-}
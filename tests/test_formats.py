@@ -0,0 +1,103 @@
+# tests/test_formats.py
+"""TopoJSON 编码的往返检查：解码 arc 并反量化后，坐标应在量化精度内还原"""
+import pytest
+
+from app.routes.formats import to_topojson
+
+SQUARE = [[114.0, 30.0], [114.1, 30.0], [114.1, 30.1], [114.0, 30.1], [114.0, 30.0]]
+HOLE = [[114.02, 30.02], [114.02, 30.04], [114.04, 30.04], [114.04, 30.02], [114.02, 30.02]]
+
+GEOMETRIES = [
+    {'type': 'Point', 'coordinates': [114.3, 30.5]},
+    {'type': 'MultiPoint', 'coordinates': [[114.31, 30.51], [114.32, 30.52]]},
+    {'type': 'LineString', 'coordinates': [[114.2, 30.2], [114.25, 30.3], [114.3, 30.2]]},
+    {'type': 'MultiLineString', 'coordinates': [[[114.2, 30.4], [114.3, 30.45]], [[114.4, 30.4], [114.45, 30.5]]]},
+    {'type': 'Polygon', 'coordinates': [SQUARE, HOLE]},
+    # 与上一个面的外环方向相反：应共享同一条 arc
+    {'type': 'Polygon', 'coordinates': [SQUARE[::-1]]},
+    {'type': 'MultiPolygon', 'coordinates': [[SQUARE], [[[114.5, 30.5], [114.6, 30.5], [114.6, 30.6], [114.5, 30.5]]]]},
+    # 集合中的坐标在整体范围之外：范围计算必须包括它们
+    {'type': 'GeometryCollection', 'geometries': [
+        {'type': 'Point', 'coordinates': [115.0, 31.0]},
+        {'type': 'LineString', 'coordinates': [[113.5, 29.5], [113.6, 29.6]]},
+        {'type': 'GeometryCollection', 'geometries': [{'type': 'Point', 'coordinates': [113.9, 29.9]}]},
+    ]},
+]
+
+
+def decode(topology, name='layer'):
+    (sx, sy), (tx, ty) = topology['transform']['scale'], topology['transform']['translate']
+
+    def position(q):
+        return [q[0] * sx + tx, q[1] * sy + ty]
+
+    arcs = []
+    for delta in topology['arcs']:
+        x = y = 0
+        points = []
+        for dx, dy in delta:
+            x, y = x + dx, y + dy
+            points.append(position((x, y)))
+        arcs.append(points)
+
+    def arc(i):
+        return arcs[i] if i >= 0 else arcs[~i][::-1]
+
+    def ring(indexes):
+        out = []
+        for k, i in enumerate(indexes):
+            out.extend(arc(i)[1 if k else 0:])
+        return out
+
+    def geometry(obj):
+        gtype = obj['type']
+        if gtype is None:
+            return None
+        if gtype == 'Point':
+            return {'type': gtype, 'coordinates': position(obj['coordinates'])}
+        if gtype == 'MultiPoint':
+            return {'type': gtype, 'coordinates': [position(c) for c in obj['coordinates']]}
+        if gtype == 'LineString':
+            return {'type': gtype, 'coordinates': ring(obj['arcs'])}
+        if gtype in ('MultiLineString', 'Polygon'):
+            return {'type': gtype, 'coordinates': [ring(r) for r in obj['arcs']]}
+        if gtype == 'MultiPolygon':
+            return {'type': gtype, 'coordinates': [[ring(r) for r in p] for p in obj['arcs']]}
+        return {'type': gtype, 'geometries': [geometry(g) for g in obj['geometries']]}
+
+    return [geometry(g) for g in topology['objects'][name]['geometries']]
+
+
+def assert_close(got, expected, tol):
+    if isinstance(expected, dict):
+        assert got['type'] == expected['type']
+        if expected['type'] == 'GeometryCollection':
+            assert len(got['geometries']) == len(expected['geometries'])
+            for g, e in zip(got['geometries'], expected['geometries']):
+                assert_close(g, e, tol)
+        else:
+            assert_close(got['coordinates'], expected['coordinates'], tol)
+    elif isinstance(expected[0], (int, float)):
+        assert got[0] == pytest.approx(expected[0], abs=tol[0])
+        assert got[1] == pytest.approx(expected[1], abs=tol[1])
+    else:
+        assert len(got) == len(expected)
+        for g, e in zip(got, expected):
+            assert_close(g, e, tol)
+
+
+def test_round_trip():
+    fc = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'id': i, 'properties': {'n': i}, 'geometry': g} for i, g in enumerate(GEOMETRIES)
+    ] + [{'type': 'Feature', 'properties': {}, 'geometry': None}]}
+    topology = to_topojson(fc)
+    sx, sy = topology['transform']['scale']
+    decoded = decode(topology)
+    assert decoded[-1] is None
+    for got, expected in zip(decoded, GEOMETRIES):
+        assert_close(got, expected, (sx, sy))
+    assert topology['bbox'] == [113.5, 29.5, 115.0, 31.0]
+    # 正反两个方向的同一个外环只存一条 arc
+    objects = topology['objects']['layer']['geometries']
+    assert objects[5]['arcs'][0][0] == ~objects[4]['arcs'][0][0]
+    assert [o['id'] for o in objects[:-1]] == list(range(len(GEOMETRIES)))
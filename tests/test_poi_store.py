@@ -0,0 +1,50 @@
+# tests/test_poi_store.py
+"""GridIndex 的框选结果必须与全量扫描一致，包括反向框与非有限边界"""
+import math
+
+import numpy as np
+import pytest
+
+from app.routes.poi_store import GRID_MIN_POINTS, PoiSnapshot
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    rng = np.random.default_rng(0)
+    n = GRID_MIN_POINTS + 1000
+    lon = rng.uniform(114.0, 114.6, n)
+    lat = rng.uniform(30.3, 30.8, n)
+    records = [{'lon': float(x), 'lat': float(y), 'name': str(i)} for i, (x, y) in enumerate(zip(lon, lat))]
+    # 缺失坐标的记录不应出现在任何结果中
+    records.append({'lon': None, 'lat': None, 'name': 'missing'})
+    snap = PoiSnapshot(records, ['name'])
+    assert snap.grid is not None
+    return snap
+
+
+BOXES = [
+    (114.20, 30.50, 114.22, 30.52),           # 小范围，走网格
+    (114.0, 30.3, 114.6, 30.8),               # 整个范围，回退全量扫描
+    (113.0, 29.0, 113.5, 29.5),               # 完全在数据范围外
+    (114.30, 30.55, 114.30, 30.55),           # 退化为一个点
+    (114.22, 30.52, 114.20, 30.50),           # 数据范围内的反向框
+    (114.22, 30.50, 114.20, 30.52),           # 仅经度反向
+    (114.20, 30.52, 114.22, 30.50),           # 仅纬度反向
+    (math.nan, 30.50, 114.22, 30.52),
+    (114.20, 30.50, 114.22, math.nan),
+    (math.nan, math.nan, math.nan, math.nan),
+    (-math.inf, 30.50, 114.22, 30.52),
+    (114.20, -math.inf, math.inf, math.inf),
+]
+
+
+@pytest.mark.parametrize('box', BOXES)
+def test_grid_matches_full_scan(snapshot, box):
+    expected = snapshot.bbox_indices(*box, use_grid=False)
+    got = snapshot.bbox_indices(*box)
+    np.testing.assert_array_equal(got, expected)
+
+
+def test_candidates_of_inverted_box_is_empty(snapshot):
+    cand = snapshot.grid.candidates(114.22, 30.52, 114.20, 30.50)
+    assert cand is not None and len(cand) == 0